@@ -0,0 +1,169 @@
+import hashlib
+import json
+import time
+import warnings
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.dispatch import receiver
+
+from . import resampling
+from .signals import measurements_changed
+
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def get_config():
+    """
+    Returns the `ANALYTICS` settings with defaults.
+    """
+    return {
+        "CACHE": "shared",
+        "TIMEOUT": 60 * 60,
+        "MAX_SYSTEMS": 200,
+        "MIN_OVERLAP": 3,
+        "OUTLIER_SCORE": 2.0,
+        **getattr(settings, "ANALYTICS", {}),
+    }
+
+
+def get_cache():
+    return caches[get_config()["CACHE"]]
+
+
+def _version_key(system_id):
+    return f"analytics:{system_id}:version"
+
+
+def versions(cache, system_ids):
+    """
+    Returns the data versions of the systems, bumped whenever their measurements change.
+    Missing versions start at the current time, so an evicted version never matches a stale result.
+    """
+    keys = [_version_key(system_id) for system_id in system_ids]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+@receiver(measurements_changed)
+def invalidate(sender, system_ids, kind, **kwargs):
+    """
+    Marks cached analytics of the systems as stale.
+    """
+    cache = get_cache()
+    for system_id in system_ids:
+        try:
+            cache.incr(_version_key(system_id))
+        except ValueError:
+            cache.set(_version_key(system_id), time.time_ns(), None)
+
+
+def correlation(matrix, min_overlap=3):
+    """
+    Pearson correlation of every pair of rows over the points observed in both.
+    Computed for all pairs at once from masked matrix products.
+    Returns a square matrix, NaN for pairs with fewer than `min_overlap` common points
+    or a constant row.
+    """
+    observed = (~np.isnan(matrix)).astype(np.float64)
+    values = np.nan_to_num(matrix)
+    count = observed @ observed.T
+    sums = values @ observed.T
+    squares = (values ** 2) @ observed.T
+    products = values @ values.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x, mean_y = sums / count, sums.T / count
+        covariance = products / count - mean_x * mean_y
+        variance_x = squares / count - mean_x ** 2
+        variance_y = squares.T / count - mean_y ** 2
+        result = covariance / np.sqrt(variance_x * variance_y)
+    result[(count < min_overlap) | ~(variance_x > 1e-12) | ~(variance_y > 1e-12)] = np.nan
+    return np.clip(result, -1, 1)
+
+
+def bands(matrix, percentiles=PERCENTILES):
+    """
+    Fleet mean and percentiles of every point over the systems observed at that point.
+    Returns `{"mean": values, "p5": values, ...}`, NaN where no system is observed.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        levels = np.nanpercentile(matrix, percentiles, axis=0)
+        result = {"mean": np.nanmean(matrix, axis=0)}
+    result.update((f"p{percentile}", level) for percentile, level in zip(percentiles, levels))
+    return result
+
+
+def deviation(matrix):
+    """
+    Scores how far every system diverges from the fleet.
+    At every point a system is compared with the mean and standard deviation of the other systems,
+    its `offset` is the average difference and its `score` the root mean square of the z-scores.
+    Returns `(offsets, scores)`, NaN for systems without comparable points.
+    """
+    observed = ~np.isnan(matrix)
+    values = np.nan_to_num(matrix)
+    count = observed.sum(axis=0)
+    sums = values.sum(axis=0)
+    squares = (values ** 2).sum(axis=0)
+    # leave-one-out statistics of the other systems observed at each point
+    others = count - observed
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (sums - values) / others
+        variance = (squares - values ** 2) / others - mean ** 2
+        z = (matrix - mean) / np.sqrt(variance)
+    comparable = observed & (others >= 2) & (variance > 1e-12)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        offsets = np.nanmean(np.where(observed & (others >= 1), matrix - mean, np.nan), axis=1)
+        scores = np.sqrt(np.nanmean(np.where(comparable, z ** 2, np.nan), axis=1))
+    return offsets, scores
+
+
+def analyze(system_ids, start, end, interval, fields, method="linear", limit=None):
+    """
+    Compares the systems over a window: pairwise correlations, fleet percentile bands and
+    per-system deviation scores of every field, computed on series aligned by `resampling.resample`.
+    Results are cached under the data versions of the systems, so any change of their
+    measurements leads to a recomputation.
+    """
+    config = get_config()
+    cache = get_cache()
+    params = [system_ids, start.isoformat(), end.isoformat(), interval, fields, method, limit]
+    digest = hashlib.sha1(
+        json.dumps([params, versions(cache, system_ids)]).encode()).hexdigest()
+    key = f"analytics:result:{digest}"
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    grid, series, readings = resampling.resample(system_ids, start, end, interval, fields, method, limit)
+    result = {
+        "timestamps": [int(value * 1000) for value in grid.tolist()],
+        "readings": readings.tolist(),
+        "fields": {},
+    }
+    for field, matrix in series.items():
+        offsets, scores = deviation(matrix)
+        result["fields"][field] = {
+            "correlation": [resampling.to_list(row) for row in correlation(matrix, config["MIN_OVERLAP"])],
+            "bands": {name: resampling.to_list(values) for name, values in bands(matrix).items()},
+            "deviation": [
+                {
+                    "id": system_id,
+                    "offset": offset,
+                    "score": score,
+                    "outlier": score is not None and score > config["OUTLIER_SCORE"],
+                }
+                for system_id, offset, score in zip(
+                    system_ids, resampling.to_list(offsets), resampling.to_list(scores))
+            ],
+        }
+    cache.set(key, result, config["TIMEOUT"])
+    return result
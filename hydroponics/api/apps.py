@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        # connects receivers of `measurements_changed`
+        from . import analytics, forecasting  # noqa: F401
+        from . import caching, sharding
+
+        post_migrate.connect(sharding.reserve_ids_after_migrate, sender=self)
+        post_migrate.connect(caching.create_cache_tables_after_migrate, sender=self)
@@ -0,0 +1,528 @@
+import heapq
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from . import sharding
+from .models import Measurement, MeasurementArchive
+
+
+MAGIC = b"MAR1"
+HEADER = struct.Struct("<4sI")
+
+# columns of a block: name, stored dtype, times the column is delta-encoded
+COLUMNS = [
+    ("id", np.int64, 2),
+    ("timestamp", np.int64, 2),
+    ("ph", np.int32, 1),
+    ("temperature", np.int32, 1),
+    ("tds", np.int32, 1),
+]
+FIXED_POINT = ["ph", "temperature"]
+
+LOOKUPS = {
+    "exact": np.equal,
+    "gt": np.greater,
+    "gte": np.greater_equal,
+    "lt": np.less,
+    "lte": np.less_equal,
+}
+
+
+def get_config():
+    """
+    Returns the `ARCHIVE` settings with defaults.
+    """
+    return {
+        "CODEC": "zlib",
+        "BLOCK_SIZE": 10_000,
+        "OLDER_THAN_DAYS": 90,
+        **getattr(settings, "ARCHIVE", {}),
+    }
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise ImproperlyConfigured("The `zstd` archive codec requires the `zstandard` package.") from exc
+    return zstandard
+
+
+def compress(payload, codec):
+    if codec == "zlib":
+        return zlib.compress(payload, 9)
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=19).compress(payload)
+    raise ImproperlyConfigured(f"Unknown archive codec: '{codec}', valid codecs: zlib, zstd")
+
+
+def decompress(data, codec):
+    if codec == "zlib":
+        return zlib.decompress(data)
+    return _zstd().ZstdDecompressor().decompress(data)
+
+
+def to_micros(value):
+    """
+    Converts an aware datetime into microseconds since the epoch.
+    """
+    return (value - datetime(1970, 1, 1, tzinfo=dt_timezone.utc)) // timedelta(microseconds=1)
+
+
+def from_micros(value):
+    return datetime(1970, 1, 1, tzinfo=dt_timezone.utc) + timedelta(microseconds=int(value))
+
+
+def encode(columns, codec="zlib"):
+    """
+    Packs `{column: array}` readings sorted by timestamp into a compressed block.
+    Ids and timestamps are delta-of-delta encoded, so regular readings become runs of zeros,
+    values are delta encoded fixed-point integers. The bytes of every column are transposed
+    so that the mostly zero high bytes of the deltas are compressed together.
+    """
+    count = len(columns["id"])
+    parts = [HEADER.pack(MAGIC, count)]
+    for name, dtype, order in COLUMNS:
+        values = np.asarray(columns[name]).astype(dtype)
+        for _ in range(order):
+            values = np.diff(values, prepend=dtype(0))
+        itemsize = np.dtype(dtype).itemsize
+        parts.append(values.view(np.uint8).reshape(count, itemsize).T.tobytes())
+    return compress(b"".join(parts), codec)
+
+
+def decode(data, codec="zlib"):
+    """
+    Unpacks a block into `{column: array}`. Fixed-point columns are returned as integers.
+    """
+    payload = decompress(bytes(data), codec)
+    magic, count = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError("Not a measurement archive block.")
+    offset = HEADER.size
+    columns = {}
+    for name, dtype, order in COLUMNS:
+        itemsize = np.dtype(dtype).itemsize
+        raw = np.frombuffer(payload, np.uint8, count * itemsize, offset)
+        values = raw.reshape(itemsize, count).T.copy().view(dtype).ravel()
+        for _ in range(order):
+            values = np.cumsum(values, dtype=dtype)
+        columns[name] = values
+        offset += count * itemsize
+    return columns
+
+
+def _fields():
+    return {name: Measurement._meta.get_field(name) for name in FIXED_POINT}
+
+
+def archive_system(system_id, cutoff, block_size=None, codec=None):
+    """
+    Moves readings of a system older than `cutoff` into compressed blocks of `block_size` readings.
+    Every block is written and its readings deleted in one transaction.
+    The readings of a block are locked and locked readings skipped, so concurrent runs
+    archive disjoint readings.
+    Returns `(archived readings, compressed bytes)`.
+    """
+    config = get_config()
+    block_size = block_size or config["BLOCK_SIZE"]
+    codec = codec or config["CODEC"]
+    fields = _fields()
+    archived = size = 0
+    while True:
+        with transaction.atomic(using=sharding.db()):
+            rows = list(
+                Measurement.objects.filter(system_id=system_id, timestamp__lt=cutoff)
+                .select_for_update(skip_locked=True)
+                .order_by("timestamp")
+                .values_list("id", "timestamp", "ph", "temperature", "tds")[:block_size]
+            )
+            if not rows:
+                return archived, size
+            ids, timestamps, ph, temperature, tds = zip(*rows)
+            data = encode({
+                "id": ids,
+                "timestamp": [to_micros(value) for value in timestamps],
+                "ph": [fields["ph"].to_storage(value) for value in ph],
+                "temperature": [fields["temperature"].to_storage(value) for value in temperature],
+                "tds": tds,
+            }, codec)
+            MeasurementArchive.objects.create(
+                system_id=system_id, start=timestamps[0], end=timestamps[-1],
+                min_id=min(ids), max_id=max(ids), count=len(rows), codec=codec, data=data,
+            )
+            # readings committed since the SELECT stay hot until the next run
+            Measurement.objects.filter(id__in=ids).delete()
+        archived += len(rows)
+        size += len(data)
+
+
+def archive_older_than(days=None, block_size=None, codec=None, system_ids=None):
+    """
+    Archives readings older than `days` of all systems of the active shard, or of `system_ids`.
+    Systems of users being moved to another shard are skipped until the move is finished.
+    Returns `(archived readings, compressed bytes)`.
+    """
+    cutoff = timezone.now() - timedelta(days=days or get_config()["OLDER_THAN_DAYS"])
+    systems = Measurement.objects.filter(timestamp__lt=cutoff)
+    if system_ids:
+        systems = systems.filter(system_id__in=system_ids)
+    moving = sharding.moving_users()
+    if moving:
+        systems = systems.exclude(system__owner_id__in=moving)
+    archived = size = 0
+    for system_id in systems.order_by().values_list("system_id", flat=True).distinct():
+        rows, data = archive_system(system_id, cutoff, block_size, codec)
+        archived += rows
+        size += data
+    return archived, size
+
+
+def _scaled(decoded):
+    """
+    Concatenates decoded blocks, with fixed-point values as floats.
+    """
+    columns = {name: np.concatenate([block[name] for block in decoded]) for name, _, _ in COLUMNS}
+    for name, field in _fields().items():
+        columns[name] = columns[name] / field.factor
+    columns["tds"] = columns["tds"].astype(np.float64)
+    return columns
+
+
+def _time_range(filterset):
+    """
+    Returns the `(start, end)` timestamps selected by a valid `MeasurementFilter`, `None` when open.
+    """
+    data = filterset.form.cleaned_data if filterset is not None else {}
+    exact = data.get("timestamp")
+    return exact or data.get("timestamp_after"), exact or data.get("timestamp_before")
+
+
+def _filter_values(filterset):
+    """
+    Returns whether a valid `MeasurementFilter` filters on values, not only on time.
+    """
+    if filterset is None:
+        return False
+    data = filterset.form.cleaned_data
+    return any(
+        data.get(name) not in (None, "")
+        for name, filter_ in filterset.filters.items() if filter_.field_name != "timestamp"
+    )
+
+
+def _filter_mask(columns, filterset):
+    """
+    Returns the mask of archived readings matching a valid `MeasurementFilter`.
+    """
+    mask = np.ones(len(columns["id"]), dtype=bool)
+    if filterset is None:
+        return mask
+    data = filterset.form.cleaned_data
+    for name, filter_ in filterset.filters.items():
+        value = data.get(name)
+        if value is None or value == "":
+            continue
+        value = to_micros(value) if filter_.field_name == "timestamp" else float(value)
+        mask &= LOOKUPS[filter_.lookup_expr](columns[filter_.field_name], value)
+    return mask
+
+
+def read(system_id, start=None, end=None, ids=None):
+    """
+    Reads archived readings of a system between `start` and `end`, or with the given `ids`.
+    Returns `{column: array}` sorted by timestamp, with timestamps in microseconds since the epoch
+    and values as floats, or `None` when no block matches.
+    """
+    blocks = MeasurementArchive.objects.filter(system_id=system_id)
+    if start is not None:
+        blocks = blocks.filter(end__gte=start)
+    if end is not None:
+        blocks = blocks.filter(start__lte=end)
+    if ids is not None:
+        blocks = blocks.filter(min_id__lte=max(ids), max_id__gte=min(ids))
+    decoded = [decode(data, codec) for data, codec in blocks.values_list("data", "codec")]
+    if not decoded:
+        return None
+
+    columns = _scaled(decoded)
+    mask = np.ones(len(columns["id"]), dtype=bool)
+    if start is not None:
+        mask &= columns["timestamp"] >= to_micros(start)
+    if end is not None:
+        mask &= columns["timestamp"] <= to_micros(end)
+    if ids is not None:
+        mask &= np.isin(columns["id"], list(ids))
+    order = np.argsort(columns["timestamp"][mask], kind="stable")
+    return {name: values[mask][order] for name, values in columns.items()}
+
+
+def read_at(system_id, timestamps):
+    """
+    Reads the archived readings of a system stored at the given timestamps.
+    Only blocks overlapping the timestamps are decoded, so readings newer than the archive cost one query.
+    Returns `{column: array}` or `None` when no block matches.
+    """
+    if not timestamps:
+        return None
+    columns = read(system_id, min(timestamps), max(timestamps))
+    if columns is None:
+        return None
+    mask = np.isin(columns["timestamp"], [to_micros(value) for value in timestamps])
+    return {name: values[mask] for name, values in columns.items()}
+
+
+def read_filtered(system_id, filterset=None):
+    """
+    Reads archived readings of a system matching a valid `MeasurementFilter`.
+    Returns `{column: array}` or `None` when no block matches.
+    """
+    columns = read(system_id, *_time_range(filterset))
+    if columns is None or filterset is None:
+        return columns
+    mask = _filter_mask(columns, filterset)
+    return {name: values[mask] for name, values in columns.items()}
+
+
+def to_measurements(system_id, columns, indices=None):
+    """
+    Builds unsaved `Measurement` instances of archived readings for serialization.
+    """
+    indices = range(len(columns["id"])) if indices is None else indices
+    return [
+        Measurement(
+            id=int(columns["id"][i]), system_id=system_id,
+            ph=float(columns["ph"][i]), temperature=float(columns["temperature"][i]),
+            tds=int(columns["tds"][i]), timestamp=from_micros(columns["timestamp"][i]),
+        )
+        for i in indices
+    ]
+
+
+def get_archived(system_id, measurement_id):
+    """
+    Returns an archived reading by id, or `None`.
+    """
+    columns = read(system_id, ids=[measurement_id])
+    if columns is None or not len(columns["id"]):
+        return None
+    return to_measurements(system_id, columns)[0]
+
+
+def merge_series(system_id, filterset, timestamps, series):
+    """
+    Adds archived readings to `(timestamps in seconds, {field: values})` arrays
+    loaded from hot measurements, keeping them ordered by time.
+    """
+    archived = read_filtered(system_id, filterset)
+    if archived is None or not len(archived["id"]):
+        return timestamps, series
+    timestamps = np.concatenate((archived["timestamp"] / 1e6, timestamps))
+    order = np.argsort(timestamps, kind="stable")
+    return timestamps[order], {
+        field: np.concatenate((archived[field], values))[order] for field, values in series.items()
+    }
+
+
+class MergedMeasurements:
+    """
+    Sequence of hot measurements and archived readings in the requested ordering,
+    sliced by paginators like a queryset.
+
+    In time order, overlapping archive blocks are grouped into spans using only their metadata.
+    A page reads the hot rows between spans with an offset from the span boundary and decodes
+    only the blocks of the spans it covers, counting decodes only blocks cut by the filters.
+    Orderings by value cannot seek: a page sorts the keys of hot and archived readings up to its end,
+    but model instances are built for the page only.
+    """
+
+    def __init__(self, system_id, queryset, filterset=None, ordering="timestamp"):
+        self.system_id = system_id
+        self.filterset = filterset
+        self.field = ordering.lstrip("-")
+        self.descending = ordering.startswith("-")
+        tiebreak = "-timestamp" if self.descending else "timestamp"
+        self.queryset = queryset.order_by(ordering, tiebreak)
+        self.hot = queryset.order_by("timestamp")
+        self.start, self.end = _time_range(filterset)
+        self.filters_values = _filter_values(filterset)
+        blocks = MeasurementArchive.objects.filter(system_id=system_id)
+        if self.start is not None:
+            blocks = blocks.filter(end__gte=self.start)
+        if self.end is not None:
+            blocks = blocks.filter(start__lte=self.end)
+        self.blocks = list(blocks.order_by("start").values("id", "start", "end", "count"))
+        self._decoded = {}
+        self._hot_count = None
+        self._segments = None
+
+    def block(self, block):
+        """
+        Decodes a block once, returns its readings matching the filters sorted by timestamp.
+        """
+        if block["id"] not in self._decoded:
+            data, codec = MeasurementArchive.objects.values_list("data", "codec").get(id=block["id"])
+            columns = _scaled([decode(data, codec)])
+            mask = _filter_mask(columns, self.filterset)
+            order = np.argsort(columns["timestamp"][mask], kind="stable")
+            self._decoded[block["id"]] = {name: values[mask][order] for name, values in columns.items()}
+        return self._decoded[block["id"]]
+
+    def archived_count(self, block):
+        covered = ((self.start is None or block["start"] >= self.start)
+                   and (self.end is None or block["end"] <= self.end))
+        if covered and not self.filters_values:
+            return block["count"]
+        return len(self.block(block)["id"])
+
+    def hot_count(self):
+        if self._hot_count is None:
+            self._hot_count = self.queryset.count()
+        return self._hot_count
+
+    def count(self):
+        return self.hot_count() + sum(self.archived_count(block) for block in self.blocks)
+
+    def __len__(self):
+        return self.count()
+
+    def segments(self):
+        """
+        Splits the time line into spans of overlapping blocks and the gaps of hot rows between them.
+        Returns `[{"blocks", "low", "high", "size"}]` in ascending time, spans include their bounds,
+        gaps exclude them and are open at `None`.
+        """
+        if self._segments is not None:
+            return self._segments
+        spans = []
+        for block in self.blocks:
+            if spans and block["start"] <= spans[-1]["high"]:
+                spans[-1]["blocks"].append(block)
+                spans[-1]["high"] = max(spans[-1]["high"], block["end"])
+            else:
+                spans.append({"blocks": [block], "low": block["start"], "high": block["end"]})
+
+        # hot rows within the archived time range, usually none or a few back-dated readings
+        early = np.array([
+            to_micros(value) for value in
+            self.hot.filter(timestamp__lte=spans[-1]["high"]).values_list("timestamp", flat=True)
+        ] if spans else [], dtype=np.int64)
+        self._segments = []
+        # a gap follows the end of the previous span and the hot rows counted up to it
+        low, after = None, 0
+        for span in spans:
+            first = int(np.searchsorted(early, to_micros(span["low"])))
+            last = int(np.searchsorted(early, to_micros(span["high"]), side="right"))
+            self._segments.append({"blocks": [], "low": low, "high": span["low"], "size": first - after})
+            self._segments.append({
+                **span, "size": last - first + sum(self.archived_count(block) for block in span["blocks"]),
+            })
+            low, after = span["high"], last
+        self._segments.append({"blocks": [], "low": low, "high": None, "size": self.hot_count() - len(early)})
+        return self._segments
+
+    def read(self, segment, low, high):
+        """
+        Returns the readings `low:high` of a segment in ascending time.
+        """
+        hot = self.hot
+        if not segment["blocks"]:
+            if segment["low"] is not None:
+                hot = hot.filter(timestamp__gt=segment["low"])
+            if segment["high"] is not None:
+                hot = hot.filter(timestamp__lt=segment["high"])
+            return list(hot[low:high])
+
+        hot = list(hot.filter(timestamp__gte=segment["low"], timestamp__lte=segment["high"]))
+        archived = _concat([self.block(block) for block in segment["blocks"]])
+        timestamps = np.concatenate((
+            np.array([to_micros(m.timestamp) for m in hot], dtype=np.int64), archived["timestamp"]))
+        page = np.argsort(timestamps, kind="stable")[low:high]
+        return [
+            hot[i] if i < len(hot) else to_measurements(self.system_id, archived, [i - len(hot)])[0]
+            for i in page.tolist()
+        ]
+
+    def ascending(self, start, stop):
+        """
+        Returns the readings `start:stop` in ascending time, reading only the segments they cover.
+        """
+        items = []
+        offset = 0
+        for segment in self.segments():
+            low, high = max(start - offset, 0), min(stop - offset, segment["size"])
+            if low < high:
+                items += self.read(segment, low, high)
+            offset += segment["size"]
+            if offset >= stop:
+                break
+        return items
+
+    def key(self, value, timestamp):
+        return (float(value), timestamp)
+
+    def by_value(self, start, stop):
+        """
+        Returns the readings `start:stop` ordered by a value, merging the sort keys of hot rows
+        and of all matching archived readings.
+        """
+        archived = _concat([self.block(block) for block in self.blocks])
+        order = np.lexsort((archived["timestamp"], archived[self.field]))
+        order = (order[::-1] if self.descending else order)[:stop]
+        hot = [
+            (self.key(value, to_micros(timestamp)), False, pk)
+            for value, timestamp, pk in self.queryset.values_list(self.field, "timestamp", "pk")[:stop]
+        ]
+        cold = [
+            (self.key(archived[self.field][i], int(archived["timestamp"][i])), True, i)
+            for i in order.tolist()
+        ]
+        page = list(heapq.merge(hot, cold, key=lambda item: item[0], reverse=self.descending))[start:stop]
+        rows = self.queryset.in_bulk([pk for _, is_archived, pk in page if not is_archived])
+        return [
+            to_measurements(self.system_id, archived, [i])[0] if is_archived else rows[i]
+            for _, is_archived, i in page
+        ]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = self.count() if index.stop is None else index.stop
+        if self.field != "timestamp":
+            return self.by_value(start, stop)
+        if not self.descending:
+            return self.ascending(start, stop)
+        total = self.count()
+        return self.ascending(max(total - stop, 0), total - start)[::-1]
+
+
+def _concat(blocks):
+    """
+    Concatenates decoded blocks into one `{column: array}`, sorted by timestamp.
+    """
+    if not blocks:
+        return {name: np.empty(0) for name, _, _ in COLUMNS}
+    columns = {name: np.concatenate([block[name] for block in blocks]) for name, _, _ in COLUMNS}
+    order = np.argsort(columns["timestamp"], kind="stable")
+    return {name: values[order] for name, values in columns.items()}
+
+
+def summary():
+    """
+    Returns the number of archived readings, blocks and their compressed size.
+    """
+    stats = MeasurementArchive.objects.aggregate(
+        blocks=Count("id"), rows=Sum("count"), bytes=Sum(Length("data")),
+        first=Min("start"), last=Max("end"),
+    )
+    return {**stats, "rows": stats["rows"] or 0, "bytes": stats["bytes"] or 0}
@@ -0,0 +1,174 @@
+import contextvars
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import Resolver404, resolve
+from rest_framework.views import APIView
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# request headers that describe the batch body or its credentials, not the sub-requests
+EXCLUDED_HEADERS = {"HTTP_AUTHORIZATION", "HTTP_CONTENT_ENCODING", "HTTP_CONTENT_TYPE", "HTTP_CONTENT_LENGTH"}
+
+
+class InvalidBatch(Exception):
+    """
+    Raised for batch bodies that are not a list of sub-requests within the limits.
+    """
+
+
+def get_config():
+    """
+    Returns the `BATCH` settings with defaults.
+    """
+    return {
+        "MAX_REQUESTS": 100,
+        "WORKERS": 4,
+        **getattr(settings, "BATCH", {}),
+    }
+
+
+def parse(data):
+    """
+    Validates a batch body `{"requests": [{"id": ..., "method": "GET", "path": "/api/..."}, ...]}`.
+    Returns the list of `(id, path)` sub-requests, raises `InvalidBatch`.
+    """
+    items = data.get("requests") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise InvalidBatch("requests must be a non-empty list")
+    limit = get_config()["MAX_REQUESTS"]
+    if len(items) > limit:
+        raise InvalidBatch(f"A batch may contain at most {limit} requests")
+
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+            raise InvalidBatch(f"requests[{index}] must be an object with a path")
+        if str(item.get("method", "GET")).upper() != "GET":
+            raise InvalidBatch(f"requests[{index}]: only GET requests can be batched")
+        if not item["path"].startswith("/"):
+            raise InvalidBatch(f"requests[{index}]: path must be absolute, e.g. /api/systems/")
+        parsed.append((item.get("id", index), item["path"]))
+    return parsed
+
+
+def build_request(request, path):
+    """
+    Returns a GET request of `path` carrying the headers of the batch `request`
+    and its already authenticated user, so sub-requests skip token verification.
+    """
+    url = urlsplit(path)
+    environ = {
+        key: value for key, value in request.META.items()
+        if key.startswith("HTTP_") and key not in EXCLUDED_HEADERS
+    }
+    environ.update({
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": url.path,
+        "QUERY_STRING": url.query,
+        "SERVER_NAME": request.META.get("SERVER_NAME", "localhost"),
+        "SERVER_PORT": request.META.get("SERVER_PORT", "80"),
+        "REMOTE_ADDR": request.META.get("REMOTE_ADDR", ""),
+        "wsgi.url_scheme": request.scheme,
+        "wsgi.input": io.BytesIO(b""),
+    })
+    sub_request = WSGIRequest(environ)
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def dispatch(request, path, batch_view):
+    """
+    Runs a sub-request through the view of its route.
+    Returns `(endpoint, status, body)`, the body is `None` for responses that are not JSON data.
+    """
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return "unmatched", 404, {"error": "Not found"}
+    view_class = getattr(match.func, "view_class", None)
+    if view_class is None or not issubclass(view_class, APIView) or issubclass(view_class, batch_view):
+        return match.url_name, 400, {"error": "This endpoint cannot be batched"}
+
+    sub_request = build_request(request, path)
+    sub_request.resolver_match = match
+    try:
+        response = match.func(sub_request, *match.args, **match.kwargs)
+    except Exception:
+        logger.exception("Batched request %s failed", path)
+        return match.url_name, 500, {"error": "Internal server error"}
+    return match.url_name, response.status_code, getattr(response, "data", None)
+
+
+def _dispatch_all(request, paths, batch_view):
+    """
+    Runs sub-requests one after another on the connection of the current thread.
+    """
+    return {path: dispatch(request, path, batch_view) for path in paths}
+
+
+def _dispatch_in_thread(request, paths, batch_view):
+    # pool threads keep their connections between batches, only broken ones are replaced
+    for connection in connections.all(initialized_only=True):
+        if connection.errors_occurred and not connection.is_usable():
+            connection.close()
+    return _dispatch_all(request, paths, batch_view)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Returns the pool of `WORKERS` threads shared by all batches of the process,
+    so concurrent batches together hold at most `WORKERS` threads and database connections.
+    """
+    global _pool
+    workers = get_config()["WORKERS"]
+    with _pool_lock:
+        if _pool is None or _pool[0] != workers:
+            if _pool is not None:
+                _pool[1].shutdown(wait=False)
+            _pool = (workers, ThreadPoolExecutor(workers, thread_name_prefix="batch"))
+        return _pool[1]
+
+
+def execute(request, items, batch_view):
+    """
+    Runs the sub-requests of a batch and returns their responses in order.
+    Identical paths are run once. Distinct paths are split between up to `WORKERS` shares
+    run on the shared pool, each in a copy of the current context.
+    """
+    paths = list(dict.fromkeys(path for _, path in items))
+    workers = min(get_config()["WORKERS"], len(paths))
+    if workers <= 1:
+        results = _dispatch_all(request, paths, batch_view)
+    else:
+        pool = get_pool()
+        futures = [
+            pool.submit(
+                contextvars.copy_context().run, _dispatch_in_thread, request, paths[worker::workers], batch_view)
+            for worker in range(workers)
+        ]
+        results = {}
+        for future in futures:
+            results.update(future.result())
+
+    metrics.BATCH_SIZE.observe(len(items))
+    responses = []
+    for item_id, path in items:
+        endpoint, status, body = results[path]
+        metrics.BATCH_SUBREQUESTS.inc(endpoint=endpoint or "unmatched", status=status)
+        responses.append({"id": item_id, "status": status, "body": body})
+    return responses
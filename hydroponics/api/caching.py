@@ -0,0 +1,35 @@
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+
+
+def _cached_features():
+    from . import analytics, forecasting
+
+    return {"FORECAST": forecasting.get_config(), "ANALYTICS": analytics.get_config()}
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_caches(app_configs=None, **kwargs):
+    """
+    Forecasts and analytics are invalidated by version keys bumped by every process writing
+    measurements, such as the ingest worker. A per-process cache never sees the bumps of other
+    processes and keeps serving stale results, so their caches must be shared.
+    """
+    errors = []
+    for setting, config in _cached_features().items():
+        if isinstance(caches[config["CACHE"]], LocMemCache):
+            errors.append(checks.Error(
+                f"{setting}['CACHE'] '{config['CACHE']}' is a per-process local memory cache.",
+                hint="Use a cache shared by all processes, such as the 'shared' database cache or Redis.",
+                id="api.E001",
+            ))
+    return errors
+
+
+def create_cache_tables_after_migrate(using, **kwargs):
+    """
+    `post_migrate` receiver creating the tables of database caches.
+    """
+    call_command("createcachetable", database=using, verbosity=0)
@@ -0,0 +1,195 @@
+import base64
+import binascii
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from . import archive
+from .models import ChangeLog, EdgeSyncLink, HydroponicSystem, Measurement
+
+
+class InvalidCursor(Exception):
+    """
+    Raised for cursors that cannot be decoded.
+    """
+
+
+class ExpiredCursor(Exception):
+    """
+    Raised for cursors older than the change log retention, changes after them may be pruned.
+    """
+
+
+def get_config():
+    """
+    Returns the `CHANGES` settings with defaults.
+    """
+    return {
+        "RETENTION_DAYS": 30,
+        "PAGE_SIZE": 500,
+        "MAX_PAGE_SIZE": 5000,
+        **getattr(settings, "CHANGES", {}),
+    }
+
+
+def encode_cursor(position):
+    """
+    Encodes the position `(txid, id)` in the change log with the time the cursor was issued.
+    """
+    txid, change_id = position
+    return base64.urlsafe_b64encode(
+        f"{txid}:{change_id}:{int(time.time())}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, not_before=None):
+    """
+    Returns the change log position `(txid, id)` of a cursor.
+    Cursors issued before `not_before`, such as the time the user was moved to another shard, expire,
+    as do cursors holding only a change id, issued before changes were ordered by transaction.
+    Raises `InvalidCursor` or `ExpiredCursor`.
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        parts = [int(part) for part in value.split(":")]
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise InvalidCursor(cursor) from exc
+    if len(parts) == 2 and min(parts) >= 0:
+        raise ExpiredCursor(cursor)
+    if len(parts) != 3 or min(parts) < 0:
+        raise InvalidCursor(cursor)
+    txid, change_id, issued = parts
+    if issued < time.time() - get_config()["RETENTION_DAYS"] * 86400:
+        raise ExpiredCursor(cursor)
+    if not_before is not None and issued < not_before.timestamp():
+        raise ExpiredCursor(cursor)
+    return txid, change_id
+
+
+def watermark():
+    """
+    Returns the oldest transaction id which may still be running on PostgreSQL: every transaction
+    below it has committed or rolled back and any change logged later gets a higher one.
+    Returns `None` on other databases, which commit writes one at a time in the order of their ids.
+    """
+    connection = connections[router.db_for_read(ChangeLog)]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        return cursor.fetchone()[0]
+
+
+def visible():
+    """
+    Returns the changes safe to read in `(txid, id)` order.
+    Ids are assigned before transactions commit, so a slower transaction can commit a change
+    below an id already read. Changes of transactions at or above the `watermark` are held back
+    instead, every change committed later sorts after the visible ones by its transaction id,
+    so a cursor never moves past a change which is not committed yet.
+    """
+    changes = ChangeLog.objects.all()
+    oldest = watermark()
+    if oldest is not None:
+        changes = changes.filter(txid__lt=oldest)
+    return changes
+
+
+def after(position):
+    """
+    Returns the filter of changes after the position `(txid, id)`.
+    """
+    txid, change_id = position
+    return Q(txid__gt=txid) | Q(txid=txid, id__gt=change_id)
+
+
+def position(owner_id):
+    """
+    Returns the position of the user's last visible change, `(0, 0)` without changes.
+    """
+    last = (
+        visible().filter(owner_id=owner_id).order_by("-txid", "-id")
+        .values_list("txid", "id").first()
+    )
+    return last or (0, 0)
+
+
+def head(user):
+    """
+    Returns a cursor at the end of the user's change log,
+    clients take it before downloading full lists and read changes after it.
+    """
+    return encode_cursor(position(user.id))
+
+
+def feed(user, start, limit):
+    """
+    Returns `(changes, last position, has more)` of the user's systems and measurements after the position `start`.
+    Repeated changes of an object are collapsed into the latest one, upserts carry the current row,
+    read from the archive for readings moved there since, and are left out when the row no longer
+    exists, as its deletion follows in the feed.
+    """
+    entries = list(
+        visible().filter(after(start), owner=user).order_by("txid", "id")
+        .values_list("id", "model", "object_id", "system_id", "action", "txid")[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if not entries:
+        return [], start, False
+
+    latest = {}
+    for entry in entries:
+        latest.pop((entry[1], entry[2]), None)
+        latest[(entry[1], entry[2])] = entry
+    upserts = {
+        model: [object_id for (kind, object_id), entry in latest.items()
+                if kind == model and entry[4] == ChangeLog.Action.UPSERT]
+        for model in ChangeLog.Model.values
+    }
+    rows = {
+        ChangeLog.Model.SYSTEM: HydroponicSystem.objects.filter(
+            id__in=upserts[ChangeLog.Model.SYSTEM], owner=user).in_bulk(),
+        ChangeLog.Model.MEASUREMENT: Measurement.objects.filter(
+            id__in=upserts[ChangeLog.Model.MEASUREMENT], system__owner=user).in_bulk(),
+    }
+    archived = {}
+    for change_id, model, object_id, system_id, action, txid in latest.values():
+        missing = action == ChangeLog.Action.UPSERT and object_id not in rows[model]
+        if missing and model == ChangeLog.Model.MEASUREMENT:
+            archived.setdefault(system_id, []).append(object_id)
+    for system_id, ids in archived.items():
+        columns = archive.read(system_id, ids=ids)
+        if columns is not None:
+            rows[ChangeLog.Model.MEASUREMENT].update(
+                (measurement.id, measurement) for measurement in archive.to_measurements(system_id, columns))
+
+    changes = []
+    for change_id, model, object_id, system_id, action, txid in latest.values():
+        instance = None
+        if action == ChangeLog.Action.UPSERT:
+            instance = rows[model].get(object_id)
+            if instance is None:
+                continue
+        changes.append({
+            "model": model, "action": action, "id": object_id, "system": system_id,
+            "instance": instance,
+        })
+    return changes, (entries[-1][5], entries[-1][0]), has_more
+
+
+def prune(older_than_days=None):
+    """
+    Deletes changes older than the retention. Returns the number of deleted changes.
+    On an edge node the change log is also the queue of readings to sync upstream,
+    changes after the position of the least synced system are kept until it is synced.
+    """
+    days = older_than_days or get_config()["RETENTION_DAYS"]
+    changes = ChangeLog.objects.filter(created_at__lt=timezone.now() - timedelta(days=days))
+    if getattr(settings, "EDGE_MODE", False):
+        synced = EdgeSyncLink.objects.aggregate(synced=Min("last_change_id"))["synced"]
+        changes = changes.filter(id__lte=synced or 0)
+    return changes.delete()[0]
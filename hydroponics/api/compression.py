@@ -0,0 +1,250 @@
+import gzip
+import json
+import time
+import zlib
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+
+
+class DecompressedTooLarge(Exception):
+    """
+    Raised when a compressed body inflates beyond the allowed size.
+    """
+
+
+def get_config():
+    """
+    Returns the `COMPRESSION` settings with defaults.
+    """
+    return {
+        "ENABLED": True,
+        "ENCODINGS": ["zstd", "br", "gzip"],
+        "LEVELS": {"gzip": 6, "br": 4, "zstd": 3},
+        "MIN_SIZE": 512,
+        "CONTENT_TYPES": ["application/json", "text/"],
+        "MAX_DECOMPRESSED_SIZE": 10 * 1024 * 1024,
+        **getattr(settings, "COMPRESSION", {}),
+    }
+
+
+def _optional(module):
+    try:
+        return __import__(module)
+    except ImportError:
+        return None
+
+
+class GzipCodec:
+    name = "gzip"
+    decompresses = True
+
+    def compress(self, data, level):
+        return gzip.compress(data, level, mtime=0)
+
+    def stream(self, chunks, level):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    def decompress(self, data, limit):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(data, limit + 1)
+        except zlib.error as exc:
+            raise ValueError(str(exc)) from exc
+        if len(body) > limit or decompressor.unconsumed_tail:
+            raise DecompressedTooLarge
+        if not decompressor.eof:
+            raise ValueError("Truncated gzip body.")
+        return body
+
+
+class BrotliCodec:
+    name = "br"
+    decompresses = False
+
+    def __init__(self, brotli):
+        self.brotli = brotli
+
+    def compress(self, data, level):
+        return self.brotli.compress(data, quality=level)
+
+    def stream(self, chunks, level):
+        compressor = self.brotli.Compressor(quality=level)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+    def decompress(self, data, limit):
+        return self.brotli.decompress(data)
+
+
+class ZstdCodec:
+    name = "zstd"
+    decompresses = True
+
+    def __init__(self, zstandard):
+        self.zstandard = zstandard
+
+    def compress(self, data, level):
+        return self.zstandard.ZstdCompressor(level=level).compress(data)
+
+    def stream(self, chunks, level):
+        compressor = self.zstandard.ZstdCompressor(level=level).compressobj()
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(
+                self.zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    def decompress(self, data, limit):
+        parts, size = [], 0
+        try:
+            with self.zstandard.ZstdDecompressor().stream_reader(data) as reader:
+                while size <= limit:
+                    part = reader.read(limit + 1 - size)
+                    if not part:
+                        break
+                    parts.append(part)
+                    size += len(part)
+        except self.zstandard.ZstdError as exc:
+            raise ValueError(str(exc)) from exc
+        if size > limit:
+            raise DecompressedTooLarge
+        return b"".join(parts)
+
+
+def available_codecs():
+    """
+    Returns `{encoding: codec}` of the codecs whose packages are installed.
+    `br` requires `brotli` and `zstd` requires `zstandard`.
+    """
+    codecs = {"gzip": GzipCodec()}
+    brotli = _optional("brotli")
+    if brotli is not None:
+        codecs["br"] = BrotliCodec(brotli)
+    zstandard = _optional("zstandard")
+    if zstandard is not None:
+        codecs["zstd"] = ZstdCodec(zstandard)
+    return codecs
+
+
+CODECS = available_codecs()
+
+
+def parse_accept_encoding(header):
+    """
+    Parses an `Accept-Encoding` header into `{encoding: quality}`.
+    """
+    accepted = {}
+    for item in header.split(","):
+        encoding, _, params = item.strip().partition(";")
+        if not encoding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[encoding.strip().lower()] = quality
+    return accepted
+
+
+def negotiate(header, encodings=None):
+    """
+    Returns the codec of the most preferred available encoding the client accepts, or `None`.
+    Client qualities win, ties are broken by the order of `encodings`.
+    """
+    accepted = parse_accept_encoding(header or "")
+    best, best_quality = None, 0.0
+    for encoding in encodings or get_config()["ENCODINGS"]:
+        if encoding not in CODECS:
+            continue
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = CODECS[encoding], quality
+    return best
+
+
+def request_codec(encoding):
+    """
+    Returns the codec decompressing request bodies sent with the `Content-Encoding`, or `None`.
+    """
+    codec = CODECS.get(encoding)
+    return codec if codec is not None and codec.decompresses else None
+
+
+def sample_payloads(rows=500, seed=0):
+    """
+    Returns JSON payloads typical for the API: a sensor batch of `rows` readings
+    and a listing page of the same readings as returned by the measurements endpoint.
+    """
+    from .synthetic import generate_series
+
+    start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    timestamps, ph, temperature, tds = generate_series(
+        rows, start, 60, np.random.default_rng(seed))
+    readings = [
+        {
+            "ph": float(ph[i]),
+            "temperature": float(temperature[i]),
+            "tds": int(tds[i]),
+            "timestamp": datetime.fromtimestamp(timestamps[i], tz=dt_timezone.utc)
+            .isoformat().replace("+00:00", "Z"),
+        }
+        for i in range(rows)
+    ]
+    listing = {
+        "count": rows,
+        "next": None,
+        "previous": None,
+        "results": [{"id": i + 1, "system": 1, **reading} for i, reading in enumerate(readings)],
+    }
+    return {
+        "ingest batch": json.dumps(readings).encode(),
+        "listing page": json.dumps(listing).encode(),
+    }
+
+
+BENCHMARK_LEVELS = {"gzip": [1, 6, 9], "br": [1, 4, 9], "zstd": [1, 3, 10]}
+
+
+def benchmark(payloads, repeat=20):
+    """
+    Compresses and decompresses every payload with the available codecs at a few levels.
+    Returns a list of results with sizes, the ratio and the CPU time per operation in milliseconds.
+    """
+    results = []
+    for payload_name, payload in payloads.items():
+        for encoding, codec in CODECS.items():
+            for level in BENCHMARK_LEVELS[encoding]:
+                start = time.process_time()
+                for _ in range(repeat):
+                    compressed = codec.compress(payload, level)
+                compress_time = (time.process_time() - start) / repeat
+                start = time.process_time()
+                for _ in range(repeat):
+                    codec.decompress(compressed, len(payload))
+                decompress_time = (time.process_time() - start) / repeat
+                results.append({
+                    "payload": payload_name,
+                    "encoding": encoding,
+                    "level": level,
+                    "size": len(payload),
+                    "compressed": len(compressed),
+                    "ratio": len(payload) / len(compressed),
+                    "compress_ms": compress_time * 1000,
+                    "decompress_ms": decompress_time * 1000,
+                })
+    return results
@@ -0,0 +1,179 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import sharding
+from .models import ChangeLog, DeletionJob, HydroponicSystem, Measurement
+from .signals import notify_measurements_changed
+
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def chunk_size():
+    """
+    Returns the number of measurements deleted per transaction.
+    """
+    return getattr(settings, "DELETION", {}).get("CHUNK_SIZE", 10_000)
+
+
+def delete_measurements(system_ids, size=None, progress=None):
+    """
+    Deletes all measurements of the systems with set-based `DELETE ... WHERE id IN (SELECT ... LIMIT n)`
+    statements, `size` rows per transaction, without loading rows into Python.
+    `progress` is called with the number of rows deleted by every chunk.
+    Returns the number of deleted measurements.
+    """
+    size = size or chunk_size()
+    system_ids = list(system_ids)
+    total = 0
+    while system_ids:
+        chunk = Measurement.objects.filter(
+            system_id__in=system_ids).order_by().values("pk")[:size]
+        with transaction.atomic(using=sharding.db()):
+            deleted, _ = Measurement.objects.filter(pk__in=chunk).delete()
+        if not deleted:
+            break
+        total += deleted
+        if progress:
+            progress(deleted)
+    if total:
+        notify_measurements_changed(system_ids, "delete")
+    return total
+
+
+def delete_system(system_id, size=None, progress=None):
+    """
+    Deletes a hydroponic system, its measurements first in chunks.
+    Returns the number of deleted rows.
+    """
+    deleted = delete_measurements([system_id], size, progress)
+    systems = HydroponicSystem.objects.filter(id=system_id)
+    with transaction.atomic(using=sharding.db()):
+        # clients drop the measurements of a deleted system, they are not logged one by one
+        ChangeLog.objects.record(systems, ChangeLog.Action.DELETE)
+        return deleted + _delete(systems, progress)
+
+
+def delete_user(user_id, size=None, progress=None):
+    """
+    Deletes a user with their hydroponic systems, measurements first in chunks.
+    On a shard, the user's copy there is deleted with the systems before the user itself.
+    Returns the number of deleted rows.
+    """
+    shard = sharding.shard_of(user_id)
+    with sharding.use(shard):
+        system_ids = HydroponicSystem.objects.filter(owner_id=user_id).values_list("id", flat=True)
+        deleted = delete_measurements(system_ids, size, progress)
+        if shard != sharding.directory():
+            deleted += _delete(User.objects.using(shard).filter(id=user_id), progress)
+    return deleted + _delete(User.objects.filter(id=user_id), progress)
+
+
+def _delete(queryset, progress):
+    # cascades to the remaining related rows, such as readings stored while the chunks ran
+    deleted = queryset.delete()[0]
+    if progress:
+        progress(deleted)
+    return deleted
+
+
+DELETERS = {
+    DeletionJob.Target.SYSTEM: delete_system,
+    DeletionJob.Target.USER: delete_user,
+}
+
+
+def schedule(target, target_id, requested_by):
+    """
+    Creates a deletion job and starts it once the current transaction commits.
+    """
+    job = DeletionJob.objects.create(target=target, target_id=target_id, requested_by=requested_by)
+    transaction.on_commit(lambda: start(job.id))
+    return job
+
+
+def start(job_id):
+    """
+    Runs a job in a background thread, or inline when `DELETION['RUN_IN_THREAD']` is disabled.
+    """
+    if getattr(settings, "DELETION", {}).get("RUN_IN_THREAD", True):
+        threading.Thread(
+            target=_run_in_thread, args=(job_id,), name=f"deletion-{job_id}", daemon=True
+        ).start()
+    else:
+        run_job(job_id)
+
+
+def jobs_of(user_id):
+    """
+    Returns the deletion jobs writing to the shard of a user: deletions of their systems and of the user.
+    """
+    return DeletionJob.objects.filter(
+        Q(target=DeletionJob.Target.SYSTEM, requested_by_id=user_id)
+        | Q(target=DeletionJob.Target.USER, target_id=user_id)
+    )
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        connections.close_all()
+
+
+def run_job(job_id):
+    """
+    Runs a pending or interrupted deletion job, recording progress on the job.
+    Deleting is idempotent, so a job interrupted by a restart can run again.
+    Jobs of a user being moved between shards are left pending.
+    """
+    job = DeletionJob.objects.get(id=job_id)
+    if job.status not in (DeletionJob.Status.PENDING, DeletionJob.Status.RUNNING):
+        return job
+    DeletionJob.objects.filter(id=job_id).update(status=DeletionJob.Status.RUNNING)
+    # jobs of a user being moved to another shard wait, the move runs them once the user is switched
+    owner = job.requested_by_id if job.target == DeletionJob.Target.SYSTEM else job.target_id
+    if owner in sharding.moving_users():
+        DeletionJob.objects.filter(id=job_id).update(status=DeletionJob.Status.PENDING)
+        job.refresh_from_db()
+        return job
+
+    def progress(deleted):
+        DeletionJob.objects.filter(id=job_id).update(deleted_rows=F("deleted_rows") + deleted)
+
+    # systems are deleted by their owners, users are looked up on their shard by `delete_user`
+    shard = sharding.shard_of(job.requested_by_id) if job.target == DeletionJob.Target.SYSTEM else None
+    try:
+        with sharding.use(shard):
+            DELETERS[job.target](job.target_id, progress=progress)
+    except Exception as error:
+        logger.exception("Deletion job %s failed", job_id)
+        DeletionJob.objects.filter(id=job_id).update(
+            status=DeletionJob.Status.FAILED, error=str(error), finished_at=timezone.now())
+    else:
+        DeletionJob.objects.filter(id=job_id).update(
+            status=DeletionJob.Status.DONE, finished_at=timezone.now())
+    job.refresh_from_db()
+    return job
+
+
+def resume_jobs():
+    """
+    Runs jobs left pending or running, for example by a restarted server.
+    Returns the number of jobs run.
+    """
+    job_ids = list(DeletionJob.objects.filter(
+        status__in=[DeletionJob.Status.PENDING, DeletionJob.Status.RUNNING]
+    ).order_by("id").values_list("id", flat=True))
+    for job_id in job_ids:
+        close_old_connections()
+        run_job(job_id)
+    return len(job_ids)
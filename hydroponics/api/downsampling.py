@@ -0,0 +1,90 @@
+from itertools import islice
+
+import numpy as np
+
+
+def lttb(x, y, threshold):
+    """
+    Selects `threshold` points of a series with the Largest-Triangle-Three-Buckets algorithm.
+    The first and last points are kept, every bucket in between contributes the point forming
+    the largest triangle with the previously selected point and the average of the next bucket.
+    Returns the indices of the selected points in ascending order.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # bucket i spans bounds[i]:bounds[i + 1], the last bound closes the averaging range
+    bounds = np.append(1 + np.arange(threshold - 1) * (n - 2) // (threshold - 2), n)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for bucket in range(threshold - 2):
+        start, end, next_end = bounds[bucket], bounds[bucket + 1], bounds[bucket + 2]
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        ax, ay = x[selected], y[selected]
+        areas = np.abs((ax - avg_x) * (y[start:end] - ay) - (ax - x[start:end]) * (avg_y - ay))
+        selected = start + int(areas.argmax())
+        indices[bucket + 1] = selected
+    return indices
+
+
+def minmax(x, y, threshold):
+    """
+    Splits the time range into `threshold // 2` equal buckets, like pixel columns of a chart,
+    and keeps the lowest and highest point of every non-empty bucket.
+    Returns the indices of the selected points in ascending order.
+    """
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+
+    buckets = max(1, threshold // 2)
+    edges = np.linspace(x[0], x[-1], buckets + 1)[1:-1]
+    bounds = np.concatenate(([0], np.searchsorted(x, edges, side="right"), [n]))
+    picked = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if start == end:
+            continue
+        segment = y[start:end]
+        picked += [start + segment.argmin(), start + segment.argmax()]
+    return np.unique(picked)
+
+
+METHODS = {
+    "lttb": lttb,
+    "minmax": minmax,
+}
+
+
+def load_series(queryset, fields, chunk_size=10_000):
+    """
+    Streams `timestamp` and `fields` of the queryset ordered by time into NumPy arrays,
+    converting `chunk_size` rows at a time.
+    Returns `(timestamps, {field: values})`, where timestamps are seconds since the epoch.
+    """
+    rows = queryset.order_by("timestamp").values_list("timestamp", *fields).iterator(
+        chunk_size=chunk_size)
+    chunks = []
+    while chunk := list(islice(rows, chunk_size)):
+        chunks.append(np.array(
+            [(timestamp.timestamp(), *values) for timestamp, *values in chunk], dtype=np.float64))
+    data = np.concatenate(chunks) if chunks else np.empty((0, len(fields) + 1))
+    return data[:, 0], {field: data[:, column + 1] for column, field in enumerate(fields)}
+
+
+def downsample(timestamps, series, points, method="lttb"):
+    """
+    Reduces every series to at most `points` points with the given method.
+    Returns `{field: [[epoch milliseconds, value], ...]}`.
+    """
+    select = METHODS[method]
+    milliseconds = (timestamps * 1000).round().astype(np.int64)
+    result = {}
+    for field, values in series.items():
+        indices = select(timestamps, values, points)
+        result[field] = [
+            [int(t), float(v)] for t, v in zip(milliseconds[indices], values[indices])
+        ]
+    return result
@@ -0,0 +1,153 @@
+import gzip
+import json
+import logging
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import ChangeLog, EdgeSyncLink, Measurement
+
+
+logger = logging.getLogger(__name__)
+
+
+class SyncError(Exception):
+    """
+    Raised when the upstream server is unreachable or rejects a request.
+    """
+
+
+def get_config():
+    """
+    Returns the `EDGE` settings with defaults.
+    """
+    return {
+        "UPSTREAM_URL": None,
+        "USERNAME": None,
+        "PASSWORD": None,
+        "BATCH_SIZE": 5_000,
+        "INTERVAL": 60,
+        "TIMEOUT": 30,
+        **getattr(settings, "EDGE", {}),
+    }
+
+
+class UpstreamClient:
+    """
+    Client of the central server's API, authenticated with a JWT obtained for the configured user.
+    Measurement batches are sent gzip compressed.
+    """
+
+    def __init__(self, base_url=None, username=None, password=None, timeout=None):
+        config = get_config()
+        self.base_url = (base_url or config["UPSTREAM_URL"] or "").rstrip("/")
+        self.username = username or config["USERNAME"]
+        self.password = password or config["PASSWORD"]
+        self.timeout = timeout or config["TIMEOUT"]
+        if not self.base_url or not self.username:
+            raise ImproperlyConfigured(
+                "Edge sync requires EDGE['UPSTREAM_URL'], EDGE['USERNAME'] and EDGE['PASSWORD'].")
+        self.token = None
+
+    def request(self, method, path, body=None, compress=False):
+        """
+        Sends a JSON request. Returns `(status, decoded body)`, raises `SyncError` when unreachable.
+        """
+        data = json.dumps(body, cls=DjangoJSONEncoder).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, method=method)
+        request.add_header("Content-Type", "application/json")
+        if compress and data is not None:
+            data = gzip.compress(data)
+            request.add_header("Content-Encoding", "gzip")
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(request, data=data, timeout=self.timeout) as response:
+                payload = response.read()
+                return response.status, json.loads(payload) if payload else None
+        except urllib.error.HTTPError as error:
+            return error.code, None
+        except (urllib.error.URLError, OSError) as error:
+            raise SyncError(f"Upstream server unreachable: {error}") from error
+
+    def authenticate(self):
+        status, tokens = self.request(
+            "POST", "/api/token/", {"username": self.username, "password": self.password})
+        if status != 200:
+            raise SyncError(f"Upstream authentication failed with status {status}")
+        self.token = tokens["access"]
+
+    def post_readings(self, remote_system_id, readings):
+        """
+        Stores readings in a system of the upstream server, overwriting readings with the same timestamp.
+        Retried batches are deduplicated upstream by `(system, timestamp)`.
+        """
+        if self.token is None:
+            self.authenticate()
+        path = f"/api/systems/{remote_system_id}/measurements/?on_conflict=update"
+        status, _ = self.request("POST", path, readings, compress=True)
+        if status == 401:
+            self.authenticate()
+            status, _ = self.request("POST", path, readings, compress=True)
+        if status not in (201, 202):
+            raise SyncError(f"Upstream rejected a batch with status {status}")
+
+
+def pending(link):
+    """
+    Returns the ids of change log entries of readings of the link's system not synced yet.
+    """
+    return ChangeLog.objects.filter(
+        model=ChangeLog.Model.MEASUREMENT, action=ChangeLog.Action.UPSERT,
+        system_id=link.system_id, id__gt=link.last_change_id,
+    ).order_by("id")
+
+
+def sync_link(link, client, batch_size=None):
+    """
+    Sends readings stored or updated since the last sync of a system upstream in batches of `batch_size`.
+    The position is saved after every accepted batch, so an interrupted sync resumes where it stopped.
+    Returns the number of synced readings, raises `SyncError` after recording it on the link.
+    """
+    batch_size = batch_size or get_config()["BATCH_SIZE"]
+    synced = 0
+    while True:
+        entries = list(pending(link).values_list("id", "object_id")[:batch_size])
+        if not entries:
+            break
+        readings = list(
+            Measurement.objects.filter(id__in={object_id for _, object_id in entries})
+            .order_by("timestamp").values("ph", "temperature", "tds", "timestamp")
+        )
+        if readings:
+            try:
+                client.post_readings(link.remote_system_id, readings)
+            except SyncError as error:
+                link.last_error = str(error)
+                link.save(update_fields=["last_error"])
+                raise
+        link.last_change_id = entries[-1][0]
+        link.synced_rows += len(readings)
+        link.last_synced_at = timezone.now()
+        link.last_error = ""
+        link.save(update_fields=["last_change_id", "synced_rows", "last_synced_at", "last_error"])
+        synced += len(readings)
+    return synced
+
+
+def sync_all(client, batch_size=None):
+    """
+    Syncs all linked systems. Returns `{system id: synced readings}`,
+    systems whose sync failed are left out and retried on the next run.
+    """
+    results = {}
+    for link in EdgeSyncLink.objects.order_by("system_id"):
+        try:
+            results[link.system_id] = sync_link(link, client, batch_size)
+        except SyncError:
+            logger.warning("Edge sync of system %s failed", link.system_id, exc_info=True)
+    return results
@@ -0,0 +1,90 @@
+import copy
+
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models
+
+
+SMALLINT_RANGE = (-32768, 32767)
+
+
+class FixedPointField(models.FloatField):
+    """
+    Float field stored as a scaled `smallint` column.
+
+    A value with `decimal_places=2` such as `6.53` is stored as `653`,
+    taking 2 bytes instead of the 8 bytes of a double precision column.
+    Python code, filters, ordering and aggregates such as `Avg` work with floats,
+    values are rounded to `decimal_places` when they are saved.
+    """
+
+    def __init__(self, *args, decimal_places=2, **kwargs):
+        # not stored as `decimal_places`, which serializers treat as a decimal field option
+        self.places = decimal_places
+        self.factor = 10 ** decimal_places
+        super().__init__(*args, **kwargs)
+
+    @property
+    def validators(self):
+        low, high = SMALLINT_RANGE
+        return [
+            *super().validators,
+            MinValueValidator(low / self.factor),
+            MaxValueValidator(high / self.factor),
+        ]
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["decimal_places"] = self.places
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        return "SmallIntegerField"
+
+    def to_storage(self, value):
+        """
+        Converts a float into the stored integer.
+        """
+        return round(float(value) * self.factor)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        return self.to_storage(value)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return value / self.factor
+
+
+class CoveringUniqueConstraint(models.UniqueConstraint):
+    """
+    Unique constraint whose `include` columns are only added where covering indexes are supported.
+
+    Django skips a unique constraint with `include` entirely on other databases,
+    this one falls back to a plain unique constraint there, so uniqueness holds everywhere.
+    """
+
+    def _supported(self, schema_editor):
+        if schema_editor.connection.features.supports_covering_indexes:
+            return self
+        plain = copy.copy(self)
+        plain.include = ()
+        return plain
+
+    def constraint_sql(self, model, schema_editor):
+        return super(CoveringUniqueConstraint, self._supported(schema_editor)).constraint_sql(
+            model, schema_editor)
+
+    def create_sql(self, model, schema_editor):
+        return super(CoveringUniqueConstraint, self._supported(schema_editor)).create_sql(
+            model, schema_editor)
+
+    def remove_sql(self, model, schema_editor):
+        return super(CoveringUniqueConstraint, self._supported(schema_editor)).remove_sql(
+            model, schema_editor)
+
+    def _check(self, model, connection):
+        # the missing `include` is expected, not worth a warning
+        return [error for error in super()._check(model, connection) if error.id != "models.W039"]
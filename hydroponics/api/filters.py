@@ -1,4 +1,7 @@
 import django_filters
+from django.db import connections
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Upper
 from .models import Measurement, HydroponicSystem
 
 
@@ -29,14 +32,46 @@ class MeasurementFilter(django_filters.FilterSet):
 class HydroponicSystemFilter(django_filters.FilterSet):
     """
     Filter class for hydroponic system,
-    allowing filtering by time range.
+    allowing filtering by time range and searching by name.
     """
     
     date_after = django_filters.DateTimeFilter(
         field_name='created_date', lookup_expr="gte")
     date_before = django_filters.DateTimeFilter(
         field_name='created_date', lookup_expr="lte")
+    search = django_filters.CharFilter(method="filter_search")
     
     class Meta: 
         model  = HydroponicSystem
-        fields = ["created_date"]
\ No newline at end of file
+        fields = ["created_date"]
+
+    def filter_search(self, queryset, name, value):
+        """
+        Matches systems whose name contains the value or resembles it,
+        annotating the relevance as `search_rank` between 0 and 1.
+        """
+        return search_systems(queryset, value)
+
+
+def search_systems(queryset, query):
+    """
+    Searches systems by name, annotating `search_rank`.
+    PostgreSQL matches substrings and similar words with the `pg_trgm` GIN index on `upper(name)`
+    and ranks by word similarity, other databases match substrings only
+    and rank exact names above prefixes above other substrings.
+    """
+    if connections[queryset.db].vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        # `icontains` compiles to `UPPER(name) LIKE UPPER(...)`, both conditions use the
+        # index expression, trigrams ignore case so similarity is unchanged
+        return queryset.alias(upper_name=Upper("name")).filter(
+            Q(name__icontains=query) | Q(upper_name__trigram_word_similar=query)
+        ).annotate(search_rank=TrigramWordSimilarity(query, "name"))
+
+    return queryset.filter(name__icontains=query).annotate(search_rank=Case(
+        When(name__iexact=query, then=Value(1.0)),
+        When(name__istartswith=query, then=Value(0.75)),
+        default=Value(0.5),
+        output_field=FloatField(),
+    ))
\ No newline at end of file
@@ -0,0 +1,291 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Subquery
+from django.dispatch import receiver
+
+from . import changes, sharding
+from .models import ChangeLog, HydroponicSystem, Measurement
+from .signals import measurements_changed
+
+
+METHODS = ["linear", "holt"]
+SECONDS_PER_HOUR = 3600
+# more new readings than this are fitted by a refit of the window
+MAX_EXTEND = 5_000
+
+
+def get_config():
+    """
+    Returns the `FORECAST` settings with defaults.
+    """
+    return {
+        "CACHE": "shared",
+        "TIMEOUT": 24 * SECONDS_PER_HOUR,
+        **getattr(settings, "FORECAST", {}),
+    }
+
+
+def get_cache():
+    return caches[get_config()["CACHE"]]
+
+
+def _version_key(system_id, kind):
+    return f"forecast:{system_id}:{kind}"
+
+
+def _versions(cache, system_id):
+    """
+    Returns `(changes, rewrites)` versions of a system's measurements.
+    Missing versions start at the current time, so an evicted version never matches a stale state.
+    """
+    keys = [_version_key(system_id, "changes"), _version_key(system_id, "rewrites")]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return versions[keys[0]], versions[keys[1]]
+
+
+def _bump(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+@receiver(measurements_changed)
+def invalidate(sender, system_ids, kind, **kwargs):
+    """
+    Marks fitted states of the systems as stale.
+    New readings are fitted incrementally, updates and deletions require a full refit.
+    """
+    cache = get_cache()
+    for system_id in system_ids:
+        _bump(cache, _version_key(system_id, "changes"))
+        if kind != "create":
+            _bump(cache, _version_key(system_id, "rewrites"))
+
+
+def _fetch(queryset, field):
+    """
+    Fetches `(ids, hours since the epoch, values)` arrays of a columnar `values_list()` query.
+    """
+    rows = list(queryset.values_list("id", "timestamp", field))
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    hours = np.fromiter(
+        (row[1].timestamp() / SECONDS_PER_HOUR for row in rows), dtype=np.float64, count=len(rows))
+    values = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+    return ids, hours, values
+
+
+def _holt(hours, values, alpha, beta, level=None, trend=None, last=None):
+    """
+    Holt's linear trend smoothing for irregularly spaced readings, trend in units per hour.
+    Continues from `level`, `trend` and the time `last` of a previous fit when given.
+    Returns `(level, trend, last time, squared one-step errors)`.
+    """
+    errors = []
+    start = 0
+    if level is None:
+        if len(values) < 2:
+            return None, None, None, errors
+        level, trend, last, start = values[0], 0.0, hours[0], 1
+    for t, y in zip(hours[start:].tolist(), values[start:].tolist()):
+        dt = max(t - last, 1e-9)
+        predicted = level + trend * dt
+        errors.append((y - predicted) ** 2)
+        previous = level
+        level = alpha * y + (1 - alpha) * predicted
+        trend = beta * (level - previous) / dt + (1 - beta) * trend
+        last = t
+    return level, trend, last, errors
+
+
+class Forecaster:
+    """
+    Fits the trend of one measurement field of a system over the last `window` hours of readings
+    with a least-squares line (`linear`) or Holt's smoothing (`holt`).
+
+    Fitted states are cached per system and versioned by `measurements_changed`:
+    without new readings the cached fit is reused without querying the database,
+    readings logged in the change log after the fitted position are fetched by id and fitted
+    incrementally, and updates or deletions trigger a full refit of the window.
+    """
+
+    def __init__(self, system_id, field, method="linear", window=24, alpha=0.3, beta=0.1):
+        self.system_id = system_id
+        self.field = field
+        self.method = method
+        self.window = window
+        self.alpha = alpha
+        self.beta = beta
+        self.cache = get_cache()
+
+    @property
+    def key(self):
+        # v3: states hold the change log position and shard of the fit
+        return (f"forecast:v3:{self.system_id}:{self.field}:{self.method}:{self.window}"
+                f":{self.alpha}:{self.beta}")
+
+    def readings(self):
+        return Measurement.objects.filter(system_id=self.system_id).order_by("timestamp")
+
+    def logged(self):
+        """
+        Returns the visible change log entries of readings of the system stored or re-sent.
+        """
+        owner = HydroponicSystem.objects.filter(id=self.system_id).values("owner_id")
+        return changes.visible().filter(
+            owner_id=Subquery(owner), system_id=self.system_id,
+            model=ChangeLog.Model.MEASUREMENT, action=ChangeLog.Action.UPSERT,
+        )
+
+    def state(self):
+        """
+        Returns the fitted state, refreshing the cached one if readings have changed.
+        """
+        changes, rewrites = _versions(self.cache, self.system_id)
+        state = self.cache.get(self.key)
+        if state is not None and state["changes"] == changes:
+            return state
+        # change log positions of different shards are not comparable
+        if state is not None and state["rewrites"] == rewrites and state["shard"] == sharding.db():
+            state = self.extend(state)
+        else:
+            state = self.refit()
+        state.update(changes=changes, rewrites=rewrites, shard=sharding.db())
+        self.cache.set(self.key, state, get_config()["TIMEOUT"])
+        return state
+
+    def refit(self):
+        """
+        Fits the readings of the last `window` hours before the latest one.
+        The change log position is taken first, readings logged later are fitted by `extend`,
+        those already read are recognized by their ids.
+        """
+        position = self.logged().order_by("-txid", "-id").values_list("txid", "id").first() or (0, 0)
+        latest = self.readings().order_by("-timestamp").values_list("timestamp", flat=True).first()
+        if latest is None:
+            state = self.fit(np.empty(0, dtype=np.int64), np.empty(0), np.empty(0))
+        else:
+            ids, hours, values = _fetch(
+                self.readings().filter(timestamp__gte=latest - timedelta(hours=self.window)),
+                self.field,
+            )
+            state = self.fit(ids, hours, values)
+        state["position"] = tuple(position)
+        return state
+
+    def extend(self, state):
+        """
+        Adds readings stored after the state was fitted, dropping readings that left the window.
+        Ids are assigned before transactions commit, so a reading committed late may have a lower id
+        than fitted ones: new readings are found by the change log entries after the fitted position,
+        which is ordered by committing transaction, and only readings missing from the fit are fetched.
+        """
+        if not len(state["ids"]):
+            return self.refit()
+        logged = list(
+            self.logged().filter(changes.after(state["position"])).order_by("txid", "id")
+            .values_list("txid", "id", "object_id")[:MAX_EXTEND + 1]
+        )
+        if len(logged) > MAX_EXTEND:
+            return self.refit()
+        if not logged:
+            return state
+        position = logged[-1][:2]
+        logged = np.array([entry[2] for entry in logged], dtype=np.int64)
+        missing = logged[~np.isin(logged, state["ids"])]
+        start = datetime.fromtimestamp(
+            (state["hours"][-1] - self.window) * SECONDS_PER_HOUR, tz=dt_timezone.utc)
+        ids, hours, values = _fetch(
+            self.readings().filter(id__in=missing.tolist(), timestamp__gte=start), self.field)
+        if not len(ids):
+            return {**state, "position": position}
+        in_order = hours[0] >= state["hours"][-1]
+        all_ids = np.concatenate((state["ids"], ids))
+        all_hours = np.concatenate((state["hours"], hours))
+        all_values = np.concatenate((state["values"], values))
+        order = np.argsort(all_hours, kind="stable")
+        all_ids, all_hours, all_values = all_ids[order], all_hours[order], all_values[order]
+        keep = all_hours >= all_hours[-1] - self.window
+        continued = None
+        if self.method == "holt" and in_order and state["level"] is not None:
+            continued = (state, hours, values)
+        extended = self.fit(all_ids[keep], all_hours[keep], all_values[keep], continued)
+        extended["position"] = position
+        return extended
+
+    def fit(self, ids, hours, values, continued=None):
+        """
+        Fits the window of readings with the measurement `ids`.
+        Holt's smoothing of readings appended in order continues
+        from the previous state in `continued`.
+        """
+        state = {
+            "ids": ids,
+            "hours": hours,
+            "values": values,
+            "samples": len(values),
+            "last": float(hours[-1]) if len(hours) else None,
+            "level": None,
+            "trend": None,
+            "sigma": None,
+        }
+        if self.method == "linear":
+            if len(values) >= 3 and np.ptp(hours) > 0:
+                offsets = hours - hours[-1]
+                trend, level = np.polyfit(offsets, values, 1)
+                residuals = values - (level + trend * offsets)
+                state.update(level=float(level), trend=float(trend),
+                             sigma=float(np.sqrt((residuals ** 2).sum() / (len(values) - 2))))
+            return state
+
+        if continued:
+            previous, new_hours, new_values = continued
+            level, trend, last, errors = _holt(
+                new_hours, new_values, self.alpha, self.beta,
+                previous["level"], previous["trend"], previous["last"])
+            squared, count = previous["squared_errors"] + sum(errors), previous["errors"] + len(errors)
+        else:
+            level, trend, last, errors = _holt(hours, values, self.alpha, self.beta)
+            squared, count = sum(errors), len(errors)
+        state.update(squared_errors=squared, errors=count)
+        if level is not None:
+            state.update(level=float(level), trend=float(trend), last=float(last),
+                         sigma=float(np.sqrt(squared / count)) if count else 0.0)
+        return state
+
+    def forecast(self, horizon=6, steps=6):
+        """
+        Returns the fitted trend and `steps` predictions up to `horizon` hours after
+        the latest reading, with 95% bounds.
+        """
+        state = self.state()
+        result = {
+            "samples": state["samples"],
+            "level": state["level"],
+            "trend_per_hour": state["trend"],
+            "sigma": state["sigma"],
+            "forecast": [],
+        }
+        if state["level"] is None:
+            return result
+        offsets = np.linspace(horizon / steps, horizon, steps)
+        predictions = state["level"] + state["trend"] * offsets
+        margin = 1.96 * state["sigma"]
+        for offset, value in zip(offsets.tolist(), predictions.tolist()):
+            timestamp = datetime.fromtimestamp(
+                (state["last"] + offset) * SECONDS_PER_HOUR, tz=dt_timezone.utc)
+            result["forecast"].append({
+                "timestamp": timestamp.isoformat().replace("+00:00", "Z"),
+                "value": round(value, 3),
+                "lower": round(value - margin, 3),
+                "upper": round(value + margin, 3),
+            })
+        return result
@@ -0,0 +1,290 @@
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import metrics, sharding
+from .models import IngestBatch, Measurement
+
+
+logger = logging.getLogger(__name__)
+
+# errors of the database connection, the batches themselves are not at fault
+TRANSIENT_ERRORS = (InterfaceError, OperationalError)
+MAX_BACKOFF = 60
+
+
+class QueueFull(Exception):
+    """
+    Raised when the queue holds `max_rows` readings and cannot accept more.
+    """
+
+
+class IngestQueue:
+    """
+    Durable local queue of accepted measurement batches.
+
+    Batches are appended to a SQLite database in WAL mode, so acknowledging a reading
+    costs one local fsync instead of a round trip to PostgreSQL.
+    A worker drains the queue into `Measurement` with `drain()`.
+    Delivery is at least once: a batch is removed from the queue only after it has been
+    committed, and batches already recorded in the `IngestBatch` ledger are skipped.
+    A batch failing `max_attempts` times is moved to the `quarantine` table.
+    """
+
+    def __init__(self, path, max_rows=100_000, max_attempts=5):
+        self.path = str(path)
+        self.max_rows = max_rows
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=FULL")
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    batch_id TEXT NOT NULL UNIQUE,
+                    system_id INTEGER NOT NULL,
+                    rows INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    update_conflicts INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS quarantine (
+                    id INTEGER PRIMARY KEY,
+                    batch_id TEXT NOT NULL,
+                    system_id INTEGER NOT NULL,
+                    rows INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    update_conflicts INTEGER NOT NULL,
+                    error TEXT NOT NULL,
+                    quarantined_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS state (pending INTEGER NOT NULL);
+                INSERT INTO state (pending) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM state);
+            """)
+            # columns added after the first queues were created
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(entries)")}
+            for column in ("update_conflicts", "attempts"):
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE entries ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+            self._local.connection = connection
+        return connection
+
+    def pending(self):
+        """
+        Returns the number of readings waiting in the queue.
+        """
+        return self.connection.execute("SELECT pending FROM state").fetchone()[0]
+
+    def quarantined(self):
+        """
+        Returns the number of batches moved to the quarantine after failing `max_attempts` times.
+        """
+        return self.connection.execute("SELECT count(*) FROM quarantine").fetchone()[0]
+
+    def enqueue(self, system_id, readings, update=False):
+        """
+        Appends readings of one system as a single batch.
+        Every reading is a dictionary of `ph`, `temperature`, `tds` and `timestamp`.
+        With `update`, the readings overwrite stored readings of the same timestamp when drained.
+        Returns the batch id, or raises `QueueFull`.
+        """
+        batch_id = uuid.uuid4().hex
+        payload = json.dumps(readings, default=str)
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            pending = connection.execute("SELECT pending FROM state").fetchone()[0]
+            if pending + len(readings) > self.max_rows:
+                raise QueueFull(f"Ingest queue holds {pending} readings.")
+            connection.execute(
+                "INSERT INTO entries (batch_id, system_id, rows, payload, update_conflicts) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (batch_id, system_id, len(readings), payload, int(update)),
+            )
+            connection.execute("UPDATE state SET pending = pending + ?", (len(readings),))
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return batch_id
+
+    def drain(self, max_rows=5_000):
+        """
+        Moves up to `max_rows` queued readings (at least one batch) into `Measurement`
+        in a single transaction per shard, skipping readings already stored for the same timestamp.
+        Batches of users frozen by a shard move are left in the queue.
+        When a shard's transaction fails, its batches are applied one by one and the failing ones
+        stay queued for another attempt or are quarantined. Connection errors are raised.
+        Returns the number of readings written.
+        """
+        # batches of users frozen by a move stay queued until the user is switched to the new shard,
+        # they are skipped so that they do not hold back the batches of other users
+        held = sharding.frozen_systems(
+            [row[0] for row in self.connection.execute("SELECT DISTINCT system_id FROM entries")])
+        entries = []
+        total = 0
+        cursor = self.connection.execute(
+            "SELECT id, batch_id, system_id, rows, payload, update_conflicts, attempts FROM entries "
+            f"WHERE system_id NOT IN ({', '.join('?' * len(held))}) ORDER BY id",
+            sorted(held),
+        )
+        for entry in cursor:
+            if entries and total + entry[3] > max_rows:
+                break
+            entries.append(entry)
+            total += entry[3]
+        cursor.close()
+        if not entries:
+            return 0
+
+        # readings of systems deleted while they were queued are dropped
+        shards = sharding.locate_systems({entry[2] for entry in entries})
+        written = 0
+        failed = {}
+        for alias in set(shards.values()):
+            shard_entries = [entry for entry in entries if shards.get(entry[2]) == alias]
+            with sharding.use(alias):
+                try:
+                    written += self._apply(shard_entries)
+                except TRANSIENT_ERRORS:
+                    raise
+                except Exception:
+                    # one bad batch fails the whole transaction, find it by applying them one by one
+                    for entry in shard_entries:
+                        try:
+                            written += self._apply([entry])
+                        except TRANSIENT_ERRORS:
+                            raise
+                        except Exception as error:
+                            logger.warning("Queued batch %s failed", entry[1], exc_info=True)
+                            failed[entry[0]] = repr(error)
+
+        retried = [entry for entry in entries if entry[0] in failed and entry[6] + 1 < self.max_attempts]
+        quarantined = [entry for entry in entries if entry[0] in failed and entry not in retried]
+        removed = [entry for entry in entries if entry not in retried]
+
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        connection.executemany(
+            "UPDATE entries SET attempts = attempts + 1 WHERE id = ?", [(entry[0],) for entry in retried])
+        connection.executemany(
+            "INSERT INTO quarantine (batch_id, system_id, rows, payload, update_conflicts, error, quarantined_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(*entry[1:6], failed[entry[0]], timezone.now().isoformat()) for entry in quarantined],
+        )
+        connection.execute(
+            f"DELETE FROM entries WHERE id IN ({', '.join('?' * len(removed))})",
+            [entry[0] for entry in removed],
+        )
+        connection.execute("UPDATE state SET pending = pending - ?", (sum(entry[3] for entry in removed),))
+        connection.execute("COMMIT")
+        for entry in quarantined:
+            logger.error("Queued batch %s failed %s times, quarantined", entry[1], self.max_attempts)
+        metrics.INGEST_QUEUE_QUARANTINED.inc(len(quarantined))
+        return written
+
+    def _apply(self, entries):
+        """
+        Writes the readings of entries of systems of the active shard and records them in its ledger.
+        Readings queued with `update` are written after the others of their system,
+        so they overwrite them as they would have in queue order.
+        """
+        applied = set(IngestBatch.objects.filter(
+            batch_id__in=[entry[1] for entry in entries]
+        ).values_list("batch_id", flat=True))
+
+        readings = defaultdict(list)
+        batches = []
+        for _, batch_id, system_id, rows, payload, update, _ in entries:
+            if batch_id in applied:
+                continue
+            batches.append(IngestBatch(batch_id=batch_id, system_id=system_id, rows=rows))
+            readings[system_id, bool(update)].extend(
+                {**reading, "timestamp": parse_datetime(reading["timestamp"])}
+                for reading in json.loads(payload)
+            )
+
+        written = 0
+        with transaction.atomic(using=sharding.db()):
+            for (system_id, update), system_readings in sorted(readings.items()):
+                written += len(Measurement.objects.upsert(system_id, system_readings, update=update))
+            IngestBatch.objects.bulk_create(batches)
+        return written
+
+    def run(self, interval=1.0, max_rows=5_000, stop=None):
+        """
+        Drains the queue until `stop` is set, sleeping `interval` seconds when it is empty
+        or holds only batches waiting for a shard move.
+        Failed rounds are logged and retried after a delay doubling up to `MAX_BACKOFF` seconds.
+        """
+        stop = stop or threading.Event()
+        failures = 0
+        while not stop.is_set():
+            try:
+                close_old_connections()
+                pending = self.pending()
+                self.drain(max_rows)
+                idle = not pending or self.pending() == pending
+            except Exception:
+                failures += 1
+                logger.exception("Draining the ingest queue failed")
+                stop.wait(min(interval * 2 ** failures, MAX_BACKOFF))
+                continue
+            failures = 0
+            if idle:
+                stop.wait(interval)
+
+
+def purge_ledger(older_than=timedelta(days=1)):
+    """
+    Removes ledger entries of batches applied before `older_than`.
+    A batch can only be redelivered while it is still in a queue,
+    so the ledger only needs to cover the time a worker may lag behind.
+    """
+    return IngestBatch.objects.filter(applied_at__lt=timezone.now() - older_than).delete()[0]
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """
+    Returns the queue configured by `INGEST_QUEUE`.
+    """
+    global _queue
+    config = settings.INGEST_QUEUE
+    with _queue_lock:
+        options = (str(config["PATH"]), config.get("MAX_ROWS", 100_000), config.get("MAX_ATTEMPTS", 5))
+        if _queue is None or (_queue.path, _queue.max_rows, _queue.max_attempts) != options:
+            _queue = IngestQueue(*options)
+        return _queue
+
+
+def is_enabled():
+    """
+    Returns whether measurements are ingested through the write-behind queue.
+    """
+    return getattr(settings, "INGEST_QUEUE", {}).get("ENABLED", False)
+
+
+def retry_after():
+    """
+    Seconds a client should wait before retrying when the queue is full.
+    """
+    return getattr(settings, "INGEST_QUEUE", {}).get("RETRY_AFTER", 5)
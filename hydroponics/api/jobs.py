@@ -0,0 +1,44 @@
+from django.conf import settings
+
+from . import archive, changes, edge, ingest_queue, sharding
+from .scheduler import job
+
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+@job("archive_measurements", DAY)
+def archive_measurements():
+    """
+    Moves measurements older than `ARCHIVE['OLDER_THAN_DAYS']` into compressed blocks on every shard.
+    """
+    for _ in sharding.each():
+        archive.archive_older_than()
+
+
+@job("prune_changes", DAY)
+def prune_changes():
+    """
+    Deletes change feed entries older than `CHANGES['RETENTION_DAYS']` on every shard.
+    """
+    for _ in sharding.each():
+        changes.prune()
+
+
+@job("purge_ingest_ledger", HOUR)
+def purge_ingest_ledger():
+    """
+    Removes ledger entries of write-behind batches applied more than a day ago on every shard.
+    """
+    for _ in sharding.each():
+        ingest_queue.purge_ledger()
+
+
+if getattr(settings, "EDGE_MODE", False) and edge.get_config()["UPSTREAM_URL"]:
+    @job("edge_sync", edge.get_config()["INTERVAL"])
+    def edge_sync():
+        """
+        Sends readings buffered on this edge node upstream.
+        """
+        edge.sync_all(edge.UpstreamClient())
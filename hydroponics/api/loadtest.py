@@ -0,0 +1,187 @@
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+
+def ingest(session, rng):
+    """
+    Posts a single reading to a random system.
+    """
+    system_id = rng.choice(session.system_ids)
+    body = {
+        "ph": round(rng.uniform(5.5, 7.0), 2),
+        "temperature": round(rng.uniform(18, 26), 2),
+        "tds": rng.randint(700, 1200),
+    }
+    return "POST", f"/api/systems/{system_id}/measurements/", body
+
+
+def read(session, rng):
+    """
+    Reads a page of the last day of readings of a random system.
+    """
+    system_id = rng.choice(session.system_ids)
+    since = (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return (
+        "GET",
+        f"/api/systems/{system_id}/measurements/?page_size=100&timestamp_after={since}",
+        None,
+    )
+
+
+def chart(session, rng):
+    """
+    Reads a week of downsampled readings of a random system.
+    """
+    system_id = rng.choice(session.system_ids)
+    since = (datetime.now(timezone.utc) - timedelta(days=7)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return (
+        "GET",
+        f"/api/systems/{system_id}/measurements/chart/?points=500&timestamp_after={since}",
+        None,
+    )
+
+
+def detail(session, rng):
+    """
+    Reads a random system with its latest readings.
+    """
+    return "GET", f"/api/systems/{rng.choice(session.system_ids)}/", None
+
+
+SCENARIOS = {
+    "ingest": ingest,
+    "read": read,
+    "detail": detail,
+    "chart": chart,
+}
+
+
+def parse_mix(value):
+    """
+    Parses a traffic mix such as `"ingest=70,read=25,detail=5"` into a weights dictionary.
+    """
+    mix = {}
+    for part in value.split(","):
+        name, weight = part.split("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario: '{name}', valid scenarios: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def percentile(sorted_values, p):
+    """
+    Returns the `p`-th percentile of sorted values using the nearest-rank method.
+    """
+    if not sorted_values:
+        return None
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[max(0, rank - 1)]
+
+
+def summarize(samples, elapsed):
+    """
+    Summarizes `(scenario, status, latency)` samples collected during `elapsed` seconds.
+    Returns throughput, error counts and latency percentiles in milliseconds per scenario.
+    Throughput counts successful (2xx) responses only, every other response or a failed request
+    is an error, of which `throttled` counts the 429 responses.
+    """
+    grouped = defaultdict(list)
+    for scenario, status, latency in samples:
+        grouped[scenario].append((status, latency))
+
+    report = {}
+    for scenario, results in sorted(grouped.items()):
+        latencies = sorted(latency * 1000 for _, latency in results)
+        succeeded = sum(1 for status, _ in results if status is not None and 200 <= status < 300)
+        report[scenario] = {
+            "requests": len(results),
+            "throughput": succeeded / elapsed if elapsed else 0.0,
+            "errors": len(results) - succeeded,
+            "throttled": sum(1 for status, _ in results if status == 429),
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1],
+        }
+    return report
+
+
+class Session:
+    """
+    Authenticated API client for a single user of the load test.
+    Raises `ValueError` when the user cannot log in or list their systems.
+    """
+
+    def __init__(self, base_url, username, password, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        status, tokens = self.request("POST", "/api/token/", {"username": username, "password": password})
+        if status != 200:
+            raise ValueError(f"Cannot log in as '{username}': status {status}.")
+        self.token = tokens["access"]
+        status, systems = self.request("GET", "/api/systems/")
+        if status != 200:
+            raise ValueError(f"Cannot list the systems of '{username}': status {status}.")
+        self.system_ids = [system["id"] for system in systems]
+
+    def request(self, method, path, body=None):
+        """
+        Sends a JSON request. Returns `(status, decoded body)`.
+        """
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        request.add_header("Content-Type", "application/json")
+        if getattr(self, "token", None):
+            request.add_header("Authorization", f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = response.read()
+                return response.status, json.loads(payload) if payload else None
+        except urllib.error.HTTPError as error:
+            return error.code, None
+
+
+def run(sessions, mix, concurrency, duration, seed=None):
+    """
+    Replays the traffic mix with `concurrency` workers for `duration` seconds.
+    Returns the summary produced by `summarize()`.
+    """
+    sessions = [session for session in sessions if session.system_ids]
+    if not sessions:
+        raise ValueError("None of the users owns a hydroponic system.")
+
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(None if seed is None else seed + index)
+        local = []
+        while time.monotonic() < deadline:
+            session = rng.choice(sessions)
+            scenario = rng.choices(names, weights)[0]
+            method, path, body = SCENARIOS[scenario](session, rng)
+            start = time.perf_counter()
+            try:
+                status, _ = session.request(method, path, body)
+            except OSError:
+                status = None
+            local.append((scenario, status, time.perf_counter() - start))
+        with lock:
+            samples.extend(local)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    return summarize(samples, time.monotonic() - start)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from api import archive, sharding, storage
+
+
+class Command(BaseCommand):
+    """
+    Moves old measurements into compressed archive blocks.
+    """
+
+    help = "Moves measurements older than --older-than-days into compressed archive blocks."
+
+    def add_arguments(self, parser):
+        config = archive.get_config()
+        parser.add_argument("--older-than-days", type=int, default=config["OLDER_THAN_DAYS"])
+        parser.add_argument("--block-size", type=int, default=config["BLOCK_SIZE"])
+        parser.add_argument("--codec", choices=["zlib", "zstd"], default=config["CODEC"])
+        parser.add_argument("--system", type=int, action="append", dest="systems",
+                            help="Archive only this system, may be repeated.")
+
+    def handle(self, *args, **options):
+        rows = size = 0
+        for _ in sharding.each():
+            archived, compressed = archive.archive_older_than(
+                options["older_than_days"], options["block_size"], options["codec"], options["systems"])
+            rows += archived
+            size += compressed
+        if not rows:
+            self.stdout.write("No measurements to archive.")
+            return
+        hot = storage.estimate()["current"]["total"]
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {rows} measurements into {size} bytes, {size / rows:.2f} bytes per row "
+            f"({hot} bytes per row in the table)."
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from api import compression
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks the CPU cost and the bytes saved of the available compression codecs.
+    """
+
+    help = "Benchmarks compression of typical API payloads with the available codecs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=500, help="Readings per payload.")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        payloads = compression.sample_payloads(options["rows"])
+        results = compression.benchmark(payloads, options["repeat"])
+        self.stdout.write(
+            f"{'payload':<14} {'encoding':<8} {'level':>5} {'bytes':>9} {'compressed':>10} "
+            f"{'ratio':>6} {'compress ms':>11} {'decompress ms':>13} {'saved KB/ms':>11}"
+        )
+        for result in results:
+            saved = (result["size"] - result["compressed"]) / 1024
+            self.stdout.write(
+                f"{result['payload']:<14} {result['encoding']:<8} {result['level']:>5} "
+                f"{result['size']:>9} {result['compressed']:>10} {result['ratio']:>6.1f} "
+                f"{result['compress_ms']:>11.3f} {result['decompress_ms']:>13.3f} "
+                f"{saved / max(result['compress_ms'], 1e-6):>11.1f}"
+            )
+        packages = {"br": "brotli", "zstd": "zstandard"}
+        for encoding, package in packages.items():
+            if encoding not in compression.CODECS:
+                self.stdout.write(f"{encoding} is not available, install the `{package}` package.")
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from api import edge
+from api.models import EdgeSyncLink, HydroponicSystem
+
+
+class Command(BaseCommand):
+    """
+    Syncs readings buffered on an edge node to the upstream server.
+    """
+
+    help = "Sends readings of linked systems to the upstream server in compressed, resumable batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--link", nargs=2, type=int, metavar=("SYSTEM_ID", "REMOTE_SYSTEM_ID"),
+                            help="Link a local system to a system of the upstream server and exit.")
+        parser.add_argument("--once", action="store_true", help="Sync once and exit.")
+        parser.add_argument("--interval", type=float, default=edge.get_config()["INTERVAL"],
+                            help="Seconds between syncs.")
+        parser.add_argument("--batch-size", type=int, default=edge.get_config()["BATCH_SIZE"])
+
+    def handle(self, *args, **options):
+        if options["link"]:
+            system_id, remote_system_id = options["link"]
+            if not HydroponicSystem.objects.filter(id=system_id).exists():
+                raise CommandError(f"System {system_id} does not exist.")
+            EdgeSyncLink.objects.update_or_create(
+                system_id=system_id, defaults={"remote_system_id": remote_system_id})
+            self.stdout.write(f"Linked system {system_id} to upstream system {remote_system_id}.")
+            return
+
+        client = edge.UpstreamClient()
+        if options["once"]:
+            self.report(edge.sync_all(client, options["batch_size"]))
+            return
+
+        self.stdout.write(f"Syncing to {client.base_url}, press CTRL+C to stop.")
+        try:
+            while True:
+                close_old_connections()
+                self.report(edge.sync_all(client, options["batch_size"]))
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+    def report(self, results):
+        failed = EdgeSyncLink.objects.exclude(last_error="").count()
+        self.stdout.write(
+            f"Synced {sum(results.values())} readings of {len(results)} systems, {failed} failed.")
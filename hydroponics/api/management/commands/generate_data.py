@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import sharding, synthetic
+
+
+class Command(BaseCommand):
+    """
+    Generates synthetic users, hydroponic systems and measurement time series.
+    """
+
+    help = "Generates synthetic users, hydroponic systems and measurements for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--systems-per-user", type=int, default=2)
+        parser.add_argument("--measurements", type=int, default=1000,
+                            help="Readings generated for every system.")
+        parser.add_argument("--interval", type=int, default=300,
+                            help="Seconds between readings.")
+        parser.add_argument("--prefix", default="loadtest")
+        parser.add_argument("--password", default="loadtest-password")
+        parser.add_argument("--batch-size", type=int, default=50_000)
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        users = synthetic.create_users(options["prefix"], options["users"], options["password"])
+        try:
+            groups = synthetic.group_by_shard(users)
+        except ValueError as exc:
+            raise CommandError(exc)
+        systems, rows = [], 0
+        for shard, group in groups:
+            with sharding.use(shard):
+                created = synthetic.create_systems(group, options["systems_per_user"])
+                rows += synthetic.insert_measurements(
+                    [system.id for system in created],
+                    options["measurements"],
+                    options["interval"],
+                    batch_size=options["batch_size"],
+                    seed=options["seed"],
+                )
+            systems += created
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users, {len(systems)} systems and {rows} measurements "
+            f"in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)."
+        ))
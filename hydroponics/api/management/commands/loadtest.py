@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import loadtest
+
+
+class Command(BaseCommand):
+    """
+    Replays mixed API traffic against a running server and reports latency percentiles.
+    """
+
+    help = "Replays mixed ingest/read traffic against a running API and reports throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--users", type=int, default=10,
+                            help="Number of generated users to log in as.")
+        parser.add_argument("--prefix", default="loadtest")
+        parser.add_argument("--password", default="loadtest-password")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=30.0, help="Seconds.")
+        parser.add_argument("--mix", default="ingest=60,read=30,detail=10",
+                            help=f"Weights of scenarios: {', '.join(loadtest.SCENARIOS)}.")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            mix = loadtest.parse_mix(options["mix"])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        try:
+            sessions = [
+                loadtest.Session(options["url"], f"{options['prefix']}_{n}", options["password"])
+                for n in range(options["users"])
+            ]
+        except OSError as exc:
+            raise CommandError(f"Cannot reach {options['url']}: {exc}")
+        except ValueError as exc:
+            raise CommandError(exc)
+        try:
+            report = loadtest.run(
+                sessions, mix, options["concurrency"], options["duration"], options["seed"])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        self.stdout.write(
+            f"{'scenario':<10} {'requests':>9} {'req/s':>8} {'errors':>7} {'429':>6} "
+            f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        for scenario, row in report.items():
+            self.stdout.write(
+                f"{scenario:<10} {row['requests']:>9} {row['throughput']:>8.1f} "
+                f"{row['errors']:>7} {row['throttled']:>6} {row['p50']:>8.1f} "
+                f"{row['p90']:>8.1f} {row['p99']:>8.1f} {row['max']:>8.1f}"
+            )
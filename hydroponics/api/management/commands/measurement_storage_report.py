@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from api import storage
+
+
+class Command(BaseCommand):
+    """
+    Reports the bytes per measurement row of the legacy and compact storage layouts.
+    """
+
+    help = "Reports bytes per measurement row before and after the compact storage layout."
+
+    def handle(self, *args, **options):
+        report = storage.estimate()
+        self.stdout.write("Estimated bytes per row on PostgreSQL:")
+        for layout, sizes in report.items():
+            indexes = ", ".join(f"{name} {size}" for name, size in sizes["indexes"].items())
+            self.stdout.write(
+                f"  {layout:<8} heap {sizes['heap']:>3}, indexes {sum(sizes['indexes'].values()):>3} "
+                f"({indexes}), total {sizes['total']}"
+            )
+        saved = 1 - report["current"]["total"] / report["legacy"]["total"]
+        self.stdout.write(self.style.SUCCESS(f"Compact layout saves {saved:.0%} per row."))
+
+        measured = storage.measure()
+        if measured is None:
+            return
+        rows = measured["rows"] or 1
+        self.stdout.write(f"Measured on {measured['rows']} rows:")
+        self.stdout.write(f"  heap {measured['heap']} bytes, {measured['heap'] / rows:.1f} per row")
+        for name, size in measured["indexes"].items():
+            self.stdout.write(f"  {name} {size} bytes, {size / rows:.1f} per row")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import sharding
+from api.models import ShardAssignment, User
+
+
+class Command(BaseCommand):
+    """
+    Moves a user's systems and measurements to another database shard.
+    """
+
+    help = "Moves a user's systems and measurements to another shard while the user keeps working."
+
+    def add_arguments(self, parser):
+        parser.add_argument("user_id", type=int, nargs="?")
+        parser.add_argument("shard", nargs="?")
+        parser.add_argument("--batch-size", type=int, default=sharding.get_config()["COPY_BATCH"])
+        parser.add_argument("--grace", type=float, default=sharding.get_config()["FREEZE_GRACE"],
+                            help="Seconds writes are paused before the switch.")
+        parser.add_argument("--list", action="store_true", help="List the number of users per shard and exit.")
+
+    def handle(self, *args, **options):
+        if options["list"]:
+            for alias in sharding.get_config()["SHARDS"]:
+                users = ShardAssignment.objects.filter(shard=alias).count()
+                self.stdout.write(f"{alias}: {users} users")
+            return
+        if options["user_id"] is None or not options["shard"]:
+            raise CommandError("Give the user id and the target shard, or --list.")
+        if not User.objects.filter(id=options["user_id"]).exists():
+            raise CommandError(f"User {options['user_id']} does not exist.")
+
+        try:
+            copied = sharding.move_user(
+                options["user_id"], options["shard"], options["batch_size"], options["grace"],
+                progress=lambda step: self.stdout.write(f"  {step}"),
+            )
+        except sharding.MoveError as error:
+            raise CommandError(str(error)) from error
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved user {options['user_id']} to {options['shard']} ({copied} rows)."))
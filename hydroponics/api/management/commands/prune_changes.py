@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api import changes, sharding
+
+
+class Command(BaseCommand):
+    """
+    Deletes change feed entries older than the retention.
+    """
+
+    help = "Deletes change feed entries older than CHANGES['RETENTION_DAYS']."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, default=changes.get_config()["RETENTION_DAYS"])
+
+    def handle(self, *args, **options):
+        deleted = sum(changes.prune(options["older_than_days"]) for _ in sharding.each())
+        self.stdout.write(f"Deleted {deleted} changes.")
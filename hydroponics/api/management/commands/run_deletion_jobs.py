@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api import deletion
+
+
+class Command(BaseCommand):
+    """
+    Runs deletion jobs left pending or interrupted.
+    """
+
+    help = "Runs pending and interrupted deletion jobs of systems and users."
+
+    def handle(self, *args, **options):
+        jobs = deletion.resume_jobs()
+        self.stdout.write(f"Ran {jobs} deletion jobs.")
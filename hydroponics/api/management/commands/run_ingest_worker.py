@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import ingest_queue
+
+
+class Command(BaseCommand):
+    """
+    Drains the write-behind ingest queue into the database.
+    """
+
+    help = "Moves queued measurements into the database in large batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Drain the queue once and exit.")
+        parser.add_argument("--interval", type=float, default=1.0,
+                            help="Seconds to wait when the queue is empty.")
+
+    def handle(self, *args, **options):
+        queue = ingest_queue.get_queue()
+        batch_size = settings.INGEST_QUEUE.get("BATCH_SIZE", 5_000)
+        if options["once"]:
+            # rounds of duplicates or deleted systems write nothing, drain until the queue stops shrinking,
+            # only batches of users frozen by a shard move are left then
+            total, pending = 0, queue.pending()
+            while pending:
+                total += queue.drain(batch_size)
+                before, pending = pending, queue.pending()
+                if pending == before:
+                    break
+            purged = ingest_queue.purge_ledger()
+            self.stdout.write(f"Inserted {total} measurements, purged {purged} ledger entries.")
+            return
+
+        self.stdout.write(f"Draining {queue.path}, press CTRL+C to stop.")
+        try:
+            queue.run(interval=options["interval"], max_rows=batch_size)
+        except KeyboardInterrupt:
+            pass
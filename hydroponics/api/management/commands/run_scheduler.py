@@ -0,0 +1,43 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import scheduler
+
+
+class Command(BaseCommand):
+    """
+    Runs periodic jobs. Any number of replicas may run it, only the one holding the lock runs jobs.
+    """
+
+    help = "Runs registered periodic jobs, one active scheduler across all replicas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--list", action="store_true", help="List the registered jobs and exit.")
+        parser.add_argument("--run", metavar="JOB", help="Run a single job once and exit.")
+        parser.add_argument("--workers", type=int, help="Threads running jobs concurrently.")
+
+    def handle(self, *args, **options):
+        jobs = scheduler.registered()
+        if options["list"]:
+            for name, job in jobs.items():
+                self.stdout.write(f"{name:<24} every {job.interval:g}s")
+            return
+
+        runner = scheduler.Scheduler(jobs, workers=options["workers"])
+        if options["run"]:
+            if options["run"] not in jobs:
+                raise CommandError(f"Unknown job: '{options['run']}', valid jobs: {', '.join(jobs)}")
+            succeeded = runner.execute(jobs[options["run"]])
+            runner.pool.shutdown()
+            if not succeeded:
+                raise CommandError(f"Job {options['run']} failed.")
+            self.stdout.write(f"Job {options['run']} succeeded.")
+            return
+
+        signal.signal(signal.SIGTERM, lambda *args: runner.stop())
+        self.stdout.write(f"Scheduling {len(jobs)} jobs, press CTRL+C to stop.")
+        try:
+            runner.run()
+        except KeyboardInterrupt:
+            runner.stop()
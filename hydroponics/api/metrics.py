@@ -0,0 +1,357 @@
+import itertools
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+JOB_BUCKETS = (0.1, 1.0, 5.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+class _Owner:
+    """
+    Thread-local marker whose collection tells that a thread has finished.
+    """
+
+
+class _ThreadShards:
+    """
+    Per-thread storage for metric values.
+    Every thread writes only to its own dictionary, so updates need no lock;
+    the lock is taken once per thread to register its shard and when collecting.
+    When a thread finishes, its shard is folded into a shared base with `merge`,
+    so short-lived threads do not accumulate shards.
+    """
+
+    def __init__(self, merge):
+        self._local = threading.local()
+        self._base = {}
+        self._shards = {}
+        self._merge = merge
+        self._lock = threading.Lock()
+        self._keys = itertools.count()
+
+    def get(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            key = next(self._keys)
+            with self._lock:
+                self._shards[key] = shard
+            # thread-local values are released when the thread ends
+            owner = self._local.owner = _Owner()
+            weakref.finalize(owner, self._retire, key).atexit = False
+            return shard
+
+    def _retire(self, key):
+        with self._lock:
+            shard = self._shards.pop(key)
+            # collectors holding the previous base and the shard do not count it twice
+            base = dict(self._base)
+            for name, value in shard.items():
+                base[name] = self._merge(base[name], value) if name in base else value
+            self._base = base
+
+    def all(self):
+        with self._lock:
+            return [self._base, *self._shards.values()]
+
+
+class Metric:
+    """
+    Base class for metrics with a fixed set of label names.
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._shards = _ThreadShards(self._merge)
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @staticmethod
+    def _merge(left, right):
+        return left + right
+
+    def samples(self):
+        """
+        Yields `(suffix, labels, value)` tuples for the exposition format.
+        """
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing counter, its name should end with `_total`.
+    """
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        shard = self._shards.get()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def values(self):
+        """
+        Returns totals summed over all threads, keyed by label values.
+        """
+        totals = {}
+        for shard in self._shards.all():
+            for key, value in list(shard.items()):
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def samples(self):
+        for key, value in sorted(self.values().items()):
+            yield "", dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    """
+    Histogram with fixed bucket boundaries.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    @staticmethod
+    def _merge(left, right):
+        return [a + b for a, b in zip(left, right)]
+
+    def observe(self, value, **labels):
+        shard = self._shards.get()
+        key = self._key(labels)
+        state = shard.get(key)
+        if state is None:
+            # one slot per bucket, one for +Inf, then sum and count
+            state = shard[key] = [0] * (len(self.buckets) + 3)
+        state[bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def values(self):
+        """
+        Returns merged `[bucket counts..., +Inf, sum, count]` lists keyed by label values.
+        """
+        totals = {}
+        for shard in self._shards.all():
+            for key, state in list(shard.items()):
+                merged = totals.setdefault(key, [0] * len(state))
+                for index, value in enumerate(list(state)):
+                    merged[index] += value
+        return totals
+
+    def samples(self):
+        for key, state in sorted(self.values().items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), state):
+                cumulative += count
+                yield "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield "_sum", labels, state[-2]
+            yield "_count", labels, state[-1]
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down, the last value set wins.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self._values = {}
+        self._lock = threading.Lock()
+        super().__init__(name, documentation, labelnames, registry)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        for key, value in sorted(self.values().items()):
+            yield "", dict(zip(self.labelnames, key)), value
+
+
+class Registry:
+    """
+    Collection of metrics rendered together by the exposition endpoint.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        """
+        Renders all metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in list(self._metrics):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in metric.samples():
+                lines.append(
+                    f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value):
+    if isinstance(value, str):
+        return value
+    return repr(float(value))
+
+
+REGISTRY = Registry()
+
+REQUESTS = Counter(
+    "hydroponics_http_requests_total", "HTTP requests by endpoint, method and status.",
+    ["endpoint", "method", "status"])
+REQUEST_LATENCY = Histogram(
+    "hydroponics_http_request_duration_seconds", "Request latency by endpoint.",
+    ["endpoint", "method"])
+PHASE_LATENCY = Histogram(
+    "hydroponics_http_phase_duration_seconds",
+    "Time spent in a request phase (auth, filter, serialize, render) by endpoint.",
+    ["endpoint", "phase"])
+DB_QUERIES = Histogram(
+    "hydroponics_db_queries_per_request", "Database queries executed per request.",
+    ["endpoint"], buckets=COUNT_BUCKETS)
+DB_TIME = Histogram(
+    "hydroponics_db_duration_seconds", "Database time per request.",
+    ["endpoint"])
+ROWS_RETURNED = Histogram(
+    "hydroponics_rows_returned", "Rows serialized in a response.",
+    ["endpoint"], buckets=ROW_BUCKETS)
+INGESTED_ROWS = Counter(
+    "hydroponics_ingested_rows_total", "Measurement rows accepted for ingestion.")
+INGEST_QUEUE_REJECTED = Counter(
+    "hydroponics_ingest_queue_rejected_total", "Ingest requests rejected because the queue was full.")
+INGEST_QUEUE_QUARANTINED = Counter(
+    "hydroponics_ingest_queue_quarantined_total", "Queued batches quarantined after failing repeatedly.")
+BATCH_SIZE = Histogram(
+    "hydroponics_batch_requests", "Sub-requests per batch request.", buckets=COUNT_BUCKETS)
+BATCH_SUBREQUESTS = Counter(
+    "hydroponics_batch_subrequests_total", "Sub-requests of batch requests by endpoint and status.",
+    ["endpoint", "status"])
+SCHEDULER_LEADER = Gauge(
+    "hydroponics_scheduler_leader", "1 when this process holds the scheduler lock and runs jobs.")
+SCHEDULER_JOB_RUNS = Counter(
+    "hydroponics_scheduler_job_runs_total", "Scheduled job runs by job and status.",
+    ["job", "status"])
+SCHEDULER_JOB_DURATION = Histogram(
+    "hydroponics_scheduler_job_duration_seconds", "Duration of scheduled job runs.",
+    ["job"], buckets=JOB_BUCKETS)
+SCHEDULER_JOB_LAST_SUCCESS = Gauge(
+    "hydroponics_scheduler_job_last_success_timestamp_seconds",
+    "Unix time of the last successful run of a scheduled job.", ["job"])
+
+
+class RequestStats:
+    """
+    Timings collected while handling a single request.
+    """
+
+    __slots__ = ("queries", "db_time", "phases", "rows")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.phases = {}
+        self.rows = None
+
+    def add_phase(self, name, duration):
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+
+    def record_query(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper counting queries and the time spent in them.
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+
+_current = ContextVar("hydroponics_request_stats", default=None)
+
+
+def current_stats():
+    """
+    Returns the stats of the request being handled, or `None` outside of requests.
+    """
+    return _current.get()
+
+
+@contextmanager
+def collect():
+    """
+    Makes a new `RequestStats` current for the duration of the block.
+    """
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def phase(name):
+    """
+    Records the duration of the block as a phase of the current request.
+    """
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_phase(name, time.perf_counter() - start)
+
+
+def record_rows(count):
+    """
+    Records the number of rows returned by the current request.
+    """
+    stats = _current.get()
+    if stats is not None:
+        stats.rows = (stats.rows or 0) + count
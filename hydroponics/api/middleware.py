@@ -0,0 +1,198 @@
+import hmac
+import io
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+
+from . import compression, metrics, profiling
+
+
+class MetricsMiddleware:
+    """
+    Middleware recording per-endpoint request metrics:
+    latency, status codes, query counts, database time, phase timings and rows returned.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "METRICS", {}).get("ENABLED", True)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with metrics.collect() as stats, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats.record_query))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        endpoint = match.url_name if match and match.url_name else "unmatched"
+        metrics.REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        metrics.REQUEST_LATENCY.observe(elapsed, endpoint=endpoint, method=request.method)
+        metrics.DB_QUERIES.observe(stats.queries, endpoint=endpoint)
+        metrics.DB_TIME.observe(stats.db_time, endpoint=endpoint)
+        for name, duration in stats.phases.items():
+            metrics.PHASE_LATENCY.observe(duration, endpoint=endpoint, phase=name)
+        if stats.rows is not None:
+            metrics.ROWS_RETURNED.observe(stats.rows, endpoint=endpoint)
+        return response
+
+    def process_template_response(self, request, response):
+        """
+        DRF responses are rendered after the view returns,
+        so the render phase is timed with a post-render callback.
+        """
+        stats = metrics.current_stats()
+        if stats is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: stats.add_phase("render", time.perf_counter() - start))
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in middleware capturing a CPU profile and the executed SQL of a request.
+    A request is profiled when it is sampled with `PROFILING['SAMPLE_RATE']`
+    or sends the `X-Profile-Token` header matching `PROFILING['TOKEN']`.
+    The profile id is returned in the `X-Profile-Id` response header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = getattr(settings, "PROFILING", {})
+        self.sample_rate = config.get("SAMPLE_RATE", 0.0)
+        self.token = config.get("TOKEN")
+        self.interval = config.get("INTERVAL", 0.005)
+
+    def should_profile(self, request):
+        sent = request.META.get("HTTP_X_PROFILE_TOKEN", "").encode()
+        if self.token and hmac.compare_digest(sent, self.token.encode()):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        recorder = profiling.QueryRecorder()
+        sampler = profiling.StackSampler(threading.get_ident(), self.interval).start()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            sampler.stop()
+
+        profile_id = profiling.get_store().save(sampler, recorder, {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration": time.perf_counter() - start,
+            "created": time.time(),
+        })
+        response["X-Profile-Id"] = profile_id
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the best encoding accepted by the client:
+    zstd (requires `zstandard`), brotli (requires `brotli`) or gzip,
+    in the order of `COMPRESSION['ENCODINGS']`.
+    Streaming responses are compressed chunk by chunk, responses shorter than
+    `COMPRESSION['MIN_SIZE']` or of other content types than `COMPRESSION['CONTENT_TYPES']` are sent as is.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = compression.get_config()
+
+    def compressible(self, response):
+        if response.has_header("Content-Encoding") or getattr(response, "is_async", False):
+            return False
+        content_type = response.get("Content-Type", "")
+        if not any(content_type.startswith(prefix) for prefix in self.config["CONTENT_TYPES"]):
+            return False
+        return response.streaming or len(response.content) >= self.config["MIN_SIZE"]
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.config["ENABLED"] or not self.compressible(response):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        codec = compression.negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if codec is None:
+            return response
+        level = self.config["LEVELS"][codec.name]
+
+        if response.streaming:
+            response.streaming_content = codec.stream(response.streaming_content, level)
+            del response["Content-Length"]
+        else:
+            with metrics.phase("compress"):
+                compressed = codec.compress(response.content, level)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        # the compressed representation differs byte by byte, see RFC 9110 8.8.1
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = codec.name
+        return response
+
+
+class RequestDecompressionMiddleware:
+    """
+    Decompresses request bodies sent with `Content-Encoding: gzip` or `zstd` (requires `zstandard`),
+    so gateways can upload measurement batches compressed.
+    Bodies inflating beyond `COMPRESSION['MAX_DECOMPRESSED_SIZE']` are rejected with 413
+    without being decompressed further, protecting against decompression bombs.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limit = compression.get_config()["MAX_DECOMPRESSED_SIZE"]
+
+    def __call__(self, request):
+        encoding = request.META.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding in ("", "identity"):
+            return self.get_response(request)
+
+        codec = compression.request_codec(encoding)
+        if codec is None:
+            supported = [name for name in compression.CODECS if compression.request_codec(name)]
+            return JsonResponse(
+                {"error": f"Unsupported Content-Encoding: '{encoding}'", "supported": supported},
+                status=415,
+            )
+        try:
+            with metrics.phase("decompress"):
+                body = codec.decompress(request.body, self.limit)
+        except compression.DecompressedTooLarge:
+            return JsonResponse(
+                {"error": f"Decompressed body exceeds {self.limit} bytes"}, status=413)
+        except ValueError:
+            return JsonResponse({"error": f"Invalid {encoding} body"}, status=400)
+
+        # the body was read, readers such as DRF's parsers continue from `request.body`
+        request._body = body
+        request._stream = io.BytesIO(body)
+        request.META["CONTENT_LENGTH"] = str(len(body))
+        del request.META["HTTP_CONTENT_ENCODING"]
+        return self.get_response(request)
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:14
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.CharField(max_length=32, unique=True)),
+                ('rows', models.PositiveIntegerField()),
+                ('applied_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AlterModelOptions(
+            name='measurement',
+            options={'ordering': ['-timestamp']},
+        ),
+        migrations.AlterField(
+            model_name='hydroponicsystem',
+            name='created_date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='hydroponicsystem',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='measurement',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['timestamp'], name='api_measure_timesta_cd3284_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['system', 'timestamp'], name='api_measure_system__f29100_idx'),
+        ),
+        migrations.AddField(
+            model_name='ingestbatch',
+            name='system',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingest_batches', to='api.hydroponicsystem'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:16
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Keeps the first measurement of every (system, timestamp) pair before the constraint is added.
+    """
+    Measurement = apps.get_model('api', 'Measurement')
+    duplicates = (
+        Measurement.objects.values('system', 'timestamp')
+        .annotate(count=Count('id'), keep=Min('id'))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        Measurement.objects.filter(
+            system=duplicate['system'], timestamp=duplicate['timestamp']
+        ).exclude(id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_ingestbatch_alter_measurement_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='measurement',
+            constraint=models.UniqueConstraint(fields=('system', 'timestamp'), name='unique_measurement_system_timestamp'),
+        ),
+    ]
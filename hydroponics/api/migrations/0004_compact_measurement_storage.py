@@ -0,0 +1,181 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:17
+
+import api.fields
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+FIXED_POINT_COLUMNS = ['ph', 'temperature']
+FACTOR = 100
+
+LEGACY_FIELDS = {
+    'ph': models.FloatField,
+    'temperature': models.FloatField,
+    'tds': models.IntegerField,
+}
+
+
+def _field(field, name, model):
+    field.set_attributes_from_name(name)
+    field.model = model
+    return field
+
+
+def _scale(schema_editor, model, expression):
+    quote = schema_editor.quote_name
+    assignments = ', '.join(
+        f'{quote(name)} = {expression.format(quote(name))}' for name in FIXED_POINT_COLUMNS
+    )
+    schema_editor.execute(f'UPDATE {quote(model._meta.db_table)} SET {assignments}')
+
+
+def compact_values(apps, schema_editor):
+    """
+    Converts pH and temperature to fixed-point smallints and TDS to a smallint.
+    PostgreSQL rewrites the table once, other databases scale the values and rebuild the columns.
+    Runs with the compact model state.
+    """
+    Measurement = apps.get_model('api', 'Measurement')
+    tds = Measurement._meta.get_field('tds')
+    if schema_editor.connection.vendor == 'postgresql':
+        quote = schema_editor.quote_name
+        columns = ''.join(
+            f'ALTER COLUMN {quote(name)} TYPE smallint USING round({quote(name)} * {FACTOR}), '
+            for name in FIXED_POINT_COLUMNS
+        )
+        schema_editor.execute(
+            f'ALTER TABLE {quote(Measurement._meta.db_table)} {columns}'
+            f'ALTER COLUMN {quote("tds")} TYPE smallint'
+        )
+        # only adds the tds >= 0 check, the column type already matches
+        schema_editor.alter_field(
+            Measurement, _field(models.SmallIntegerField(), 'tds', Measurement), tds
+        )
+        return
+
+    _scale(schema_editor, Measurement, f'round({{}} * {FACTOR})')
+    for name, legacy in LEGACY_FIELDS.items():
+        schema_editor.alter_field(
+            Measurement,
+            _field(legacy(), name, Measurement),
+            Measurement._meta.get_field(name),
+        )
+
+
+def expand_values(apps, schema_editor):
+    """
+    Converts the columns back to double precision and integer.
+    Runs with the legacy model state.
+    """
+    Measurement = apps.get_model('api', 'Measurement')
+    if schema_editor.connection.vendor == 'postgresql':
+        quote = schema_editor.quote_name
+        # only drops the tds >= 0 check
+        schema_editor.alter_field(
+            Measurement,
+            _field(models.PositiveSmallIntegerField(), 'tds', Measurement),
+            _field(models.SmallIntegerField(), 'tds', Measurement),
+        )
+        columns = ''.join(
+            f'ALTER COLUMN {quote(name)} TYPE double precision USING {quote(name)} / {FACTOR}.0, '
+            for name in FIXED_POINT_COLUMNS
+        )
+        schema_editor.execute(
+            f'ALTER TABLE {quote(Measurement._meta.db_table)} {columns}'
+            f'ALTER COLUMN {quote("tds")} TYPE integer'
+        )
+        return
+
+    for name in LEGACY_FIELDS:
+        compact = (
+            api.fields.FixedPointField(decimal_places=2) if name in FIXED_POINT_COLUMNS
+            else models.PositiveSmallIntegerField()
+        )
+        schema_editor.alter_field(
+            Measurement,
+            _field(compact, name, Measurement),
+            Measurement._meta.get_field(name),
+        )
+    _scale(schema_editor, Measurement, f'{{}} / {FACTOR}.0')
+
+
+def create_postgresql_indexes(apps, schema_editor):
+    """
+    Adds a BRIN index on timestamp and includes the values in the unique (system, timestamp) index,
+    so that time range reads of a system are served by index-only scans.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = schema_editor.quote_name(apps.get_model('api', 'Measurement')._meta.db_table)
+    schema_editor.execute(
+        f'ALTER TABLE {table} DROP CONSTRAINT unique_measurement_system_timestamp, '
+        f'ADD CONSTRAINT unique_measurement_system_timestamp '
+        f'UNIQUE (system_id, "timestamp") INCLUDE (ph, temperature, tds)'
+    )
+    schema_editor.execute(
+        f'CREATE INDEX measurement_timestamp_brin ON {table} USING brin ("timestamp")'
+    )
+
+
+def drop_postgresql_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = schema_editor.quote_name(apps.get_model('api', 'Measurement')._meta.db_table)
+    schema_editor.execute('DROP INDEX IF EXISTS measurement_timestamp_brin')
+    schema_editor.execute(
+        f'ALTER TABLE {table} DROP CONSTRAINT unique_measurement_system_timestamp, '
+        f'ADD CONSTRAINT unique_measurement_system_timestamp UNIQUE (system_id, "timestamp")'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_measurement_unique_system_timestamp'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='measurement',
+            name='api_measure_timesta_cd3284_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='measurement',
+            name='api_measure_system__f29100_idx',
+        ),
+        migrations.AlterField(
+            model_name='measurement',
+            name='system',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='measurements', to='api.hydroponicsystem'),
+        ),
+        migrations.AlterField(
+            model_name='measurement',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        # the conversion is split around the state change, so that both directions
+        # rebuild the table from the model state they convert to
+        migrations.RunPython(migrations.RunPython.noop, expand_values),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='measurement',
+                    name='ph',
+                    field=api.fields.FixedPointField(decimal_places=2),
+                ),
+                migrations.AlterField(
+                    model_name='measurement',
+                    name='tds',
+                    field=models.PositiveSmallIntegerField(),
+                ),
+                migrations.AlterField(
+                    model_name='measurement',
+                    name='temperature',
+                    field=api.fields.FixedPointField(decimal_places=2),
+                ),
+            ],
+        ),
+        migrations.RunPython(compact_values, migrations.RunPython.noop),
+        migrations.RunPython(create_postgresql_indexes, drop_postgresql_indexes),
+    ]
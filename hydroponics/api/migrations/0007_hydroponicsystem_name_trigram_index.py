@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    """
+    Enables `pg_trgm` and adds a trigram GIN index on the system name,
+    which serves `ILIKE '%...%'` and word similarity searches.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = schema_editor.quote_name(apps.get_model('api', 'HydroponicSystem')._meta.db_table)
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS hydroponicsystem_name_trgm ON {table} '
+        f'USING gin (name gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS hydroponicsystem_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_deletionjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_hydroponicsystem_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeasurementArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('min_id', models.BigIntegerField()),
+                ('max_id', models.BigIntegerField()),
+                ('count', models.PositiveIntegerField()),
+                ('codec', models.CharField(max_length=8)),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('system', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archives', to='api.hydroponicsystem')),
+            ],
+            options={
+                'ordering': ['system', 'start'],
+                'indexes': [models.Index(fields=['system', 'start', 'end'], name='api_measure_system__768eef_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:40
+
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_measurementarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(choices=[('system', 'System'), ('measurement', 'Measurement')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('system_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Upsert'), ('delete', 'Delete')], max_length=8)),
+                ('created_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'id'], name='api_changel_owner_i_7db63b_idx'), models.Index(fields=['created_at'], name='api_changel_created_df91d4_idx')],
+            },
+        ),
+    ]
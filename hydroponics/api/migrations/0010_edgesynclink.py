@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_changelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EdgeSyncLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remote_system_id', models.PositiveBigIntegerField()),
+                ('last_change_id', models.BigIntegerField(default=0)),
+                ('synced_rows', models.PositiveBigIntegerField(default=0)),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('system', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='edge_link', to='api.hydroponicsystem')),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:22
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_shardassignment'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='changelog',
+            name='api_changel_owner_i_7db63b_idx',
+        ),
+        migrations.AddField(
+            model_name='changelog',
+            name='txid',
+            field=models.BigIntegerField(db_default=api.models.CurrentTransactionId()),
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['owner', 'txid', 'id'], name='api_changel_owner_i_a3af4d_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:41
+
+import api.fields
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_changelog_txid'),
+    ]
+
+    # replaces the raw INCLUDE constraint of 0004 on PostgreSQL with one the migration state knows,
+    # other databases rebuild the same plain unique constraint
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='measurement',
+            name='unique_measurement_system_timestamp',
+        ),
+        migrations.AlterField(
+            model_name='measurement',
+            name='tds',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MaxValueValidator(32767)]),
+        ),
+        migrations.AddConstraint(
+            model_name='measurement',
+            constraint=api.fields.CoveringUniqueConstraint(fields=('system', 'timestamp'), include=('ph', 'temperature', 'tds'), name='unique_measurement_system_timestamp'),
+        ),
+    ]
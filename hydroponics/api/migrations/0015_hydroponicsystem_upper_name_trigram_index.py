@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def create_upper_trigram_index(apps, schema_editor):
+    """
+    Replaces the trigram GIN index on `name` with one on `upper(name)`,
+    the expression `icontains` compiles to, so substring searches use it as well.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = schema_editor.quote_name(apps.get_model('api', 'HydroponicSystem')._meta.db_table)
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS hydroponicsystem_upper_name_trgm ON {table} '
+        f'USING gin (upper(name) gin_trgm_ops)'
+    )
+    schema_editor.execute('DROP INDEX IF EXISTS hydroponicsystem_name_trgm')
+
+
+def drop_upper_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = schema_editor.quote_name(apps.get_model('api', 'HydroponicSystem')._meta.db_table)
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS hydroponicsystem_name_trgm ON {table} '
+        f'USING gin (name gin_trgm_ops)'
+    )
+    schema_editor.execute('DROP INDEX IF EXISTS hydroponicsystem_upper_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_measurement_covering_constraint_tds_range'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_upper_trigram_index, drop_upper_trigram_index),
+    ]
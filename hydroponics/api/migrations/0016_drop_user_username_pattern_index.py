@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def drop_pattern_index(apps, schema_editor):
+    """
+    Drops the username pattern index of the removed migration `0006_user_username_pattern_idx`
+    from databases that applied it. The username is unique, on PostgreSQL Django already
+    creates a `varchar_pattern_ops` `_like` index for it, which serves prefix searches.
+    """
+    schema_editor.execute('DROP INDEX IF EXISTS api_user_username_pattern_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_hydroponicsystem_upper_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_pattern_index, migrations.RunPython.noop),
+    ]
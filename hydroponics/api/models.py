@@ -1,5 +1,13 @@
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import sql
+from django.db.models.constants import OnConflict
+from django.db.models.functions import Now
 from django.contrib.auth.models import AbstractUser
+from django.core.validators import MaxValueValidator
+from django.utils import timezone
+
+from .fields import SMALLINT_RANGE, CoveringUniqueConstraint, FixedPointField
+from .signals import notify_measurements_changed
 
 
 class User(AbstractUser):
@@ -28,19 +36,123 @@ class HydroponicSystem(models.Model):
         return f"{self.name} (Owner: {self.owner.username})"
 
 
+class MeasurementQuerySet(models.QuerySet):
+    """
+    QuerySet for measurements with idempotent bulk ingestion.
+    """
+
+    def upsert(self, system_id, readings, update=False):
+        """
+        Inserts readings of a system in bulk, identified by `(system, timestamp)`.
+        Readings already stored are skipped (`ON CONFLICT DO NOTHING`),
+        or overwritten with the new values when `update` is set (`ON CONFLICT DO UPDATE`).
+        Readings already moved to the archive are always skipped, archived readings are read-only.
+        Readings actually inserted or updated are recorded in the change log in the same transaction.
+        Returns the list of unsaved `Measurement` instances that were sent.
+        """
+        from . import archive
+
+        unique = {}
+        for reading in readings:
+            measurement = self.model(system_id=system_id, **reading)
+            unique[measurement.timestamp] = measurement
+        measurements = list(unique.values())
+        # the unique index covers hot readings only
+        archived = archive.read_at(system_id, list(unique))
+        if archived is not None and len(archived["id"]):
+            stored = set(archived["timestamp"].tolist())
+            fresh = [m for m in measurements if archive.to_micros(m.timestamp) not in stored]
+        else:
+            fresh = measurements
+
+        with transaction.atomic(using=self.db):
+            if connections[self.db].features.can_return_rows_from_bulk_insert:
+                ids = self._insert_returning_ids(fresh, update)
+                written = [self.filter(id__in=ids[offset:offset + 1000]) for offset in range(0, len(ids), 1000)]
+            else:
+                # without RETURNING, skipped duplicates are logged too, clients apply upserts idempotently
+                self.bulk_create(fresh, batch_size=1000, **(
+                    {"update_conflicts": True, "unique_fields": ["system", "timestamp"],
+                     "update_fields": ["ph", "temperature", "tds"]}
+                    if update else {"ignore_conflicts": True}
+                ))
+                timestamps = [measurement.timestamp for measurement in fresh]
+                written = [
+                    self.filter(system_id=system_id, timestamp__in=timestamps[offset:offset + 1000])
+                    for offset in range(0, len(timestamps), 1000)
+                ]
+            for chunk in written:
+                ChangeLog.objects.record(chunk, ChangeLog.Action.UPSERT)
+        notify_measurements_changed([system_id], "update" if update else "create")
+        return measurements
+
+    def _insert_returning_ids(self, measurements, update, batch_size=1000):
+        """
+        Inserts measurements with `ON CONFLICT DO NOTHING`, or `DO UPDATE` with `update`,
+        and returns the ids of the rows the statements inserted or updated (`RETURNING id`).
+        Unlike `bulk_create`, skipped duplicates are told apart from inserted rows.
+        """
+        meta = self.model._meta
+        fields = [field for field in meta.concrete_fields if not field.primary_key]
+        if update:
+            options = {
+                "on_conflict": OnConflict.UPDATE,
+                "unique_fields": [meta.get_field("system"), meta.get_field("timestamp")],
+                "update_fields": [meta.get_field(name) for name in ("ph", "temperature", "tds")],
+            }
+        else:
+            options = {"on_conflict": OnConflict.IGNORE}
+        ids = []
+        with connections[self.db].cursor() as cursor:
+            for offset in range(0, len(measurements), batch_size):
+                query = sql.InsertQuery(self.model, **options)
+                query.insert_values(fields, measurements[offset:offset + batch_size])
+                compiler = query.get_compiler(using=self.db)
+                compiler.returning_fields = [meta.pk]
+                for statement, params in compiler.as_sql():
+                    cursor.execute(statement, params)
+                ids.extend(row[0] for row in cursor.fetchall())
+        return ids
+
+    def adjust(self, values=None, offsets=None):
+        """
+        Updates all measurements of the queryset in a single UPDATE statement.
+        `values` assigns `{field: value}`, `offsets` adds `{field: amount}` to the stored values.
+        Returns the number of updated measurements.
+        """
+        assignments = dict(values or {})
+        for name, amount in (offsets or {}).items():
+            field = self.model._meta.get_field(name)
+            # fixed-point columns are offset by the scaled integer amount
+            delta = field.to_storage(amount) if isinstance(field, FixedPointField) else int(amount)
+            assignments[name] = models.F(name) + models.Value(delta)
+        return self.update(**assignments)
+
+
 class Measurement(models.Model):
     """
     Model representing a measurement recorded for a hydroponic system.
     Each measurement contains pH, temperature, and TDS (Total Dissolved Solids).
+    A measurement is identified by its system and timestamp,
+    so retried readings with a device-supplied timestamp are stored once.
+
+    Values are stored as fixed-point smallints (pH and temperature with 2 decimal places),
+    and lookups by system and time use the unique `(system, timestamp)` index.
+    On PostgreSQL that index also includes the values, allowing index-only scans,
+    and `timestamp` has a BRIN index for time range scans across systems.
     """
 
+    # indexed by the leading column of the (system, timestamp) constraint
     system = models.ForeignKey(
-        HydroponicSystem, on_delete=models.CASCADE, related_name="measurements", db_index=True
+        HydroponicSystem, on_delete=models.CASCADE, related_name="measurements", db_index=False
     )
-    ph = models.FloatField()
-    temperature = models.FloatField()
-    tds = models.IntegerField()
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    ph = FixedPointField(decimal_places=2)
+    temperature = FixedPointField(decimal_places=2)
+    # SQLite does not limit integer fields, the bound holds on every database
+    tds = models.PositiveSmallIntegerField(validators=[MaxValueValidator(SMALLINT_RANGE[1])])
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    objects = MeasurementQuerySet.as_manager()
 
     def __str__(self):
         return (
@@ -51,7 +163,258 @@ class Measurement(models.Model):
 
     class Meta:
         ordering = ["-timestamp"]
+        constraints = [
+            CoveringUniqueConstraint(
+                fields=["system", "timestamp"],
+                include=["ph", "temperature", "tds"],
+                name="unique_measurement_system_timestamp",
+            ),
+        ]
+
+
+class MeasurementArchive(models.Model):
+    """
+    Compressed block of archived measurements of a system.
+    Readings are stored column by column, with delta-encoded ids, timestamps and fixed-point values,
+    compressed with the block's `codec`. See `api.archive`.
+    """
+
+    system = models.ForeignKey(
+        HydroponicSystem, on_delete=models.CASCADE, related_name="archives"
+    )
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    min_id = models.BigIntegerField()
+    max_id = models.BigIntegerField()
+    count = models.PositiveIntegerField()
+    codec = models.CharField(max_length=8)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["system", "start"]
         indexes = [
-            models.Index(fields=["timestamp"]),
-            models.Index(fields=["system", "timestamp"]),
+            models.Index(fields=["system", "start", "end"]),
         ]
+
+    def __str__(self):
+        return f"Archive of {self.count} measurements of system {self.system_id} from {self.start}"
+
+
+class CurrentTransactionId(models.Func):
+    """
+    The 64-bit id of the writing transaction on PostgreSQL. Elsewhere 0: SQLite commits one write
+    transaction at a time, so changes already commit in the order of their ids.
+    """
+
+    output_field = models.BigIntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return "0", []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return "pg_current_xact_id()::text::bigint", []
+
+
+class ChangeLogQuerySet(models.QuerySet):
+    """
+    QuerySet for the change log, recording changes of whole querysets with `INSERT ... SELECT`.
+    """
+
+    # change log model kind, owner and system lookups of the tracked models
+    TRACKED = {
+        "hydroponicsystem": ("system", "owner_id", "id"),
+        "measurement": ("measurement", "system__owner_id", "system_id"),
+    }
+
+    def record(self, queryset, action):
+        """
+        Records a change of every system or measurement of `queryset` in a single statement,
+        without loading the rows. Deletions must be recorded before the rows are deleted.
+        Returns the number of recorded changes.
+        """
+        kind, owner, system = self.TRACKED[queryset.model._meta.model_name]
+        rows = queryset.order_by().annotate(
+            change_owner=models.F(owner),
+            change_model=models.Value(kind),
+            change_object=models.F("id"),
+            change_system=models.F(system),
+            change_action=models.Value(action),
+        ).values_list(
+            "change_owner", "change_model", "change_object", "change_system", "change_action")
+        alias = router.db_for_write(self.model)
+        sql, params = rows.query.get_compiler(alias).as_sql()
+        connection = connections[alias]
+        columns = ", ".join(
+            connection.ops.quote_name(self.model._meta.get_field(name).column)
+            for name in ("owner", "model", "object_id", "system_id", "action")
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {connection.ops.quote_name(self.model._meta.db_table)} "
+                f"({columns}) {sql}",
+                params,
+            )
+            return cursor.rowcount
+
+    def log(self, instance, action):
+        """
+        Records a change of a single system or measurement.
+        """
+        kind, owner, system = self.TRACKED[instance._meta.model_name]
+        if kind == ChangeLog.Model.MEASUREMENT:
+            owner_id = HydroponicSystem.objects.values_list("owner_id", flat=True).get(
+                id=instance.system_id)
+        else:
+            owner_id = instance.owner_id
+        return self.create(
+            owner_id=owner_id, model=kind, object_id=instance.id,
+            system_id=getattr(instance, system), action=action,
+        )
+
+
+class ChangeLog(models.Model):
+    """
+    Append-only log of created, updated and deleted systems and measurements,
+    read by clients as an incremental change feed ordered by `(txid, id)`. See `api.changes`.
+    Deleted systems are logged without their measurements, which are deleted with them.
+    """
+
+    class Model(models.TextChoices):
+        SYSTEM = "system"
+        MEASUREMENT = "measurement"
+
+    class Action(models.TextChoices):
+        UPSERT = "upsert"
+        DELETE = "delete"
+
+    id = models.BigAutoField(primary_key=True)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    model = models.CharField(max_length=16, choices=Model.choices)
+    object_id = models.BigIntegerField()
+    system_id = models.BigIntegerField()
+    action = models.CharField(max_length=8, choices=Action.choices)
+    created_at = models.DateTimeField(db_default=Now())
+    # transaction which logged the change, ids are assigned before commit and do not follow commit order
+    txid = models.BigIntegerField(db_default=CurrentTransactionId())
+
+    objects = ChangeLogQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "txid", "id"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.model} {self.object_id}"
+
+
+class EdgeSyncLink(models.Model):
+    """
+    Upstream sync state of a system of an edge node.
+    Readings logged in the change log after `last_change_id` are not synced yet,
+    the position advances only after the upstream server accepted a batch. See `api.edge`.
+    """
+
+    system = models.OneToOneField(
+        HydroponicSystem, on_delete=models.CASCADE, related_name="edge_link"
+    )
+    remote_system_id = models.PositiveBigIntegerField()
+    last_change_id = models.BigIntegerField(default=0)
+    synced_rows = models.PositiveBigIntegerField(default=0)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"System {self.system_id} -> upstream system {self.remote_system_id}"
+
+
+class ScheduledJob(models.Model):
+    """
+    Run history of a periodic job of the scheduler, see `api.scheduler`.
+    The next run of a job is due `interval` seconds after `last_started_at`,
+    also when another replica takes over the scheduler.
+    """
+
+    name = models.CharField(max_length=100, primary_key=True)
+    runs = models.PositiveBigIntegerField(default=0)
+    failures = models.PositiveBigIntegerField(default=0)
+    last_started_at = models.DateTimeField(null=True, blank=True)
+    last_duration = models.FloatField(null=True, blank=True)
+    last_status = models.CharField(max_length=16, blank=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return self.name
+
+
+class IngestBatch(models.Model):
+    """
+    Ledger of measurement batches applied from the write-behind ingest queue.
+    Recorded in the same transaction as the batch's measurements,
+    so a batch redelivered after a crash is recognized and skipped.
+    """
+
+    batch_id = models.CharField(max_length=32, unique=True)
+    system = models.ForeignKey(
+        HydroponicSystem, on_delete=models.CASCADE, related_name="ingest_batches"
+    )
+    rows = models.PositiveIntegerField()
+    applied_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Batch {self.batch_id} ({self.rows} rows)"
+
+
+class DeletionJob(models.Model):
+    """
+    Deletion of a hydroponic system or a user with all their measurements.
+    Measurements are deleted in chunks, each in its own short transaction,
+    so a job can run in the background and resume after an interruption.
+    """
+
+    class Target(models.TextChoices):
+        SYSTEM = "system"
+        USER = "user"
+
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        RUNNING = "running"
+        DONE = "done"
+        FAILED = "failed"
+
+    target = models.CharField(max_length=10, choices=Target.choices)
+    target_id = models.BigIntegerField()
+    requested_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, related_name="deletion_jobs"
+    )
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING, db_index=True
+    )
+    deleted_rows = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Deletion of {self.target} {self.target_id} ({self.status})"
+
+
+class ShardAssignment(models.Model):
+    """
+    Database shard holding a user's systems and measurements, stored in the directory database.
+    While the user is moved to `target`, writes are rejected when `frozen` is set,
+    change feed cursors issued before `moved_at` expire. See `api.sharding`.
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="shard_assignment"
+    )
+    shard = models.CharField(max_length=100, db_index=True)
+    target = models.CharField(max_length=100, blank=True)
+    frozen = models.BooleanField(default=False)
+    moved_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"User {self.user_id} on {self.shard}"
@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 class MeasurementPagination(PageNumberPagination):
     """
@@ -8,3 +8,15 @@ class MeasurementPagination(PageNumberPagination):
     page_size = 10 
     page_size_query_param = "page_size"
     max_page_size = 100
+
+
+class UserPagination(CursorPagination):
+    """
+    Keyset pagination for the user directory.
+    Pages continue after the last username of the previous page,
+    so every page is a single index range scan regardless of its depth.
+    """
+    ordering = "username"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
@@ -0,0 +1,136 @@
+import json
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+
+class StackSampler:
+    """
+    Statistical CPU profiler for a single thread.
+    A background thread captures the target thread's stack every `interval` seconds
+    and counts identical stacks, producing the collapsed-stack format used by flamegraph tools.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                module = frame.f_globals.get("__name__", "?")
+                names.append(f"{module}.{getattr(code, 'co_qualname', code.co_name)}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def collapsed(self):
+        """
+        Returns the samples as collapsed stacks, one `frame;frame;frame count` line per stack.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper keeping the executed SQL with timings.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                "sql": sql,
+                "duration": time.perf_counter() - start,
+                "many": many,
+            })
+
+
+class ProfileStore:
+    """
+    Directory of captured profiles.
+    Every profile is stored as `<id>.folded` with the collapsed stacks
+    and `<id>.json` with the request details and executed SQL.
+    """
+
+    def __init__(self, directory, max_profiles=100):
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+
+    def save(self, sampler, recorder, meta):
+        """
+        Writes a profile and removes the oldest ones above `max_profiles`.
+        Returns the profile id.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile_id = uuid.uuid4().hex
+        (self.directory / f"{profile_id}.folded").write_text(sampler.collapsed())
+        (self.directory / f"{profile_id}.json").write_text(json.dumps({
+            **meta,
+            "id": profile_id,
+            "samples": sum(sampler.stacks.values()),
+            "interval": sampler.interval,
+            "queries": recorder.queries,
+        }))
+        self.prune()
+        return profile_id
+
+    def list(self):
+        """
+        Returns metadata of stored profiles, newest first, without the SQL.
+        """
+        profiles = []
+        for path in sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True):
+            data = json.loads(path.read_text())
+            data["query_count"] = len(data.pop("queries"))
+            profiles.append(data)
+        return profiles
+
+    def path(self, profile_id, suffix):
+        """
+        Returns the path of a stored profile file, or `None` if it does not exist.
+        """
+        path = self.directory / f"{profile_id}{suffix}"
+        return path if path.is_file() else None
+
+    def prune(self):
+        paths = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for path in paths[:max(0, len(paths) - self.max_profiles)]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".folded").unlink(missing_ok=True)
+
+
+def get_store():
+    """
+    Returns the profile store configured by `PROFILING`.
+    """
+    config = getattr(settings, "PROFILING", {})
+    return ProfileStore(
+        config.get("DIRECTORY", Path(settings.BASE_DIR) / "profiles"),
+        config.get("MAX_PROFILES", 100),
+    )
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+
+from . import archive, downsampling
+from .models import Measurement, MeasurementArchive
+
+
+FILLS = ["locf", "linear", "null"]
+
+
+def grid(start, end, interval):
+    """
+    Returns the grid of `interval` seconds covering `[start, end)` as seconds since the epoch.
+    The first point is `start` rounded down to a multiple of `interval`, so grids of different
+    requests with the same interval line up.
+    """
+    first = start.timestamp() // interval * interval
+    points = max(1, int(np.ceil((end.timestamp() - first) / interval)))
+    return first + np.arange(points, dtype=np.float64) * interval
+
+
+def bucket_means(index, values, buckets):
+    """
+    Averages `values` into `buckets` by their bucket `index`, both flattened over all series.
+    Returns the means, NaN for empty buckets.
+    """
+    counts = np.bincount(index, minlength=buckets)
+    sums = np.bincount(index, weights=values, minlength=buckets)
+    return np.divide(sums, counts, out=np.full(buckets, np.nan), where=counts > 0)
+
+
+def fill(values, method, limit=None):
+    """
+    Fills the empty (NaN) points of a regular series.
+    `locf` carries the last observed value forward, `linear` interpolates between the observed
+    values around a gap and `null` leaves gaps empty. Points before the first observation stay
+    empty, as do points after the last one with `linear`. With `limit`, only points at most
+    `limit` grid steps after an observation (`locf`) or gaps of at most `limit` points (`linear`)
+    are filled.
+    """
+    observed = ~np.isnan(values)
+    if method == "null" or not observed.any():
+        return values
+    positions = np.arange(len(values))
+    last = np.maximum.accumulate(np.where(observed, positions, -1))
+
+    if method == "locf":
+        filled = np.where(last >= 0, values[np.maximum(last, 0)], np.nan)
+        if limit is not None:
+            filled[positions - last > limit] = np.nan
+    else:
+        filled = np.interp(
+            positions, positions[observed], values[observed], left=np.nan, right=np.nan)
+        if limit is not None:
+            following = np.minimum.accumulate(
+                np.where(observed, positions, len(values))[::-1])[::-1]
+            filled[(following - last - 1 > limit) & ~observed] = np.nan
+    return filled
+
+
+def load(system_ids, start, end, fields):
+    """
+    Streams readings of the systems between `start` and `end`, hot and archived, into NumPy arrays.
+    Returns `(system ids, timestamps in seconds, {field: values})`, in no particular order.
+    """
+    queryset = Measurement.objects.filter(
+        system_id__in=system_ids, timestamp__gte=start, timestamp__lt=end)
+    timestamps, columns = downsampling.load_series(queryset, ["system_id", *fields])
+    systems = [columns.pop("system_id")]
+    timestamps = [timestamps]
+    series = {field: [values] for field, values in columns.items()}
+
+    archived = (
+        MeasurementArchive.objects.filter(system_id__in=system_ids, end__gte=start, start__lt=end)
+        .order_by().values_list("system_id", flat=True).distinct()
+    )
+    for system_id in archived:
+        # the archive filter is inclusive, readings at `end` fall outside the grid
+        columns = archive.read(system_id, start, end - timedelta(microseconds=1))
+        if columns is None:
+            continue
+        systems.append(np.full(len(columns["id"]), system_id, dtype=np.float64))
+        timestamps.append(columns["timestamp"] / 1e6)
+        for field in fields:
+            series[field].append(columns[field])
+    return (
+        np.concatenate(systems),
+        np.concatenate(timestamps),
+        {field: np.concatenate(values) for field, values in series.items()},
+    )
+
+
+def resample(system_ids, start, end, interval, fields, method="locf", limit=None):
+    """
+    Aligns the readings of several systems on one grid of `interval` seconds between `start` and `end`.
+    Every point holds the mean of the readings in `[point, point + interval)`, empty points are
+    filled with `method`. All systems are bucketed at once with a single `bincount` per field.
+    Returns `(grid in seconds, {field: systems x points matrix}, readings per system)`,
+    rows of the matrices and readings follow the order of `system_ids`.
+    """
+    points = grid(start, end, interval)
+    # whole buckets are read, the first may start before `start`
+    first = datetime.fromtimestamp(points[0], dt_timezone.utc)
+    last = datetime.fromtimestamp(points[-1] + interval, dt_timezone.utc)
+    systems, timestamps, series = load(system_ids, first, last, fields)
+
+    ids = np.array(system_ids, dtype=np.float64)
+    order = np.argsort(ids)
+    rows = order[np.searchsorted(ids[order], systems)]
+    columns = ((timestamps - points[0]) // interval).astype(np.int64)
+    index = rows * len(points) + columns
+    buckets = len(system_ids) * len(points)
+
+    matrices = {}
+    for field, values in series.items():
+        means = bucket_means(index, values, buckets).reshape(len(system_ids), len(points))
+        matrices[field] = np.array([fill(row, method, limit) for row in means])
+    return points, matrices, np.bincount(rows, minlength=len(system_ids))
+
+
+def to_list(values, decimals=4):
+    """
+    Converts a series into a JSON list with `None` for empty points.
+    """
+    rounded = np.round(values, decimals)
+    return [None if np.isnan(value) else value for value in rounded.tolist()]
@@ -0,0 +1,281 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections
+from django.db.models import F
+
+from . import metrics
+from .models import ScheduledJob
+
+
+logger = logging.getLogger(__name__)
+
+JOBS = {}
+
+
+def get_config():
+    """
+    Returns the `SCHEDULER` settings with defaults.
+    """
+    return {
+        "RUN_IN_APP": False,
+        "WORKERS": 4,
+        "TICK": 1.0,
+        "LOCK_ID": 4_202_517,
+        "JOBS": {},
+        **getattr(settings, "SCHEDULER", {}),
+    }
+
+
+class Job:
+    """
+    Periodic job running `func` every `interval` seconds.
+    """
+
+    def __init__(self, name, func, interval):
+        self.name = name
+        self.func = func
+        self.interval = interval
+
+    def __repr__(self):
+        return f"<Job {self.name} every {self.interval}s>"
+
+
+def job(name, interval):
+    """
+    Registers the decorated function as a periodic job.
+    """
+    def decorator(func):
+        JOBS[name] = Job(name, func, interval)
+        return func
+    return decorator
+
+
+def registered():
+    """
+    Returns `{name: job}` of the registered jobs, with intervals overridden by `SCHEDULER['JOBS']`.
+    Jobs whose interval is overridden with `None` are disabled.
+    """
+    from . import jobs  # noqa: F401 registers the built-in jobs
+
+    overrides = get_config()["JOBS"]
+    result = {}
+    for name, registered_job in JOBS.items():
+        interval = overrides.get(name, registered_job.interval)
+        if interval:
+            result[name] = Job(name, registered_job.func, interval)
+    return result
+
+
+class Leadership:
+    """
+    Elects a single scheduler among all processes with a session-level PostgreSQL advisory lock,
+    held on a dedicated connection for as long as the process leads.
+    When the connection breaks, the lock is released and another process takes over.
+    Other databases serve a single process, which always leads.
+    The connection is shared by the scheduling loop and the job threads, which verify the lock
+    before every run.
+    """
+
+    HELD_SQL = (
+        "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE locktype = 'advisory' AND granted "
+        "AND pid = pg_backend_pid() AND classid = %s::oid AND objid = %s::oid AND objsubid = 1)"
+    )
+
+    def __init__(self, lock_id, alias="default"):
+        self.lock_id = lock_id
+        self.alias = alias
+        self.connection = None
+        self.leader = False
+        self.lock = threading.Lock()
+
+    def check(self):
+        """
+        Acquires the lock, or verifies it is still held. Returns whether this process leads.
+        """
+        return self.poll(acquire=True)
+
+    def held(self):
+        """
+        Verifies the lock is still held, without trying to acquire it.
+        """
+        return self.poll(acquire=False)
+
+    def poll(self, acquire):
+        with self.lock:
+            if connections[self.alias].vendor != "postgresql":
+                self.leader = True
+            elif self.leader or acquire:
+                try:
+                    if self.connection is None:
+                        self.connection = connections.create_connection(self.alias)
+                        self.connection.inc_thread_sharing()
+                    with self.connection.cursor() as cursor:
+                        if self.leader:
+                            # The session may outlive the lock, e.g. after pg_advisory_unlock_all().
+                            cursor.execute(self.HELD_SQL, [self.lock_id >> 32, self.lock_id & 0xFFFFFFFF])
+                        else:
+                            cursor.execute("SELECT pg_try_advisory_lock(%s)", [self.lock_id])
+                        self.leader = cursor.fetchone()[0]
+                except DatabaseError:
+                    logger.warning("Scheduler lock connection failed", exc_info=True)
+                    self.close()
+            metrics.SCHEDULER_LEADER.set(1 if self.leader else 0)
+            return self.leader
+
+    def close(self):
+        self.leader = False
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except DatabaseError:
+                pass
+            self.connection = None
+
+    def release(self):
+        """
+        Releases the lock by closing its session.
+        """
+        with self.lock:
+            self.close()
+        metrics.SCHEDULER_LEADER.set(0)
+
+
+class Scheduler:
+    """
+    Runs periodic jobs in a thread pool while this process holds the scheduler lock.
+    A job is not started again while its previous run is still in progress.
+    """
+
+    def __init__(self, jobs=None, workers=None, tick=None, lock_id=None):
+        config = get_config()
+        self.jobs = jobs if jobs is not None else registered()
+        self.tick = tick or config["TICK"]
+        self.pool = ThreadPoolExecutor(workers or config["WORKERS"], thread_name_prefix="scheduler")
+        self.leadership = Leadership(lock_id or config["LOCK_ID"])
+        self.next_run = {}
+        self.running = {}
+        self.stop_event = threading.Event()
+
+    def load_schedule(self, now=None):
+        """
+        Schedules every job `interval` seconds after its last recorded start, or at once.
+        """
+        now = now or time.time()
+        started = dict(ScheduledJob.objects.filter(name__in=self.jobs).exclude(
+            last_started_at=None).values_list("name", "last_started_at"))
+        self.next_run = {
+            name: started[name].timestamp() + job.interval if name in started else now
+            for name, job in self.jobs.items()
+        }
+
+    def run_pending(self, now=None):
+        """
+        Submits the jobs that are due and not running. Returns their names.
+        """
+        now = now or time.time()
+        submitted = []
+        for name, scheduled in self.jobs.items():
+            future = self.running.get(name)
+            if future is not None and not future.done():
+                continue
+            if self.next_run.get(name, now) <= now:
+                self.next_run[name] = now + scheduled.interval
+                self.running[name] = self.pool.submit(self._execute_in_thread, scheduled)
+                submitted.append(name)
+        return submitted
+
+    def _execute_in_thread(self, scheduled):
+        close_old_connections()
+        try:
+            if not self.leadership.held():
+                logger.warning("Scheduler lock lost, skipping job %s", scheduled.name)
+                return
+            self.execute(scheduled)
+        finally:
+            connections.close_all()
+
+    def execute(self, scheduled):
+        """
+        Runs a job, recording its duration and outcome in the metrics and in `ScheduledJob`.
+        Returns whether it succeeded.
+        """
+        started = time.time()
+        start = time.perf_counter()
+        error = ""
+        try:
+            scheduled.func()
+        except Exception as exc:
+            logger.exception("Scheduled job %s failed", scheduled.name)
+            error = repr(exc)
+        duration = time.perf_counter() - start
+        outcome = "failure" if error else "success"
+
+        metrics.SCHEDULER_JOB_RUNS.inc(job=scheduled.name, status=outcome)
+        metrics.SCHEDULER_JOB_DURATION.observe(duration, job=scheduled.name)
+        if not error:
+            metrics.SCHEDULER_JOB_LAST_SUCCESS.set(started + duration, job=scheduled.name)
+        values = {
+            "last_started_at": datetime.fromtimestamp(started, tz=dt_timezone.utc),
+            "last_duration": duration,
+            "last_status": outcome,
+            "last_error": error,
+        }
+        try:
+            updated = ScheduledJob.objects.filter(name=scheduled.name).update(
+                runs=F("runs") + 1, failures=F("failures") + int(bool(error)), **values)
+            if not updated:
+                ScheduledJob.objects.create(
+                    name=scheduled.name, runs=1, failures=int(bool(error)), **values)
+        except DatabaseError:
+            logger.warning("Could not record the run of job %s", scheduled.name, exc_info=True)
+        return not error
+
+    def run(self):
+        """
+        Runs jobs until `stop()` is called, polling the lock every `tick` seconds.
+        """
+        try:
+            while not self.stop_event.is_set():
+                if self.leadership.check():
+                    self.lead()
+                self.stop_event.wait(self.tick)
+        finally:
+            self.pool.shutdown(wait=True)
+            self.leadership.release()
+
+    def lead(self):
+        """
+        Runs due jobs every `tick` seconds until `stop()` is called or the lock is lost.
+        Then cancels the jobs not started yet and waits for the running ones,
+        so that they don't overlap with the next runs should this process lead again.
+        """
+        logger.info("Scheduler lock acquired, running %d jobs", len(self.jobs))
+        close_old_connections()
+        self.load_schedule()
+        while not self.stop_event.is_set():
+            self.run_pending()
+            self.stop_event.wait(self.tick)
+            if not self.leadership.held():
+                logger.warning("Scheduler lock lost, stopped scheduling jobs")
+                break
+        for future in self.running.values():
+            future.cancel()
+        wait(self.running.values())
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def start_in_background():
+    """
+    Starts a scheduler in a daemon thread of the current process, for example of the ASGI app.
+    Returns the scheduler.
+    """
+    scheduler = Scheduler()
+    threading.Thread(target=scheduler.run, name="scheduler", daemon=True).start()
+    return scheduler
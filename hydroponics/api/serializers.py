@@ -1,6 +1,10 @@
+from datetime import timedelta
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from api.models import HydroponicSystem, Measurement
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
+from api.models import DeletionJob, HydroponicSystem, Measurement
 
 User = get_user_model()
 
@@ -58,10 +62,180 @@ class HydroponicSystemSerializer(serializers.ModelSerializer):
 class MeasurementSerializer(serializers.ModelSerializer):
     """
     Serializer for the Measurement model.
-    Ensures `system` and `timestamp` are read-only.
+    Ensures `system` is read-only. `timestamp` is optional and defaults to the time of creation,
+    devices should send it so that retried readings can be deduplicated.
     """
 
     class Meta:
         model = Measurement
         fields = '__all__'
-        read_only_fields = ['system', 'timestamp']
+        read_only_fields = ['system']
+
+    def validate_timestamp(self, value):
+        """
+        Ensures an update does not move a measurement onto the timestamp of another one.
+        """
+        if self.instance is not None and Measurement.objects.filter(
+            system=self.instance.system, timestamp=value
+        ).exclude(pk=self.instance.pk).exists():
+            raise serializers.ValidationError(
+                "A measurement with this timestamp already exists in the system."
+            )
+        return value
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the status of a deletion job.
+    """
+
+    class Meta:
+        model = DeletionJob
+        fields = ['id', 'target', 'target_id', 'status', 'deleted_rows', 'error',
+                  'created_at', 'finished_at']
+
+
+class MeasurementBulkUpdateSerializer(serializers.Serializer):
+    """
+    Serializer validating a bulk update of measurements.
+    `set` assigns values and `offset` adds amounts to `ph`, `temperature` or `tds`.
+    """
+
+    set = serializers.DictField(child=serializers.FloatField(), required=False)
+    offset = serializers.DictField(child=serializers.FloatField(), required=False)
+
+    fields_allowed = ['ph', 'temperature', 'tds']
+
+    def validate(self, data):
+        """
+        Ensures at least one known field is changed, at most once,
+        and assigned values are valid for the field.
+        """
+        values, offsets = data.get('set', {}), data.get('offset', {})
+        if not values and not offsets:
+            raise serializers.ValidationError("Provide `set` or `offset`.")
+        errors = {}
+        for name in [*values, *offsets]:
+            if name not in self.fields_allowed:
+                errors[name] = f"Unknown field, valid fields: {', '.join(self.fields_allowed)}."
+            elif name in values and name in offsets:
+                errors[name] = "A field can either be set or offset."
+        for name, amount in {**values, **offsets}.items():
+            if name == 'tds' and name not in errors and not float(amount).is_integer():
+                errors[name] = "TDS must be changed by a whole number."
+        for name, value in values.items():
+            if name not in errors:
+                try:
+                    Measurement._meta.get_field(name).run_validators(value)
+                except DjangoValidationError as error:
+                    errors[name] = error.messages
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
+
+
+class ForecastQuerySerializer(serializers.Serializer):
+    """
+    Serializer validating the query parameters of a forecast.
+    """
+
+    fields = serializers.CharField(required=False, default='ph,tds')
+    method = serializers.ChoiceField(choices=['linear', 'holt'], default='linear')
+    window = serializers.IntegerField(min_value=1, max_value=24 * 30, default=24)
+    horizon = serializers.FloatField(min_value=0.1, max_value=24 * 7, default=6)
+    steps = serializers.IntegerField(min_value=1, max_value=100, default=6)
+    alpha = serializers.FloatField(min_value=0.01, max_value=1, default=0.3)
+    beta = serializers.FloatField(min_value=0.01, max_value=1, default=0.1)
+
+    series_fields = ['ph', 'temperature', 'tds']
+
+    def validate_fields(self, value):
+        """
+        Ensures `fields` lists known measurement fields, returns them as a list.
+        """
+        fields = [field for field in value.split(',') if field]
+        invalid = [field for field in fields if field not in self.series_fields]
+        if invalid or not fields:
+            raise serializers.ValidationError(
+                f"Valid fields: {', '.join(self.series_fields)}.")
+        return fields
+
+
+class ResampleQuerySerializer(serializers.Serializer):
+    """
+    Serializer validating the query parameters of a resampled series.
+    """
+
+    systems = serializers.CharField()
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    interval = serializers.IntegerField(min_value=1, max_value=7 * 24 * 3600, default=300)
+    fill = serializers.ChoiceField(choices=['locf', 'linear', 'null'], default='locf')
+    limit = serializers.IntegerField(min_value=0, required=False, default=None)
+    fields = serializers.CharField(required=False, default='ph,temperature,tds')
+
+    series_fields = ['ph', 'temperature', 'tds']
+    max_systems = 50
+    max_points = 10_000
+
+    def validate_systems(self, value):
+        """
+        Ensures `systems` is a comma-separated list of ids, returns them as a list without duplicates.
+        """
+        try:
+            ids = list(dict.fromkeys(int(system_id) for system_id in value.split(',') if system_id))
+        except ValueError:
+            raise serializers.ValidationError("Give comma-separated system ids.")
+        if not 1 <= len(ids) <= self.max_systems:
+            raise serializers.ValidationError(f"Give between 1 and {self.max_systems} systems.")
+        return ids
+
+    def validate_fields(self, value):
+        """
+        Ensures `fields` lists known measurement fields, returns them as a list.
+        """
+        fields = [field for field in value.split(',') if field]
+        invalid = [field for field in fields if field not in self.series_fields]
+        if invalid or not fields:
+            raise serializers.ValidationError(
+                f"Valid fields: {', '.join(self.series_fields)}.")
+        return fields
+
+    def validate(self, data):
+        """
+        Ensures the time range is not empty and the grid holds at most `max_points` points.
+        """
+        if data['end'] <= data['start']:
+            raise serializers.ValidationError({'end': "end must be after start."})
+        points = (data['end'] - data['start']).total_seconds() / data['interval']
+        if points > self.max_points:
+            raise serializers.ValidationError(
+                {'interval': f"The grid may hold at most {self.max_points} points, increase the interval."})
+        return data
+
+
+class AnalyticsQuerySerializer(ResampleQuerySerializer):
+    """
+    Serializer validating the query parameters of fleet analytics.
+    The window of `window` hours ends at `end`, by default now, rounded down to the grid.
+    """
+
+    systems = serializers.CharField(required=False)
+    start = None
+    end = serializers.DateTimeField(required=False)
+    window = serializers.IntegerField(min_value=1, max_value=24 * 30, default=24)
+    fill = serializers.ChoiceField(choices=['locf', 'linear', 'null'], default='linear')
+    fields = serializers.CharField(required=False, default='ph')
+
+    def validate(self, data):
+        """
+        Resolves the window into `start` and `end` on the grid, which holds at most `max_points` points.
+        """
+        interval = data['interval']
+        end = data.get('end') or timezone.now()
+        end = end - timedelta(seconds=end.timestamp() % interval)
+        data.update(start=end - timedelta(hours=data['window']), end=end)
+        if data['window'] * 3600 / interval > self.max_points:
+            raise serializers.ValidationError(
+                {'interval': f"The grid may hold at most {self.max_points} points, increase the interval."})
+        return data
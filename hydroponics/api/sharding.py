@@ -0,0 +1,439 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import (
+    ChangeLog, DeletionJob, EdgeSyncLink, HydroponicSystem, IngestBatch, Measurement, MeasurementArchive,
+    ShardAssignment, User,
+)
+
+
+# models of the api app stored on the shard of their owner, other models live in the directory database
+SHARDED_MODELS = {
+    "hydroponicsystem", "measurement", "measurementarchive", "changelog", "ingestbatch", "edgesynclink",
+}
+
+# rows copied with a user after their systems: model and the maximum rows per batch (`None` for `COPY_BATCH`)
+SYSTEM_ROWS = [
+    (Measurement, None),
+    (MeasurementArchive, 50),
+    (IngestBatch, None),
+    (EdgeSyncLink, None),
+]
+
+_active = ContextVar("hydroponics_shard", default=None)
+
+
+class MoveError(Exception):
+    """
+    Raised when a user cannot be moved to the requested shard.
+    """
+
+
+def get_config():
+    """
+    Returns the `SHARDING` settings with defaults.
+    """
+    return {
+        "SHARDS": {"default": 0},
+        "DIRECTORY": "default",
+        "ID_BLOCK": 2 ** 40,
+        "COPY_BATCH": 5_000,
+        "FREEZE_GRACE": 5,
+        **getattr(settings, "SHARDING", {}),
+    }
+
+
+def enabled():
+    """
+    Returns whether data is spread over more than one shard.
+    """
+    return len(get_config()["SHARDS"]) > 1
+
+
+def directory():
+    """
+    Returns the alias of the directory database, holding users and shard assignments.
+    """
+    return get_config()["DIRECTORY"]
+
+
+def aliases():
+    """
+    Returns the aliases of all databases holding user data: the directory and the shards.
+    """
+    return list(dict.fromkeys([directory(), *get_config()["SHARDS"]]))
+
+
+def db():
+    """
+    Returns the alias of the active shard, or of the directory database when no shard is active.
+    """
+    return _active.get() or directory()
+
+
+@contextmanager
+def use(alias):
+    """
+    Makes the shard `alias` active for the duration of the block, `None` activates the directory.
+    """
+    token = _active.set(alias)
+    try:
+        yield alias
+    finally:
+        _active.reset(token)
+
+
+def each():
+    """
+    Makes every database holding user data active in turn, yielding its alias.
+    """
+    for alias in aliases():
+        with use(alias):
+            yield alias
+
+
+def is_sharded(model):
+    return model._meta.app_label == "api" and model._meta.model_name in SHARDED_MODELS
+
+
+def sharded_models():
+    return [model for model in apps.get_app_config("api").get_models() if is_sharded(model)]
+
+
+class ShardRouter:
+    """
+    Routes systems, measurements and the rows depending on them to the active shard,
+    or to the database of the sharded instance they are accessed through,
+    and all other models to the directory database.
+    """
+
+    def _route(self, model, hints):
+        if not is_sharded(model):
+            return directory()
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db and is_sharded(type(instance)):
+            return instance._state.db
+        return db()
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """
+        Users are mirrored to the shards of their rows, sharded rows only relate within a shard.
+        """
+        if is_sharded(type(obj1)) and is_sharded(type(obj2)):
+            return obj1._state.db == obj2._state.db
+        return True
+
+
+def mirror_user(user_id, alias):
+    """
+    Copies the user row to a shard, where it satisfies the foreign keys of the user's rows.
+    Users are authenticated against the directory database only.
+    """
+    if alias == directory():
+        return
+    user = User.objects.using(directory()).get(id=user_id)
+    User.objects.using(alias).bulk_create([user], ignore_conflicts=True)
+
+
+def place(user_id):
+    """
+    Assigns a user to a shard and returns the assignment.
+    Users owning systems in the directory database stay there, other users go to the shard with the fewest users.
+    """
+    if HydroponicSystem.objects.using(directory()).filter(owner_id=user_id).exists():
+        alias = directory()
+    else:
+        counts = dict(ShardAssignment.objects.values("shard").annotate(users=Count("pk")).values_list(
+            "shard", "users"))
+        alias = min(get_config()["SHARDS"], key=lambda name: counts.get(name, 0))
+    mirror_user(user_id, alias)
+    assignment, _ = ShardAssignment.objects.get_or_create(user_id=user_id, defaults={"shard": alias})
+    return assignment
+
+
+def assignment(user_id):
+    """
+    Returns the shard assignment of a user, placing users seen for the first time.
+    """
+    return ShardAssignment.objects.filter(user_id=user_id).first() or place(user_id)
+
+
+def shard_of(user_id):
+    """
+    Returns the shard of a user without placing them, users without an assignment live in the directory.
+    """
+    if not enabled():
+        return directory()
+    shard = ShardAssignment.objects.filter(user_id=user_id).values_list("shard", flat=True).first()
+    return shard or directory()
+
+
+def activate(user):
+    """
+    Makes the shard of an authenticated user active in the current context.
+    Returns the user's assignment, or `None` when sharding is disabled or the user is anonymous.
+    """
+    if not enabled() or not user or not user.is_authenticated:
+        return None
+    placed = assignment(user.id)
+    _active.set(placed.shard)
+    return placed
+
+
+def moving_users():
+    """
+    Returns the ids of users being moved between shards.
+    """
+    if not enabled():
+        return []
+    return list(ShardAssignment.objects.exclude(target="").values_list("user_id", flat=True))
+
+
+def frozen_systems(system_ids):
+    """
+    Returns the ids of the systems among `system_ids` whose owner is frozen by a move,
+    writes to them wait until the owner is switched to the new shard.
+    """
+    if not enabled():
+        return set()
+    frozen = list(ShardAssignment.objects.filter(frozen=True).values_list("user_id", flat=True))
+    if not frozen:
+        return set()
+    return {
+        system_id
+        for alias in aliases()
+        for system_id in HydroponicSystem.objects.using(alias).filter(
+            id__in=system_ids, owner_id__in=frozen).values_list("id", flat=True)
+    }
+
+
+def locate_systems(system_ids):
+    """
+    Returns `{system id: shard}` of the existing systems among `system_ids`.
+    A system copied by an unfinished move is located on the shard of its owner.
+    """
+    found = {}
+    for alias in aliases():
+        rows = HydroponicSystem.objects.using(alias).filter(id__in=system_ids).values_list("id", "owner_id")
+        for system_id, owner_id in rows:
+            found.setdefault(system_id, []).append((alias, owner_id))
+    return {
+        system_id: places[0][0] if len(places) == 1 else shard_of(places[0][1])
+        for system_id, places in found.items()
+    }
+
+
+def id_block(index):
+    """
+    Returns the first and last id of the block of a shard.
+    """
+    size = get_config()["ID_BLOCK"]
+    return index * size + 1, (index + 1) * size
+
+
+def reserve_ids(alias, index=None):
+    """
+    Makes new rows of the sharded tables of a shard take ids from the shard's own block,
+    so ids are unique across shards and rows keep their ids when a user is moved.
+    Sequences already within the block are left alone.
+    """
+    first, last = id_block(get_config()["SHARDS"][alias] if index is None else index)
+    connection = connections[alias]
+    if connection.vendor not in ("postgresql", "sqlite"):
+        return
+    with connection.cursor() as cursor:
+        for model in sharded_models():
+            table = model._meta.db_table
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+                sequence = cursor.fetchone()[0]
+                cursor.execute(f"SELECT last_value, is_called FROM {sequence}")
+                value, called = cursor.fetchone()
+                following = value + 1 if called else value
+            else:
+                cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+                row = cursor.fetchone()
+                following = (row[0] if row else 0) + 1
+            if first <= following <= last:
+                continue
+
+            cursor.execute(
+                f"SELECT MAX(id) FROM {connection.ops.quote_name(table)} WHERE id BETWEEN %s AND %s",
+                [first, last],
+            )
+            highest = cursor.fetchone()[0] or first - 1
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT setval(%s, %s, %s)", [sequence, max(highest, first), highest >= first])
+            else:
+                cursor.execute("DELETE FROM sqlite_sequence WHERE name = %s", [table])
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, highest])
+
+
+def reserve_ids_after_migrate(using, **kwargs):
+    """
+    `post_migrate` receiver reserving the id block of a migrated shard.
+    """
+    if using in get_config()["SHARDS"]:
+        reserve_ids(using)
+
+
+def copy_rows(user_id, source, target, batch_size=None, models=SYSTEM_ROWS, update=False):
+    """
+    Copies a user's systems and the rows of `models` depending on them from `source` to `target`
+    in batches, keeping their ids. Rows already copied are skipped, or overwritten when `update`.
+    Returns the number of copied rows.
+    """
+    batch_size = batch_size or get_config()["COPY_BATCH"]
+    mirror_user(user_id, target)
+    systems = list(HydroponicSystem.objects.using(source).filter(owner_id=user_id))
+    HydroponicSystem.objects.using(target).bulk_create(systems, ignore_conflicts=True)
+    system_ids = [system.id for system in systems]
+    copied = len(systems)
+    for model, limit in models:
+        last = 0
+        while True:
+            rows = list(
+                model.objects.using(source).filter(system_id__in=system_ids, id__gt=last)
+                .order_by("id")[:min(batch_size, limit or batch_size)]
+            )
+            if not rows:
+                break
+            if update:
+                fields = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+                model.objects.using(target).bulk_create(
+                    rows, update_conflicts=True, unique_fields=["id"], update_fields=fields)
+            else:
+                model.objects.using(target).bulk_create(rows, ignore_conflicts=True)
+            copied += len(rows)
+            last = rows[-1].id
+    return copied
+
+
+def catch_up(user_id, source, target, position, settled=False):
+    """
+    Applies changes of a user's systems and measurements logged on `source` after `position`
+    to their copies on `target`: deleted rows are deleted, other rows are copied with their current values.
+    Only visible changes are read, so changes still being committed are applied by a later call.
+    Once `settled`, when no write of the user can still be running, every committed change is read.
+    Returns `(position of the last applied change, number of changed objects)`.
+    """
+    from .changes import after, visible
+
+    with use(source):
+        entries = ChangeLog.objects.all() if settled else visible()
+        entries = (
+            entries.filter(after(position), owner_id=user_id).order_by("txid", "id")
+            .values_list("txid", "id", "model", "object_id", "action")
+        )
+        latest = {}
+        for txid, change_id, model, object_id, action in entries.iterator():
+            latest[(model, object_id)] = action
+            position = (txid, change_id)
+
+    def changed(kind, action):
+        return [object_id for (model, object_id), logged in latest.items()
+                if model == kind and logged == action]
+
+    kinds = [(ChangeLog.Model.SYSTEM, HydroponicSystem), (ChangeLog.Model.MEASUREMENT, Measurement)]
+    with transaction.atomic(using=target):
+        for kind, model in reversed(kinds):
+            model.objects.using(target).filter(id__in=changed(kind, ChangeLog.Action.DELETE)).delete()
+        for kind, model in kinds:
+            ids = changed(kind, ChangeLog.Action.UPSERT)
+            fields = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+            for offset in range(0, len(ids), 1000):
+                rows = list(model.objects.using(source).filter(id__in=ids[offset:offset + 1000]))
+                model.objects.using(target).bulk_create(
+                    rows, update_conflicts=True, unique_fields=["id"], update_fields=fields)
+    return position, len(latest)
+
+
+def purge(user_id, alias):
+    """
+    Deletes a user's systems, measurements and changes from a shard, measurements in chunks.
+    """
+    from .deletion import delete_measurements
+
+    with use(alias):
+        delete_measurements(HydroponicSystem.objects.filter(owner_id=user_id).values_list("id", flat=True))
+        with transaction.atomic(using=alias):
+            HydroponicSystem.objects.filter(owner_id=user_id).delete()
+            ChangeLog.objects.filter(owner_id=user_id).delete()
+            if alias != directory():
+                User.objects.using(alias).filter(id=user_id).delete()
+
+
+def move_user(user_id, target, batch_size=None, grace=None, progress=None):
+    """
+    Moves a user's rows to the shard `target` while the user keeps working:
+    1. rows are copied while reads and writes go to the current shard,
+    2. changes logged meanwhile are applied to the copies until none remain,
+    3. writes are rejected for `FREEZE_GRACE` seconds so running requests commit,
+       the last changes are applied and the user is switched to `target`,
+    4. the rows are deleted from the previous shard.
+    The ingest worker keeps the user's queued batches while frozen. Users with running deletion jobs
+    are not moved, jobs started during the move are run after the switch.
+    Change feed cursors issued before the switch expire, so clients download full lists again.
+    `progress` is called with the name of every finished step. Returns the number of copied rows.
+    """
+    from . import changes, deletion
+
+    config = get_config()
+    if target not in config["SHARDS"]:
+        raise MoveError(f"Unknown shard {target!r}.")
+    source = assignment(user_id).shard
+    if source == target:
+        raise MoveError(f"User {user_id} is already on {target!r}.")
+    progress = progress or (lambda step: None)
+    moving = ShardAssignment.objects.filter(user_id=user_id)
+    moving.update(target=target, frozen=False)
+    # deletion jobs started from now on wait for the move, running ones would keep deleting on `source`
+    if deletion.jobs_of(user_id).filter(status=DeletionJob.Status.RUNNING).exists():
+        moving.update(target="")
+        raise MoveError(f"User {user_id} has running deletion jobs, move them once finished.")
+    try:
+        with use(source):
+            # changes of transactions still running sort after this position and are applied by the catch-up
+            position = changes.position(user_id)
+        copied = copy_rows(user_id, source, target, batch_size)
+        reserve_ids(target)
+        progress("copied")
+        for _ in range(10):
+            position, changed = catch_up(user_id, source, target, position)
+            if not changed:
+                break
+
+        moving.update(frozen=True)
+        progress("frozen")
+        time.sleep(config["FREEZE_GRACE"] if grace is None else grace)
+        catch_up(user_id, source, target, position, settled=True)
+        # the ingest ledger is not in the change log, batches applied meanwhile are copied again
+        copy_rows(user_id, source, target, batch_size, [(IngestBatch, None)])
+        # neither are edge sync links, created or advanced by syncs running meanwhile
+        copy_rows(user_id, source, target, batch_size, [(EdgeSyncLink, None)], update=True)
+        moving.update(shard=target, target="", frozen=False, moved_at=timezone.now())
+    except Exception:
+        moving.update(target="", frozen=False)
+        purge(user_id, target)
+        raise
+    finally:
+        for job_id in deletion.jobs_of(user_id).filter(
+                status=DeletionJob.Status.PENDING).values_list("id", flat=True):
+            deletion.run_job(job_id)
+    progress("switched")
+    purge(user_id, source)
+    progress("purged")
+    return copied
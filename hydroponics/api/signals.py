@@ -0,0 +1,23 @@
+from django.apps import apps
+from django.db import router, transaction
+from django.dispatch import Signal
+
+
+# Sent with `system_ids` and `kind` ("create", "update" or "delete") once
+# measurements of the systems were changed and the change was committed.
+# Caches and rollups derived from measurements subscribe to it to stay consistent,
+# including after bulk statements which do not send model signals.
+measurements_changed = Signal()
+
+
+def notify_measurements_changed(system_ids, kind):
+    """
+    Sends `measurements_changed` after the current transaction commits.
+    """
+    system_ids = sorted(set(system_ids))
+    if not system_ids:
+        return
+    model = apps.get_model("api", "Measurement")
+    transaction.on_commit(lambda: measurements_changed.send(
+        sender=model, system_ids=system_ids, kind=kind,
+    ), using=router.db_for_write(model))
@@ -0,0 +1,137 @@
+from django.db import connection
+
+from .models import Measurement
+
+
+# PostgreSQL sizes and alignments of fixed-width column types
+TYPE_LAYOUT = {
+    "BigAutoField": (8, 8),
+    "BigIntegerField": (8, 8),
+    "FloatField": (8, 8),
+    "DateTimeField": (8, 8),
+    "IntegerField": (4, 4),
+    "PositiveIntegerField": (4, 4),
+    "SmallIntegerField": (2, 2),
+    "PositiveSmallIntegerField": (2, 2),
+}
+
+TUPLE_HEADER = 24  # heap tuple header, 23 bytes padded to 8
+INDEX_TUPLE_HEADER = 8
+LINE_POINTER = 4
+MAXALIGN = 8
+
+# columns of `api_measurement` in table order
+COLUMN_ORDER = ["id", "ph", "temperature", "tds", "timestamp", "system"]
+
+LEGACY_COLUMNS = [
+    ("id", "BigAutoField"),
+    ("ph", "FloatField"),
+    ("temperature", "FloatField"),
+    ("tds", "IntegerField"),
+    ("timestamp", "DateTimeField"),
+    ("system", "BigIntegerField"),
+]
+
+# B-tree indexes as `(name, key columns, included columns)`
+LEGACY_INDEXES = [
+    ("pkey", ["id"], []),
+    ("system", ["system"], []),
+    ("timestamp", ["timestamp"], []),
+    ("meta timestamp", ["timestamp"], []),
+    ("meta system, timestamp", ["system", "timestamp"], []),
+    ("unique system, timestamp", ["system", "timestamp"], []),
+]
+
+CURRENT_INDEXES = [
+    ("pkey", ["id"], []),
+    ("unique system, timestamp", ["system", "timestamp"], ["ph", "temperature", "tds"]),
+]
+
+
+def _align(offset, alignment):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def _data_width(types):
+    offset = 0
+    for internal_type in types:
+        size, alignment = TYPE_LAYOUT[internal_type]
+        offset = _align(offset, alignment) + size
+    return offset
+
+
+def current_columns():
+    """
+    Returns `(name, internal type)` pairs of the `Measurement` columns in table order.
+    """
+    columns = []
+    for name in COLUMN_ORDER:
+        field = Measurement._meta.get_field(name)
+        if field.is_relation:
+            field = field.target_field
+        columns.append((name, field.get_internal_type()))
+    return columns
+
+
+def row_bytes(columns):
+    """
+    Estimates the heap bytes of a row, including the tuple header and line pointer.
+    """
+    width = _data_width(internal_type for _, internal_type in columns)
+    return _align(TUPLE_HEADER + width, MAXALIGN) + LINE_POINTER
+
+
+def index_bytes(columns, indexes):
+    """
+    Estimates the B-tree leaf bytes per row of every index. Returns `{name: bytes}`.
+    """
+    types = dict(columns)
+    return {
+        name: _align(INDEX_TUPLE_HEADER + _data_width(types[column] for column in keys + include),
+                     MAXALIGN) + LINE_POINTER
+        for name, keys, include in indexes
+    }
+
+
+def estimate():
+    """
+    Estimates bytes per row of the legacy and current `Measurement` layouts on PostgreSQL.
+    Returns `{layout: {"heap", "indexes", "total"}}`.
+    """
+    report = {}
+    for layout, columns, indexes in (
+        ("legacy", LEGACY_COLUMNS, LEGACY_INDEXES),
+        ("current", current_columns(), CURRENT_INDEXES),
+    ):
+        heap = row_bytes(columns)
+        per_index = index_bytes(columns, indexes)
+        report[layout] = {
+            "heap": heap,
+            "indexes": per_index,
+            "total": heap + sum(per_index.values()),
+        }
+    return report
+
+
+def measure():
+    """
+    Returns the measured heap and index sizes of `Measurement` on PostgreSQL,
+    or `None` on other databases.
+    """
+    if connection.vendor != "postgresql":
+        return None
+    table = Measurement._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_relation_size(%s::regclass), "
+            "(SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass)",
+            [table, table],
+        )
+        heap, rows = cursor.fetchone()
+        cursor.execute(
+            "SELECT indexrelid::regclass::text, pg_relation_size(indexrelid) "
+            "FROM pg_index WHERE indrelid = %s::regclass ORDER BY 1",
+            [table],
+        )
+        indexes = dict(cursor.fetchall())
+    return {"rows": max(rows, 0), "heap": heap, "indexes": indexes}
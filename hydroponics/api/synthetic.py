@@ -0,0 +1,162 @@
+import csv
+import io
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from . import sharding
+from .models import ChangeLog, HydroponicSystem, Measurement
+from .signals import notify_measurements_changed
+
+
+User = get_user_model()
+
+MEASUREMENT_COLUMNS = ["system", "ph", "temperature", "tds", "timestamp"]
+
+
+def create_users(prefix, count, password):
+    """
+    Creates `count` users named `<prefix>_<n>` sharing one password hash.
+    Existing users are kept. Returns the users ordered by username.
+    """
+    hashed = make_password(password)
+    usernames = [f"{prefix}_{n}" for n in range(count)]
+    User.objects.bulk_create(
+        [User(username=username, password=hashed) for username in usernames],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    return list(User.objects.filter(username__in=usernames).order_by("username"))
+
+
+def group_by_shard(users):
+    """
+    Returns `[(shard, users)]`, placing users seen for the first time, a single group without sharding.
+    Raises `ValueError` for users being moved between shards, whose writes would be lost.
+    """
+    moving = set(sharding.moving_users())
+    names = [user.username for user in users if user.id in moving]
+    if names:
+        raise ValueError(f"Users being moved to another shard: {', '.join(names)}.")
+    if not sharding.enabled():
+        return [(None, users)]
+    groups = defaultdict(list)
+    for user in users:
+        groups[sharding.assignment(user.id).shard].append(user)
+    return list(groups.items())
+
+
+def create_systems(users, per_user):
+    """
+    Creates `per_user` hydroponic systems for every user. Returns the created systems.
+    """
+    systems = [
+        HydroponicSystem(name=f"{user.username} system {n}", owner=user)
+        for user in users
+        for n in range(per_user)
+    ]
+    systems = HydroponicSystem.objects.bulk_create(systems, batch_size=1000)
+    ChangeLog.objects.record(
+        HydroponicSystem.objects.filter(id__in=[system.id for system in systems]),
+        ChangeLog.Action.UPSERT,
+    )
+    return systems
+
+
+def generate_series(count, start, interval, rng):
+    """
+    Generates a realistic measurement series of `count` readings.
+    Returns `(timestamps, ph, temperature, tds)` NumPy arrays, where timestamps are
+    seconds since the epoch.
+
+    - temperature follows a daily cycle with sensor noise,
+    - pH drifts upwards and is reset by dosing whenever it leaves the target range,
+    - TDS falls with nutrient uptake and jumps back when the reservoir is refilled.
+    """
+    offsets = np.arange(count) * interval + rng.uniform(0, interval * 0.2, count)
+    timestamps = start.timestamp() + offsets
+    day_phase = 2 * np.pi * (timestamps % 86400) / 86400
+
+    temperature = 22 + 3 * np.sin(day_phase - np.pi / 2) + rng.normal(0, 0.3, count)
+
+    drift = np.cumsum(rng.normal(0.002, 0.01, count))
+    ph = 5.8 + np.mod(drift, 0.8) + rng.normal(0, 0.03, count)
+
+    refill_every = max(1, int(7 * 86400 / interval))
+    uptake = np.arange(count) % refill_every
+    tds = 1100 - uptake * (400 / refill_every) + rng.normal(0, 15, count)
+
+    return timestamps, ph.round(2), temperature.round(2), tds.round().astype(np.int64)
+
+
+def insert_measurements(system_ids, count, interval, batch_size=50_000, seed=None, end=None):
+    """
+    Inserts `count` readings ending at `end` for every system, bypassing the ORM.
+    PostgreSQL uses `COPY`, other databases fall back to `executemany`.
+    Returns the number of inserted rows.
+    """
+    rng = np.random.default_rng(seed)
+    end = end or timezone.now()
+    start = end - timedelta(seconds=count * interval)
+    inserted = 0
+    for system_id in system_ids:
+        timestamps, ph, temperature, tds = generate_series(count, start, interval, rng)
+        for offset in range(0, count, batch_size):
+            chunk = slice(offset, offset + batch_size)
+            rows = zip(
+                [system_id] * len(timestamps[chunk]),
+                ph[chunk].tolist(),
+                temperature[chunk].tolist(),
+                tds[chunk].tolist(),
+                timestamps[chunk].tolist(),
+            )
+            inserted += _write_rows(rows)
+    ChangeLog.objects.record(
+        Measurement.objects.filter(system_id__in=system_ids, timestamp__gte=start),
+        ChangeLog.Action.UPSERT,
+    )
+    notify_measurements_changed(system_ids, "create")
+    return inserted
+
+
+def _write_rows(rows):
+    # written to the database of the active shard, like the change log entries recorded afterwards
+    alias = router.db_for_write(Measurement)
+    connection = connections[alias]
+    table = Measurement._meta.db_table
+    fields = [Measurement._meta.get_field(name) for name in MEASUREMENT_COLUMNS]
+    columns = [field.column for field in fields]
+    # values are prepared by the fields, so fixed-point columns receive scaled integers
+    params = [
+        [
+            field.get_db_prep_save(value, connection)
+            for field, value in zip(
+                fields,
+                (system_id, ph, temperature, tds,
+                 datetime.fromtimestamp(ts, tz=dt_timezone.utc)),
+            )
+        ]
+        for system_id, ph, temperature, tds, ts in rows
+    ]
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(params)
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+            return len(params)
+
+        quoted = ", ".join(connection.ops.quote_name(column) for column in columns)
+        cursor.executemany(
+            f"INSERT INTO {connection.ops.quote_name(table)} ({quoted}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))})",
+            params,
+        )
+        return len(params)
@@ -1,8 +1,38 @@
-from rest_framework.test import APITestCase
+import base64
+import gzip
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
+
+import numpy as np
+
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, connection, connections, models
 from django.contrib.auth import get_user_model
-from .models import HydroponicSystem, Measurement
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from .filters import search_systems
+from .models import (
+    ChangeLog, DeletionJob, EdgeSyncLink, ScheduledJob, HydroponicSystem, IngestBatch, Measurement, MeasurementArchive,
+    ShardAssignment,
+)
+from . import (
+    analytics, archive, batch, caching, changes, compression, deletion, downsampling, edge, forecasting, ingest_queue, loadtest, metrics, signals, storage,
+    resampling, scheduler, sharding, synthetic, throttling,
+)
 
 User = get_user_model()
 
@@ -173,6 +203,51 @@ class MeasurementAPITestCase(APITestCase):
         self.assertEqual(response.data["tds"], 850)
         self.assertEqual(response.data["system"], self.system.id)
 
+    def test_create_measurement_is_idempotent(self):
+        """
+        Test that retrying a reading with the same device timestamp stores it once.
+        """
+        data = {"ph": 7.0, "temperature": 24.0, "tds": 850, "timestamp": "2025-03-01T12:00:00Z"}
+        first = self.client.post(self.m_url, data, format="json")
+        retry = self.client.post(self.m_url, {**data, "ph": 7.5}, format="json")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data["id"], first.data["id"])
+        self.assertEqual(retry.data["ph"], 7.0)
+        self.assertEqual(Measurement.objects.filter(system=self.system).count(), 2)
+
+        updated = self.client.post(f"{self.m_url}?on_conflict=update", {**data, "ph": 7.5}, format="json")
+        self.assertEqual(updated.data["id"], first.data["id"])
+        self.assertEqual(updated.data["ph"], 7.5)
+
+    def test_create_measurement_batch(self):
+        """
+        Test creating many measurements in one request, skipping those already stored.
+        """
+        data = [
+            {"ph": 6.0 + n / 10, "temperature": 22.0, "tds": 800, "timestamp": f"2025-03-01T12:0{n}:00Z"}
+            for n in range(5)
+        ]
+        response = self.client.post(self.m_url, data[:3], format="json")
+        retry = self.client.post(self.m_url, data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data["received"], 5)
+        self.assertEqual(Measurement.objects.filter(system=self.system).count(), 6)
+
+    def test_update_measurement_onto_existing_timestamp(self):
+        """
+        Test that an update cannot create a duplicate timestamp.
+        """
+        other = Measurement.objects.create(
+            system=self.system, ph=6.8, temperature=23.5, tds=780, timestamp="2025-03-01T12:00:00Z")
+        response = self.client.patch(
+            self.m_det_url, {"timestamp": "2025-03-01T12:00:00Z"}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Measurement.objects.filter(id=other.id).exists())
+
     def test_get_measurement_list(self):
         """
         Test retrieving a paginated list of measurements for a specific system.
@@ -309,3 +384,2280 @@ class MeasurementAPITestCase(APITestCase):
             other_measurement_url, data, format="json")
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TokenBucketBackendTestCase(SimpleTestCase):
+    """
+    Test case for the in-process token bucket backend.
+    """
+
+    def setUp(self):
+        self.now = 0.0
+        self.backend = throttling.LocalTokenBucketBackend(timer=lambda: self.now)
+
+    def test_bucket_allows_burst_then_waits(self):
+        """
+        Test that a full bucket allows a burst and then reports the refill delay.
+        """
+        for _ in range(3):
+            self.assertEqual(self.backend.consume("key", 3, 1.0), 0.0)
+
+        self.assertAlmostEqual(self.backend.consume("key", 3, 1.0), 1.0)
+
+    def test_bucket_refills_over_time(self):
+        """
+        Test that tokens are refilled according to the elapsed time.
+        """
+        for _ in range(3):
+            self.backend.consume("key", 3, 1.0)
+
+        self.now = 2.0
+        self.assertEqual(self.backend.consume("key", 3, 1.0), 0.0)
+        self.assertEqual(self.backend.consume("key", 3, 1.0), 0.0)
+        self.assertGreater(self.backend.consume("key", 3, 1.0), 0.0)
+
+    def test_prune_keeps_buckets_of_slower_scopes(self):
+        """
+        Test that pruning drops only full buckets, by the rate of each bucket, at most once per interval.
+        """
+        backend = throttling.LocalTokenBucketBackend(max_keys=2, prune_interval=5, timer=lambda: self.now)
+        backend.consume("slow", 10, 0.01)
+        backend.consume("fast", 10, 100.0)
+        self.now = 6.0
+        backend.consume("other", 10, 100.0)
+        self.assertEqual(set(backend._buckets), {"slow", "other"})
+
+        self.now = 7.0
+        backend.consume("new", 10, 100.0)
+        self.assertEqual(set(backend._buckets), {"slow", "other", "new"})
+
+
+@override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    "DEFAULT_THROTTLE_RATES": {"user": "100/min", "system": "2/min"},
+})
+class RateLimitAPITestCase(APITestCase):
+    """
+    Test case for per-user and per-system rate limiting.
+    """
+
+    def setUp(self):
+        """
+        Prepares an authenticated user with a hydroponic system and clears all buckets.
+        """
+        throttling.get_backend().reset()
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        self.system = HydroponicSystem.objects.create(name="Test System", owner=self.user)
+        self.m_url = f"/api/systems/{self.system.id}/measurements/"
+
+    def test_system_flood_is_throttled(self):
+        """
+        Test that exceeding the system rate returns 429 with a Retry-After header.
+        """
+        data = {"ph": 7.0, "temperature": 24.0, "tds": 850}
+        for _ in range(2):
+            response = self.client.post(self.m_url, data, format="json")
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post(self.m_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", response)
+        self.assertGreater(throttling.get_stats()["system"]["throttled"], 0)
+
+    def test_other_system_is_not_throttled(self):
+        """
+        Test that the system limit is tracked separately for every system.
+        """
+        other = HydroponicSystem.objects.create(name="Other System", owner=self.user)
+        for _ in range(3):
+            self.client.get(self.m_url)
+
+        response = self.client.get(f"/api/systems/{other.id}/measurements/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_other_user_cannot_drain_system_bucket(self):
+        """
+        Test that requests of another user for a system do not consume the owner's bucket.
+        """
+        intruder = User.objects.create_user(username="intruder", password="testpass")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(intruder).access_token}")
+        for _ in range(3):
+            self.client.get(self.m_url)
+
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        response = self.client.get(self.m_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class MetricsAPITestCase(APITestCase):
+    """
+    Test case for request metrics and the exposition endpoint.
+    """
+
+    def setUp(self):
+        """
+        Prepares an authenticated user with a hydroponic system.
+        """
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        self.system = HydroponicSystem.objects.create(name="Test System", owner=self.user)
+        self.m_url = f"/api/systems/{self.system.id}/measurements/"
+
+    def test_requests_are_recorded(self):
+        """
+        Test that latency, phases and ingested rows are exposed after requests.
+        """
+        ingested_before = metrics.INGESTED_ROWS.values().get((), 0)
+        self.client.post(self.m_url, {"ph": 7.0, "temperature": 24.0, "tds": 850}, format="json")
+        self.client.get(self.m_url)
+
+        User.objects.filter(id=self.user.id).update(is_staff=True)
+        response = self.client.get("/api/metrics/")
+        body = response.content.decode()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn('hydroponics_http_request_duration_seconds_count{endpoint="measurement_list",method="GET"}', body)
+        self.assertIn('phase="serialize"', body)
+        self.assertIn('hydroponics_rows_returned_bucket{endpoint="measurement_list",le="1.0"}', body)
+        self.assertEqual(metrics.INGESTED_ROWS.values()[()], ingested_before + 1)
+
+    def test_shards_of_finished_threads_are_folded(self):
+        """
+        Test that values of finished threads are kept while their shards are released.
+        """
+        registry = metrics.Registry()
+        counter = metrics.Counter("test_total", "Test counter.", registry=registry)
+        histogram = metrics.Histogram("test_seconds", "Test histogram.", buckets=(1.0,), registry=registry)
+
+        def work():
+            counter.inc()
+            histogram.observe(0.5)
+
+        for _ in range(3):
+            threads = [threading.Thread(target=work) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(counter._shards.all()), 1)
+        self.assertEqual(counter.values(), {(): 12})
+        self.assertEqual(histogram.values(), {(): [12, 0, 6.0, 12]})
+
+    @override_settings(METRICS={"ENABLED": True, "TOKEN": "secret"})
+    def test_metrics_token_required(self):
+        """
+        Test that the exposition endpoint checks the configured token.
+        """
+        self.client.credentials()
+        self.assertEqual(self.client.get("/api/metrics/").status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer secrét")
+        self.assertEqual(self.client.get("/api/metrics/").status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer secret")
+        with mock.patch("api.views.hmac.compare_digest", wraps=hmac.compare_digest) as compare:
+            self.assertEqual(self.client.get("/api/metrics/").status_code, status.HTTP_200_OK)
+        compare.assert_called_once_with(b"Bearer secret", b"Bearer secret")
+
+    def test_metrics_require_staff_without_token(self):
+        """
+        Test that without a token only staff users are served, unless the metrics are public.
+        """
+        self.assertEqual(self.client.get("/api/metrics/").status_code, status.HTTP_403_FORBIDDEN)
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer invalid")
+        self.assertEqual(self.client.get("/api/metrics/").status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.assertEqual(self.client.get("/api/metrics/").status_code, status.HTTP_200_OK)
+
+        self.client.credentials()
+        with override_settings(METRICS={"ENABLED": True, "PUBLIC": True}):
+            self.assertEqual(self.client.get("/api/metrics/").status_code, status.HTTP_200_OK)
+
+
+class ProfilingAPITestCase(APITestCase):
+    """
+    Test case for request profiling and profile downloads.
+    """
+
+    def setUp(self):
+        """
+        Prepares a staff user, a profile directory and profiling settings with a token.
+        """
+        self.user = User.objects.create_user(username="admin", password="testpass", is_staff=True)
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        self.system = HydroponicSystem.objects.create(name="Test System", owner=self.user)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(PROFILING={
+            "SAMPLE_RATE": 0.0, "TOKEN": "secret", "INTERVAL": 0.001, "DIRECTORY": directory.name,
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_request_without_token_is_not_profiled(self):
+        """
+        Test that requests are not profiled when sampling is off.
+        """
+        response = self.client.get("/api/systems/")
+        self.assertNotIn("X-Profile-Id", response)
+
+    def test_profile_is_captured_and_downloadable(self):
+        """
+        Test that a request with the profiling token stores a downloadable profile with its SQL.
+        """
+        response = self.client.get(
+            f"/api/systems/{self.system.id}/", HTTP_X_PROFILE_TOKEN="secret")
+        profile_id = response["X-Profile-Id"]
+
+        listing = self.client.get("/api/profiles/")
+        self.assertEqual(listing.status_code, status.HTTP_200_OK)
+        self.assertEqual(listing.data[0]["id"], profile_id)
+        self.assertGreater(listing.data[0]["query_count"], 0)
+
+        download = self.client.get(f"/api/profiles/{profile_id}/")
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        self.assertIn("attachment", download["Content-Disposition"])
+
+        details = self.client.get(f"/api/profiles/{profile_id}/?format=json")
+        self.assertIn("SELECT", b"".join(details.streaming_content).decode())
+
+    def test_profiles_require_staff(self):
+        """
+        Test that non-staff users cannot access profiles.
+        """
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/profiles/").status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SyntheticDataTestCase(APITestCase):
+    """
+    Test case for the synthetic data generator and load test reporting.
+    """
+
+    def test_generate_data_command(self):
+        """
+        Test that the command creates users, systems and readings within realistic ranges.
+        """
+        call_command("generate_data", users=2, systems_per_user=2, measurements=50,
+                     prefix="sim", seed=1, stdout=open(os.devnull, "w"))
+
+        self.assertEqual(User.objects.filter(username__startswith="sim_").count(), 2)
+        self.assertEqual(HydroponicSystem.objects.count(), 4)
+        self.assertEqual(Measurement.objects.count(), 200)
+        self.assertFalse(Measurement.objects.filter(ph__lt=5).exists())
+        self.assertFalse(Measurement.objects.filter(ph__gt=8).exists())
+
+        system = HydroponicSystem.objects.first()
+        timestamps = list(system.measurements.values_list("timestamp", flat=True))
+        self.assertEqual(len(set(timestamps)), 50)
+
+    def test_loadtest_reports_failed_login(self):
+        """
+        Test that the load test stops with an error when a user cannot log in.
+        """
+        with mock.patch.object(loadtest.Session, "request", return_value=(401, None)):
+            with self.assertRaisesMessage(CommandError, "Cannot log in as 'loadtest_0': status 401."):
+                call_command("loadtest", users=1, stdout=open(os.devnull, "w"))
+
+    def test_summarize_reports_percentiles(self):
+        """
+        Test that the load test summary computes throughput, errors and percentiles.
+        """
+        samples = [("read", 200, n / 1000) for n in range(1, 101)]
+        samples += [("ingest", 201, 0.01), ("ingest", 429, 0.001), ("ingest", 400, 0.001), ("ingest", None, 1.0)]
+
+        report = loadtest.summarize(samples, elapsed=10)
+
+        self.assertEqual(report["read"]["requests"], 100)
+        self.assertEqual(report["read"]["throughput"], 10)
+        self.assertEqual(report["read"]["p50"], 50)
+        self.assertEqual(report["read"]["p99"], 99)
+        self.assertEqual(report["ingest"]["requests"], 4)
+        self.assertEqual(report["ingest"]["throughput"], 0.1)
+        self.assertEqual(report["ingest"]["errors"], 3)
+        self.assertEqual(report["ingest"]["throttled"], 1)
+
+
+class IngestQueueAPITestCase(APITestCase):
+    """
+    Test case for write-behind ingestion through the local queue.
+    """
+
+    def setUp(self):
+        """
+        Prepares an authenticated user with a system and enables the queue in a temporary directory.
+        """
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        self.system = HydroponicSystem.objects.create(name="Test System", owner=self.user)
+        self.m_url = f"/api/systems/{self.system.id}/measurements/"
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(INGEST_QUEUE={
+            "ENABLED": True, "PATH": os.path.join(directory.name, "queue.sqlite3"), "MAX_ROWS": 2,
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.queue = ingest_queue.get_queue()
+
+    def test_reading_is_acknowledged_then_drained(self):
+        """
+        Test that a reading is queued with 202 and inserted with its acceptance time by the worker.
+        """
+        data = {"ph": 7.0, "temperature": 24.0, "tds": 850}
+        response = self.client.post(self.m_url, data, format="json")
+        accepted_before = timezone.now()
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(Measurement.objects.count(), 0)
+        self.assertEqual(self.queue.pending(), 1)
+
+        self.assertEqual(self.queue.drain(), 1)
+        measurement = Measurement.objects.get()
+        self.assertEqual(measurement.ph, 7.0)
+        self.assertLess(measurement.timestamp, accepted_before)
+        self.assertEqual(self.queue.pending(), 0)
+
+    def test_invalid_reading_is_rejected(self):
+        """
+        Test that readings are validated before they are acknowledged.
+        """
+        response = self.client.post(self.m_url, {"ph": "acid"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.queue.pending(), 0)
+
+    def test_full_queue_applies_backpressure(self):
+        """
+        Test that a full queue responds with 503 and Retry-After.
+        """
+        data = {"ph": 7.0, "temperature": 24.0, "tds": 850}
+        for _ in range(2):
+            self.client.post(self.m_url, data, format="json")
+
+        response = self.client.post(self.m_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn("Retry-After", response)
+
+    def test_redelivered_batch_is_skipped(self):
+        """
+        Test that a batch applied before a crash is not inserted twice.
+        """
+        reading = {"ph": 6.5, "temperature": 21.0, "tds": 800, "timestamp": "2025-01-01T00:00:00+00:00"}
+        batch_id = self.queue.enqueue(self.system.id, [reading])
+        IngestBatch.objects.create(batch_id=batch_id, system=self.system, rows=1)
+
+        self.assertEqual(self.queue.drain(), 0)
+        self.assertEqual(Measurement.objects.count(), 0)
+        self.assertEqual(self.queue.pending(), 0)
+
+    def test_queued_update_overwrites_stored_reading(self):
+        """
+        Test that `on_conflict=update` is kept in the queue and applied after plain readings.
+        """
+        data = {"ph": 6.5, "temperature": 21.0, "tds": 800, "timestamp": "2025-01-01T00:00:00+00:00"}
+        response = self.client.post(f"{self.m_url}?on_conflict=update", {**data, "ph": 7.5}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.client.post(self.m_url, data, format="json")
+
+        self.assertEqual(self.queue.drain(), 2)
+        self.assertEqual(Measurement.objects.get().ph, 7.5)
+
+    def test_failing_batch_is_quarantined(self):
+        """
+        Test that a malformed batch is retried, then quarantined without holding back other batches.
+        """
+        queue = ingest_queue.IngestQueue(self.queue.path, max_attempts=2)
+        queue.enqueue(self.system.id, [{"ph": 6.5, "temperature": 21.0}])
+        queue.enqueue(self.system.id, [{"ph": 6.5, "temperature": 21.0, "tds": 800,
+                                        "timestamp": "2025-01-01T00:00:00+00:00"}])
+
+        with self.assertLogs("api.ingest_queue", "WARNING"):
+            self.assertEqual(queue.drain(), 1)
+        self.assertEqual((queue.pending(), queue.quarantined()), (1, 0))
+        with self.assertLogs("api.ingest_queue", "ERROR"):
+            self.assertEqual(queue.drain(), 0)
+        self.assertEqual((queue.pending(), queue.quarantined()), (0, 1))
+        self.assertEqual(Measurement.objects.count(), 1)
+
+    def test_worker_survives_database_errors(self):
+        """
+        Test that the worker logs a failed round and keeps draining.
+        """
+        self.queue.enqueue(self.system.id, [{"ph": 6.5, "temperature": 21.0, "tds": 800,
+                                             "timestamp": "2025-01-01T00:00:00+00:00"}])
+        stop = threading.Event()
+        drain = self.queue.drain
+        rounds = []
+
+        def flaky_drain(max_rows):
+            rounds.append(max_rows)
+            if len(rounds) == 1:
+                raise OperationalError("server closed the connection unexpectedly")
+            stop.set()
+            return drain(max_rows)
+
+        # closing connections would end the test transaction
+        with mock.patch("api.ingest_queue.close_old_connections"):
+            with mock.patch.object(self.queue, "drain", flaky_drain):
+                with self.assertLogs("api.ingest_queue", "ERROR"):
+                    self.queue.run(interval=0.01, stop=stop)
+        self.assertEqual(len(rounds), 2)
+        self.assertEqual(Measurement.objects.count(), 1)
+
+    def test_worker_drains_past_rounds_writing_nothing(self):
+        """
+        Test that `--once` keeps draining after a round of already applied batches.
+        """
+        readings = [{"ph": 6.5, "temperature": 21.0, "tds": 800, "timestamp": f"2025-01-01T00:0{n}:00+00:00"}
+                    for n in range(2)]
+        batch_id = self.queue.enqueue(self.system.id, readings[:1])
+        IngestBatch.objects.create(batch_id=batch_id, system=self.system, rows=1)
+        self.queue.enqueue(self.system.id, readings[1:])
+
+        with override_settings(INGEST_QUEUE={**settings.INGEST_QUEUE, "BATCH_SIZE": 1}):
+            call_command("run_ingest_worker", once=True, stdout=open(os.devnull, "w"))
+        self.assertEqual(self.queue.pending(), 0)
+        self.assertEqual(Measurement.objects.count(), 1)
+
+
+class CompactStorageTestCase(APITestCase):
+    """
+    Test case for the fixed-point measurement storage.
+    """
+
+    def setUp(self):
+        """
+        Creates a user with a hydroponic system and authenticates them.
+        """
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.system = HydroponicSystem.objects.create(name="Test System", owner=self.user)
+        self.m_url = f"/api/systems/{self.system.id}/measurements/"
+
+    def test_values_are_stored_as_scaled_integers(self):
+        """
+        Test that values are rounded to 2 decimal places and stored as integers.
+        """
+        measurement = Measurement.objects.create(
+            system=self.system, ph=6.537, temperature=-1.5, tds=900)
+        measurement.refresh_from_db()
+        self.assertEqual((measurement.ph, measurement.temperature), (6.54, -1.5))
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT ph, temperature FROM {Measurement._meta.db_table} WHERE id = %s",
+                [measurement.pk])
+            self.assertEqual(cursor.fetchone(), (654, -150))
+
+    def test_filters_and_aggregates_use_float_values(self):
+        """
+        Test that lookups and aggregates compare and return unscaled values.
+        """
+        for ph in (6.0, 6.5, 7.0):
+            Measurement.objects.create(
+                system=self.system, ph=ph, temperature=20, tds=800,
+                timestamp=timezone.now() - timedelta(minutes=ph * 10))
+
+        self.assertEqual(Measurement.objects.filter(ph__gte=6.5).count(), 2)
+        self.assertEqual(Measurement.objects.aggregate(avg=models.Avg("ph"))["avg"], 6.5)
+
+        response = self.client.get(self.m_url, {"ph_min": 6.2, "ordering": "ph"})
+        self.assertEqual([m["ph"] for m in response.data["results"]], [6.5, 7.0])
+
+    def test_out_of_range_values_are_rejected(self):
+        """
+        Test that values which do not fit the storage are rejected by the API.
+        """
+        response = self.client.post(
+            self.m_url, {"ph": 7.0, "temperature": 400, "tds": 800}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("temperature", response.data)
+
+        response = self.client.post(
+            self.m_url, {"ph": 7.0, "temperature": 20, "tds": -1}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_range_boundaries(self):
+        """
+        Test that the largest storable values are accepted and the next ones rejected with a message.
+        """
+        response = self.client.post(
+            self.m_url, {"ph": 7.0, "temperature": 327.67, "tds": 32767}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post(
+            self.m_url, {"ph": 7.0, "temperature": 20, "tds": 32768}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [str(error) for error in response.data["tds"]],
+            ["Ensure this value is less than or equal to 32767."])
+
+        response = self.client.post(
+            self.m_url, {"ph": 7.0, "temperature": 327.68, "tds": 800}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [str(error) for error in response.data["temperature"]],
+            ["Ensure this value is less than or equal to 327.67."])
+
+    def test_storage_estimate(self):
+        """
+        Test that the compact layout takes fewer bytes per row than the legacy one.
+        """
+        report = storage.estimate()
+        self.assertEqual(report["legacy"]["heap"], 76)
+        self.assertEqual(report["current"]["heap"], 60)
+        self.assertLess(report["current"]["total"], report["legacy"]["total"])
+
+
+class DownsamplingTestCase(SimpleTestCase):
+    """
+    Test case for the chart downsampling algorithms.
+    """
+
+    def setUp(self):
+        self.x = np.arange(10_000, dtype=np.float64)
+        self.y = np.sin(self.x / 500)
+        self.y[4321] = 50
+        self.y[7777] = -50
+
+    def test_lttb_keeps_peaks(self):
+        """
+        Test that LTTB returns the requested number of points, including the end points and spikes.
+        """
+        indices = downsampling.lttb(self.x, self.y, 100)
+        self.assertEqual(len(indices), 100)
+        self.assertEqual((indices[0], indices[-1]), (0, 9999))
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertIn(4321, indices)
+        self.assertIn(7777, indices)
+
+    def test_minmax_keeps_extremes(self):
+        """
+        Test that min/max buckets keep the extremes of every bucket.
+        """
+        indices = downsampling.minmax(self.x, self.y, 100)
+        self.assertLessEqual(len(indices), 100)
+        self.assertIn(4321, indices)
+        self.assertIn(7777, indices)
+
+    def test_short_series_is_returned_unchanged(self):
+        """
+        Test that series shorter than the threshold are not reduced.
+        """
+        indices = downsampling.lttb(self.x[:50], self.y[:50], 100)
+        self.assertEqual(list(indices), list(range(50)))
+
+
+class MeasurementChartAPITestCase(APITestCase):
+    """
+    Test case for the measurement chart endpoint.
+    """
+
+    def setUp(self):
+        """
+        Creates a system with 1000 readings taken every minute and authenticates its owner.
+        """
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.system = HydroponicSystem.objects.create(name="Test System", owner=self.user)
+        self.start = timezone.now() - timedelta(minutes=1000)
+        Measurement.objects.bulk_create(
+            Measurement(system=self.system, ph=6.0 + (n % 10) / 10, temperature=20, tds=800,
+                        timestamp=self.start + timedelta(minutes=n))
+            for n in range(1000)
+        )
+        Measurement.objects.filter(timestamp=self.start + timedelta(minutes=500)).update(ph=9.5)
+        self.url = f"/api/systems/{self.system.id}/measurements/chart/"
+
+    def test_chart_is_downsampled(self):
+        """
+        Test that every series is reduced to the requested number of points and keeps spikes.
+        """
+        response = self.client.get(self.url, {"points": 100, "fields": "ph,tds"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], 1000)
+        self.assertEqual(set(response.data["series"]), {"ph", "tds"})
+        ph = response.data["series"]["ph"]
+        self.assertEqual(len(ph), 100)
+        self.assertIn(9.5, [value for _, value in ph])
+        self.assertEqual(ph[0][0], int(round(self.start.timestamp() * 1000)))
+
+    def test_chart_respects_time_range(self):
+        """
+        Test that `MeasurementFilter` time ranges limit the charted readings.
+        """
+        after = (self.start + timedelta(minutes=900)).isoformat()
+        response = self.client.get(
+            self.url, {"timestamp_after": after, "method": "minmax", "points": 500})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], 100)
+        self.assertEqual(len(response.data["series"]["temperature"]), 100)
+
+    def test_invalid_parameters(self):
+        """
+        Test that invalid chart parameters are rejected.
+        """
+        for params in ({"points": 1}, {"points": "many"}, {"method": "average"},
+                       {"fields": "ph,humidity"}, {"timestamp_after": "yesterday"}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_chart_of_other_users_system(self):
+        """
+        Test that charts of systems owned by other users are not found.
+        """
+        other = User.objects.create_user(username="other", password="testpass")
+        system = HydroponicSystem.objects.create(name="Other System", owner=other)
+        response = self.client.get(f"/api/systems/{system.id}/measurements/chart/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ResamplingTestCase(SimpleTestCase):
+    """
+    Test case for the gap filling strategies of resampled series.
+    """
+
+    def setUp(self):
+        self.values = np.array([np.nan, 1.0, np.nan, np.nan, 4.0, np.nan, np.nan, np.nan, np.nan])
+
+    def assertSeries(self, values, expected):
+        self.assertEqual([None if np.isnan(value) else value for value in values], expected)
+
+    def test_locf(self):
+        """
+        Test that the last observation is carried forward, up to `limit` points.
+        """
+        self.assertSeries(resampling.fill(self.values, "locf"), [None, 1, 1, 1, 4, 4, 4, 4, 4])
+        self.assertSeries(resampling.fill(self.values, "locf", limit=1), [None, 1, 1, None, 4, 4, None, None, None])
+
+    def test_linear(self):
+        """
+        Test that gaps between observations are interpolated and the ends are left empty.
+        """
+        self.assertSeries(resampling.fill(self.values, "linear"), [None, 1, 2, 3, 4, None, None, None, None])
+        self.assertSeries(resampling.fill(self.values, "linear", limit=1), [None, 1, None, None, 4] + [None] * 4)
+
+    def test_null(self):
+        """
+        Test that gaps are left empty without a fill strategy.
+        """
+        self.assertSeries(resampling.fill(self.values, "null"), [None, 1, None, None, 4] + [None] * 4)
+
+
+class ResampleAPITestCase(APITestCase):
+    """
+    Test case for the resample endpoint aligning systems on a regular grid.
+    """
+
+    def setUp(self):
+        """
+        Creates two systems with readings at irregular times around a 5 minute grid
+        and authenticates their owner.
+        """
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.first = HydroponicSystem.objects.create(name="First System", owner=self.user)
+        self.second = HydroponicSystem.objects.create(name="Second System", owner=self.user)
+        self.start = timezone.now().replace(second=0, microsecond=0) - timedelta(days=1)
+        self.start -= timedelta(minutes=self.start.minute % 5)
+        Measurement.objects.bulk_create([
+            Measurement(system=self.first, ph=6.0, temperature=20, tds=800,
+                        timestamp=self.start + timedelta(minutes=1)),
+            Measurement(system=self.first, ph=7.0, temperature=22, tds=900,
+                        timestamp=self.start + timedelta(minutes=3, seconds=30)),
+            Measurement(system=self.first, ph=8.0, temperature=24, tds=1000,
+                        timestamp=self.start + timedelta(minutes=17)),
+            Measurement(system=self.second, ph=5.5, temperature=18, tds=700,
+                        timestamp=self.start + timedelta(minutes=6)),
+        ])
+        self.params = {
+            "systems": f"{self.first.id},{self.second.id}",
+            "start": self.start.isoformat(),
+            "end": (self.start + timedelta(minutes=25)).isoformat(),
+            "interval": 300,
+        }
+
+    def test_systems_are_aligned(self):
+        """
+        Test that readings are averaged per grid point and gaps are carried forward by default.
+        """
+        response = self.client.get("/api/measurements/resample/", self.params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timestamps = response.data["timestamps"]
+        self.assertEqual(len(timestamps), 5)
+        self.assertEqual(timestamps[0], int(self.start.timestamp() * 1000))
+        self.assertEqual(timestamps[1] - timestamps[0], 300_000)
+
+        first, second = response.data["systems"]
+        self.assertEqual((first["id"], first["readings"]), (self.first.id, 3))
+        self.assertEqual(first["series"]["ph"], [6.5, 6.5, 6.5, 8.0, 8.0])
+        self.assertEqual(first["series"]["tds"], [850, 850, 850, 1000, 1000])
+        self.assertEqual(second["series"]["temperature"], [None, 18.0, 18.0, 18.0, 18.0])
+
+    def test_fill_strategies(self):
+        """
+        Test linear interpolation and empty gaps of the requested fields.
+        """
+        response = self.client.get(
+            "/api/measurements/resample/", {**self.params, "fill": "linear", "fields": "ph"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data["systems"][0]["series"]), {"ph"})
+        self.assertEqual(response.data["systems"][0]["series"]["ph"], [6.5, 7.0, 7.5, 8.0, None])
+
+        response = self.client.get("/api/measurements/resample/", {**self.params, "fill": "null"})
+        self.assertEqual(response.data["systems"][0]["series"]["ph"], [6.5, None, None, 8.0, None])
+
+    def test_archived_readings_are_resampled(self):
+        """
+        Test that readings moved to the cold storage tier are included.
+        """
+        Measurement.objects.filter(system=self.first).update(
+            timestamp=models.F("timestamp") - timedelta(days=100))
+        archive.archive_older_than(days=90)
+        params = {
+            **self.params,
+            "start": (self.start - timedelta(days=100)).isoformat(),
+            "end": (self.start - timedelta(days=100) + timedelta(minutes=25)).isoformat(),
+        }
+        response = self.client.get("/api/measurements/resample/", params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["systems"][0]["readings"], 3)
+        self.assertEqual(response.data["systems"][0]["series"]["ph"], [6.5, 6.5, 6.5, 8.0, 8.0])
+        self.assertEqual(response.data["systems"][1]["series"]["ph"], [None] * 5)
+
+    def test_invalid_parameters(self):
+        """
+        Test that invalid parameters and systems of other users are rejected.
+        """
+        too_many_points = {"interval": 1, "end": (self.start + timedelta(days=1)).isoformat()}
+        for params in ({"systems": "one"}, {"fill": "spline"}, {"interval": 0}, {"fields": "humidity"},
+                       {"end": self.params["start"]}, too_many_points):
+            response = self.client.get("/api/measurements/resample/", {**self.params, **params})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+        other = User.objects.create_user(username="other", password="testpass")
+        system = HydroponicSystem.objects.create(name="Other System", owner=other)
+        response = self.client.get(
+            "/api/measurements/resample/", {**self.params, "systems": f"{self.first.id},{system.id}"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AnalyticsTestCase(SimpleTestCase):
+    """
+    Test case for the fleet comparison statistics.
+    """
+
+    def test_local_memory_cache_fails_the_checks(self):
+        """
+        Test that forecasts and analytics cached per process are reported by the system checks.
+        """
+        self.assertEqual(caching.check_shared_caches(), [])
+        with override_settings(ANALYTICS={**settings.ANALYTICS, "CACHE": "default"}):
+            self.assertEqual([error.id for error in caching.check_shared_caches()], ["api.E001"])
+
+    def test_correlation_of_incomplete_series(self):
+        """
+        Test that correlations use the points observed in both series and match NumPy.
+        """
+        rng = np.random.default_rng(7)
+        matrix = rng.normal(size=(4, 50))
+        matrix[1] = matrix[0] * 2 + 1
+        matrix[2] = -matrix[0]
+        matrix[3, 10:] = np.nan
+        result = analytics.correlation(matrix)
+        self.assertAlmostEqual(result[0, 1], 1.0)
+        self.assertAlmostEqual(result[0, 2], -1.0)
+        self.assertAlmostEqual(result[0, 3], np.corrcoef(matrix[0, :10], matrix[3, :10])[0, 1])
+        self.assertTrue(np.allclose(result, result.T, equal_nan=True))
+        self.assertTrue(np.isnan(analytics.correlation(matrix, min_overlap=20)[0, 3]))
+
+    def test_deviation_flags_diverging_system(self):
+        """
+        Test that a system far from the others gets the highest deviation score.
+        """
+        rng = np.random.default_rng(7)
+        matrix = 6.0 + rng.normal(scale=0.05, size=(6, 100))
+        matrix[4] += 1.0
+        matrix[2, :50] = np.nan
+        offsets, scores = analytics.deviation(matrix)
+        self.assertEqual(int(np.argmax(scores)), 4)
+        self.assertGreater(scores[4], 10)
+        self.assertAlmostEqual(offsets[4], 1.0, delta=0.05)
+        self.assertTrue(np.all(scores[[0, 1, 2, 3, 5]] < 3))
+
+    def test_bands(self):
+        """
+        Test that bands are computed over the systems observed at every point.
+        """
+        matrix = np.array([[1.0, np.nan], [2.0, np.nan], [3.0, 5.0]])
+        result = analytics.bands(matrix)
+        self.assertEqual(list(result["p50"][:1]), [2.0])
+        self.assertEqual(list(result["mean"]), [2.0, 5.0])
+
+
+@override_settings(CACHES={**settings.CACHES, "shared": {
+    "BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "analytics-tests"}})
+class AnalyticsAPITestCase(APITestCase):
+    """
+    Test case for the fleet analytics endpoint.
+    """
+
+    def setUp(self):
+        """
+        Creates three systems with pH readings every 5 minutes over the last two hours,
+        the third one drifting away from the others, and authenticates their owner.
+        """
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.systems = [
+            HydroponicSystem.objects.create(name=f"System {n}", owner=self.user) for n in range(3)]
+        self.end = timezone.now().replace(second=0, microsecond=0)
+        self.end -= timedelta(minutes=self.end.minute % 5)
+        readings = []
+        for n in range(24):
+            timestamp = self.end - timedelta(minutes=5 * (24 - n))
+            readings += [
+                Measurement(system=self.systems[0], ph=6 + n / 100, temperature=20, tds=800, timestamp=timestamp),
+                Measurement(system=self.systems[1], ph=6.1 + n / 100, temperature=20, tds=800, timestamp=timestamp),
+                Measurement(system=self.systems[2], ph=6 + n / 10, temperature=20, tds=800, timestamp=timestamp),
+            ]
+        Measurement.objects.bulk_create(readings)
+        self.params = {"window": 2, "end": self.end.isoformat()}
+        analytics.get_cache().clear()
+
+    def test_fleet_comparison(self):
+        """
+        Test that correlations, bands and deviation scores are returned for all systems of the user.
+        """
+        other = User.objects.create_user(username="other", password="testpass")
+        HydroponicSystem.objects.create(name="Other System", owner=other)
+        response = self.client.get("/api/analytics/", self.params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["systems"], [system.id for system in self.systems])
+        self.assertEqual(len(response.data["timestamps"]), 24)
+        self.assertEqual(response.data["readings"], [24, 24, 24])
+
+        ph = response.data["fields"]["ph"]
+        self.assertAlmostEqual(ph["correlation"][0][1], 1.0)
+        self.assertEqual((ph["bands"]["p50"][0], ph["bands"]["p50"][-1]), (6.0, 6.33))
+        self.assertEqual(len(ph["bands"]["p95"]), 24)
+        self.assertEqual([item["id"] for item in ph["deviation"]], response.data["systems"])
+
+    def test_results_are_cached_until_measurements_change(self):
+        """
+        Test that repeated requests do not read measurements until one of the systems changes.
+        """
+        self.client.get("/api/analytics/", self.params)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/analytics/", self.params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in queries if "api_measurement" in query["sql"]])
+
+        signals.measurements_changed.send(
+            sender=Measurement, system_ids=[self.systems[1].id], kind="create")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/analytics/", self.params)
+        self.assertTrue([query for query in queries if "api_measurement" in query["sql"]])
+
+    def test_selected_systems(self):
+        """
+        Test that `systems` restricts the comparison and other users' systems are not found.
+        """
+        selected = f"{self.systems[2].id},{self.systems[0].id}"
+        response = self.client.get("/api/analytics/", {**self.params, "systems": selected})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["systems"], [self.systems[2].id, self.systems[0].id])
+
+        other = User.objects.create_user(username="other", password="testpass")
+        system = HydroponicSystem.objects.create(name="Other System", owner=other)
+        response = self.client.get(
+            "/api/analytics/", {**self.params, "systems": f"{self.systems[0].id},{system.id}"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get("/api/analytics/", {**self.params, "systems": str(self.systems[0].id)})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get("/api/analytics/", {**self.params, "window": 720, "interval": 60})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(DELETION={"CHUNK_SIZE": 7, "RUN_IN_THREAD": False})
+class DeletionAPITestCase(APITestCase):
+    """
+    Test case for chunked and background deletion of systems and users.
+    """
+
+    def setUp(self):
+        """
+        Creates a user owning two systems with 20 readings each and authenticates them.
+        """
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.systems = [
+            HydroponicSystem.objects.create(name=f"System {n}", owner=self.user) for n in range(2)
+        ]
+        start = timezone.now() - timedelta(hours=1)
+        Measurement.objects.bulk_create(
+            Measurement(system=system, ph=6.5, temperature=21, tds=800,
+                        timestamp=start + timedelta(minutes=n))
+            for system in self.systems
+            for n in range(20)
+        )
+
+    def test_delete_measurements_in_chunks(self):
+        """
+        Test that measurements are deleted in chunks of the configured size.
+        """
+        chunks = []
+        deleted = deletion.delete_measurements([self.systems[0].id], progress=chunks.append)
+        self.assertEqual(deleted, 20)
+        self.assertEqual(chunks, [7, 7, 6])
+        self.assertEqual(Measurement.objects.filter(system=self.systems[1]).count(), 20)
+
+    def test_delete_system_synchronously(self):
+        """
+        Test that deleting a system removes only its measurements.
+        """
+        response = self.client.delete(f"/api/systems/{self.systems[0].id}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(HydroponicSystem.objects.filter(id=self.systems[0].id).exists())
+        self.assertEqual(Measurement.objects.count(), 20)
+
+    def test_delete_system_in_background(self):
+        """
+        Test that an asynchronous deletion returns a job whose status reports progress.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"/api/systems/{self.systems[0].id}/?async=true")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(response.data["status_url"].endswith(f"/api/deletions/{response.data['job_id']}/"))
+
+        response = self.client.get(f"/api/deletions/{response.data['job_id']}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "done")
+        self.assertEqual(response.data["deleted_rows"], 21)
+        self.assertFalse(HydroponicSystem.objects.filter(id=self.systems[0].id).exists())
+
+    def test_interrupted_job_is_resumed(self):
+        """
+        Test that jobs left pending are run by `run_deletion_jobs`.
+        """
+        job = DeletionJob.objects.create(
+            target=DeletionJob.Target.SYSTEM, target_id=self.systems[1].id,
+            requested_by=self.user, status=DeletionJob.Status.RUNNING)
+        call_command("run_deletion_jobs", stdout=open(os.devnull, "w"))
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.Status.DONE)
+        self.assertEqual(Measurement.objects.filter(system=self.systems[1]).count(), 0)
+
+    def test_delete_user_cascades_through_systems(self):
+        """
+        Test that deleting a user removes their systems and measurements.
+        """
+        response = self.client.delete(f"/api/users/{self.user.id}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(User.objects.filter(id=self.user.id).exists())
+        self.assertEqual(HydroponicSystem.objects.count(), 0)
+        self.assertEqual(Measurement.objects.count(), 0)
+
+    def test_delete_other_user_is_forbidden(self):
+        """
+        Test that users cannot delete other accounts or see their deletion jobs.
+        """
+        other = User.objects.create_user(username="other", password="testpass")
+        response = self.client.delete(f"/api/users/{other.id}/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        job = DeletionJob.objects.create(
+            target=DeletionJob.Target.USER, target_id=other.id, requested_by=other)
+        response = self.client.get(f"/api/deletions/{job.id}/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MeasurementBulkAPITestCase(APITestCase):
+    """
+    Test case for filter-driven bulk updates and deletes of measurements.
+    """
+
+    def setUp(self):
+        """
+        Creates a system with 10 hourly readings and authenticates its owner.
+        """
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.system = HydroponicSystem.objects.create(name="Test System", owner=self.user)
+        self.other = HydroponicSystem.objects.create(name="Other System", owner=self.user)
+        self.start = timezone.now().replace(microsecond=0) - timedelta(hours=10)
+        Measurement.objects.bulk_create(
+            Measurement(system=system, ph=6.5, temperature=21, tds=800 + 50 * n,
+                        timestamp=self.start + timedelta(hours=n))
+            for system in (self.system, self.other)
+            for n in range(10)
+        )
+        self.url = f"/api/systems/{self.system.id}/measurements/bulk/"
+        self.changes = []
+        signals.measurements_changed.connect(self.record_change)
+        self.addCleanup(signals.measurements_changed.disconnect, self.record_change)
+
+    def record_change(self, sender, system_ids, kind, **kwargs):
+        self.changes.append((system_ids, kind))
+
+    def test_offset_values_in_time_range(self):
+        """
+        Test that an offset is applied in one statement to readings in the time range only.
+        """
+        before = urlencode({"timestamp_before": (self.start + timedelta(hours=4)).isoformat()})
+        with self.captureOnCommitCallbacks(execute=True):
+            # user, system, savepoint, change log INSERT ... SELECT, UPDATE, release
+            with self.assertNumQueries(6):
+                response = self.client.patch(
+                    f"{self.url}?{before}",
+                    {"offset": {"ph": -0.2}, "set": {"temperature": 20.5}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"updated": 5})
+        values = Measurement.objects.filter(system=self.system).values_list("ph", "temperature")
+        self.assertEqual(sorted(values), [(6.3, 20.5)] * 5 + [(6.5, 21.0)] * 5)
+        self.assertFalse(Measurement.objects.filter(system=self.other).exclude(ph=6.5).exists())
+        self.assertEqual(self.changes, [([self.system.id], "update")])
+
+    def test_delete_by_value_filter(self):
+        """
+        Test that readings matching a value filter are deleted and counted.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"{self.url}?tds_min=1101")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"deleted": 3})
+        self.assertEqual(Measurement.objects.filter(system=self.system).count(), 7)
+        self.assertEqual(Measurement.objects.filter(system=self.other).count(), 10)
+        self.assertEqual(self.changes, [([self.system.id], "delete")])
+
+    def test_filter_is_required(self):
+        """
+        Test that bulk operations without filters require `all=true`.
+        """
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.delete(f"{self.url}?all=true")
+        self.assertEqual(response.data, {"deleted": 10})
+
+    def test_invalid_updates(self):
+        """
+        Test that unknown fields, invalid values and out of range results are rejected.
+        """
+        for body in ({}, {"set": {"humidity": 1}}, {"set": {"ph": 500}},
+                     {"offset": {"tds": 0.5}}, {"set": {"ph": 6}, "offset": {"ph": 1}}):
+            response = self.client.patch(f"{self.url}?all=true", body, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+
+        response = self.client.patch(
+            f"{self.url}?all=true", {"offset": {"tds": -900}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Measurement.objects.filter(system=self.system, tds__lt=800).exists())
+
+
+class UserDirectoryAPITestCase(APITestCase):
+    """
+    Test case for the paginated user directory.
+    """
+
+    def setUp(self):
+        """
+        Creates users and authenticates one of them.
+        """
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        User.objects.bulk_create(
+            [User(username=f"grower_{n:02d}") for n in range(12)]
+            + [User(username=f"farmer_{n}") for n in range(3)]
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def test_users_are_paginated_by_keyset(self):
+        """
+        Test that following `next` links returns every user once, ordered by username.
+        """
+        usernames = []
+        url = "/api/users/?page_size=4"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 4)
+            usernames += [user["username"] for user in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(usernames, sorted(User.objects.values_list("username", flat=True)))
+
+    def test_search_by_username_prefix(self):
+        """
+        Test that `search` matches the beginning of usernames.
+        """
+        response = self.client.get("/api/users/", {"search": "grower_0"})
+        self.assertEqual(
+            [user["username"] for user in response.data["results"]],
+            [f"grower_0{n}" for n in range(10)],
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "pattern indexes are PostgreSQL only")
+    def test_prefix_search_uses_like_index(self):
+        """
+        Test that the prefix search is served by the `_like` index of the unique username.
+        """
+        with connection.cursor() as cursor:
+            # the table is tiny, a sequential scan would win otherwise
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = User.objects.filter(username__startswith="grower_0").explain()
+        self.assertRegex(plan, r"api_user_username_\w+_like")
+
+    def test_listing_does_not_load_passwords(self):
+        """
+        Test that only the serialized columns are selected.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/users/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        listing = queries.captured_queries[-1]["sql"]
+        self.assertIn('"username"', listing)
+        self.assertNotIn('"password"', listing)
+
+
+class SystemSearchAPITestCase(APITestCase):
+    """
+    Test case for searching hydroponic systems by name.
+    """
+
+    def setUp(self):
+        """
+        Creates systems of two users and authenticates the first one.
+        """
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        other = User.objects.create_user(username="other", password="testpass")
+        for name in ("Greenhouse lettuce", "Lettuce", "Basil tower", "Old lettuce rack"):
+            HydroponicSystem.objects.create(name=name, owner=self.user)
+        HydroponicSystem.objects.create(name="Lettuce", owner=other)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def test_search_ranks_by_relevance(self):
+        """
+        Test that substring matches are returned with the exact name first.
+        """
+        response = self.client.get("/api/systems/", {"search": "lettuce"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [system["name"] for system in response.data]
+        self.assertEqual(len(names), 3)
+        self.assertEqual(names[0], "Lettuce")
+        self.assertEqual(set(names), {"Lettuce", "Greenhouse lettuce", "Old lettuce rack"})
+
+    def test_search_with_ordering(self):
+        """
+        Test that an explicit ordering overrides the relevance ranking.
+        """
+        response = self.client.get("/api/systems/", {"search": "lettuce", "ordering": "-name"})
+        self.assertEqual(
+            [system["name"] for system in response.data],
+            ["Old lettuce rack", "Lettuce", "Greenhouse lettuce"],
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "trigram indexes are PostgreSQL only")
+    def test_search_uses_trigram_index(self):
+        """
+        Test that substring and similarity matches are both served by the trigram index.
+        """
+        with connection.cursor() as cursor:
+            # the table is tiny, a sequential scan would win otherwise
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = search_systems(HydroponicSystem.objects.all(), "lettuce").explain()
+        self.assertIn("hydroponicsystem_upper_name_trgm", plan)
+        self.assertNotIn("Seq Scan", plan)
+
+
+# queries of the database cache are not counted as reads of measurements
+@override_settings(CACHES={**settings.CACHES, "shared": {
+    "BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "forecast-tests"}})
+class ForecastAPITestCase(APITestCase):
+    """
+    Test case for trend forecasts and their cached fits.
+    """
+
+    def setUp(self):
+        """
+        Creates a system whose pH rises by 0.1 per hour over 10 hours and authenticates its owner.
+        """
+        forecasting.get_cache().clear()
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.system = HydroponicSystem.objects.create(name="Test System", owner=self.user)
+        self.start = timezone.now().replace(microsecond=0) - timedelta(hours=10)
+        Measurement.objects.bulk_create(
+            Measurement(system=self.system, ph=6 + n * 0.1, temperature=21, tds=1000 - 5 * n,
+                        timestamp=self.start + timedelta(hours=n))
+            for n in range(11)
+        )
+        self.url = f"/api/systems/{self.system.id}/forecast/"
+
+    def test_linear_forecast(self):
+        """
+        Test that a linear trend is fitted and extrapolated from the latest reading.
+        """
+        response = self.client.get(self.url, {"horizon": 2, "steps": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ph = response.data["series"]["ph"]
+        self.assertEqual(ph["samples"], 11)
+        self.assertAlmostEqual(ph["trend_per_hour"], 0.1, places=3)
+        self.assertEqual([point["value"] for point in ph["forecast"]], [7.1, 7.2])
+        self.assertAlmostEqual(response.data["series"]["tds"]["trend_per_hour"], -5, places=3)
+
+    def test_cached_fit_is_reused_and_extended(self):
+        """
+        Test that repeated forecasts do not query measurements
+        and new readings are fitted incrementally.
+        """
+        self.client.get(self.url, {"fields": "ph"})
+        with self.assertNumQueries(2):  # user and system
+            self.client.get(self.url, {"fields": "ph"})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                f"/api/systems/{self.system.id}/measurements/",
+                {"ph": 7.1, "temperature": 21, "tds": 945,
+                 "timestamp": (self.start + timedelta(hours=11)).isoformat()},
+                format="json",
+            )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"fields": "ph", "horizon": 1, "steps": 1})
+        # user, system, change log entries after the fit and the new reading
+        self.assertEqual(len(queries), 4)
+        self.assertIn('"id" IN', queries.captured_queries[-1]["sql"])
+        self.assertEqual(response.data["series"]["ph"]["samples"], 12)
+        self.assertEqual(response.data["series"]["ph"]["forecast"][0]["value"], 7.2)
+
+    def test_readings_committed_late_are_fitted(self):
+        """
+        Test that a reading committed after a fit of readings with higher ids is added to the fit.
+        """
+        late, newer = Measurement.objects.bulk_create(
+            Measurement(system=self.system, ph=7.1, temperature=21, tds=945,
+                        timestamp=self.start + timedelta(hours=n)) for n in (11, 12))
+        ChangeLog.objects.log(newer, ChangeLog.Action.UPSERT)
+        readings = forecasting.Forecaster.readings
+        with mock.patch.object(forecasting.Forecaster, "readings",
+                               lambda forecaster: readings(forecaster).exclude(id=late.id)):
+            response = self.client.get(self.url, {"fields": "ph"})
+        self.assertEqual(response.data["series"]["ph"]["samples"], 12)
+
+        # the transaction of the late reading commits and logs it after the fit
+        ChangeLog.objects.log(late, ChangeLog.Action.UPSERT)
+        with self.captureOnCommitCallbacks(execute=True):
+            signals.notify_measurements_changed([self.system.id], "create")
+        response = self.client.get(self.url, {"fields": "ph"})
+        self.assertEqual(response.data["series"]["ph"]["samples"], 13)
+
+    def test_updates_trigger_refit(self):
+        """
+        Test that bulk corrections of readings are reflected in the forecast.
+        """
+        self.client.get(self.url, {"fields": "ph"})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/api/systems/{self.system.id}/measurements/bulk/?all=true",
+                              {"offset": {"ph": -1}}, format="json")
+        response = self.client.get(self.url, {"fields": "ph", "horizon": 1, "steps": 1})
+        self.assertEqual(response.data["series"]["ph"]["forecast"][0]["value"], 6.1)
+
+    def test_holt_forecast(self):
+        """
+        Test that Holt's smoothing follows a linear trend.
+        """
+        response = self.client.get(
+            self.url, {"method": "holt", "fields": "ph", "alpha": 0.8, "beta": 0.8})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertAlmostEqual(response.data["series"]["ph"]["trend_per_hour"], 0.1, places=2)
+
+    def test_invalid_parameters(self):
+        """
+        Test that invalid forecast parameters are rejected.
+        """
+        for params in ({"fields": "humidity"}, {"method": "arima"}, {"window": 0},
+                       {"steps": 1000}, {"alpha": 2}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class ArchiveAPITestCase(APITestCase):
+    """
+    Test case for the compressed cold storage tier of measurements.
+    """
+
+    def setUp(self):
+        """
+        Creates a system with 300 readings taken every minute 100 days ago
+        and 5 recent readings, and authenticates its owner.
+        """
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.system = HydroponicSystem.objects.create(name="Test System", owner=self.user)
+        self.old = timezone.now().replace(microsecond=0) - timedelta(days=100)
+        self.recent = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        Measurement.objects.bulk_create(
+            [Measurement(system=self.system, ph=6 + (n % 50) / 100, temperature=20.5, tds=800 + n,
+                         timestamp=self.old + timedelta(minutes=n)) for n in range(300)]
+            + [Measurement(system=self.system, ph=7, temperature=22, tds=900,
+                           timestamp=self.recent + timedelta(minutes=n)) for n in range(5)]
+        )
+        self.url = f"/api/systems/{self.system.id}/measurements/"
+
+    def test_encode_round_trip(self):
+        """
+        Test that blocks decode to the encoded columns and regular readings compress well.
+        """
+        count = 10_000
+        columns = {
+            "id": np.arange(1, count + 1),
+            "timestamp": 1_700_000_000_000_000 + np.arange(count) * 60_000_000,
+            "ph": 600 + np.arange(count) % 20,
+            "temperature": np.full(count, 2150),
+            "tds": 800 + np.arange(count) % 7,
+        }
+        data = archive.encode(columns)
+        decoded = archive.decode(data)
+        for name, values in columns.items():
+            np.testing.assert_array_equal(decoded[name], values)
+        self.assertLess(len(data) / count, 2)
+
+    def test_archive_moves_old_readings(self):
+        """
+        Test that readings older than the cutoff are moved into blocks of the requested size.
+        """
+        rows, size = archive.archive_older_than(days=90, block_size=128)
+        self.assertEqual(rows, 300)
+        self.assertEqual(Measurement.objects.count(), 5)
+        self.assertEqual(
+            list(MeasurementArchive.objects.values_list("count", flat=True)), [128, 128, 44])
+        self.assertEqual(archive.summary()["rows"], 300)
+
+    def test_archive_keeps_readings_written_meanwhile(self):
+        """
+        Test that a back-dated reading written after a block was read is archived by a later block
+        instead of being deleted with the first one.
+        """
+        encode = archive.encode
+        late = []
+
+        def encode_after_late_write(columns, codec="zlib"):
+            if not late:
+                late.append(Measurement.objects.create(
+                    system=self.system, ph=6, temperature=20, tds=1, timestamp=self.old + timedelta(seconds=30)))
+            return encode(columns, codec)
+
+        with mock.patch.object(archive, "encode", side_effect=encode_after_late_write):
+            archive.archive_system(self.system.id, timezone.now() - timedelta(days=90), block_size=128)
+        self.assertEqual(archive.summary()["rows"], 301)
+        self.assertEqual(Measurement.objects.count(), 5)
+        self.assertIn(1, archive.read(self.system.id)["tds"])
+
+    @skipUnless(connection.features.has_select_for_update_skip_locked, "row locks are not supported")
+    def test_archive_locks_the_readings_of_a_block(self):
+        """
+        Test that readings of a block are locked and rows locked by a concurrent run are skipped.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            archive.archive_system(self.system.id, timezone.now() - timedelta(days=90), block_size=128)
+        selects = [query["sql"] for query in queries.captured_queries if query["sql"].startswith("SELECT")]
+        self.assertTrue(any(sql.endswith("FOR UPDATE SKIP LOCKED") for sql in selects))
+
+    def test_resent_archived_readings_are_not_duplicated(self):
+        """
+        Test that readings re-sent after they were archived are skipped like stored duplicates.
+        """
+        archive.archive_older_than(days=90)
+        first = self.old.isoformat()
+        response = self.client.post(self.url, {"ph": 7.5, "temperature": 25, "tds": 5, "timestamp": first})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["tds"], 800)
+        response = self.client.post(self.url, [
+            {"ph": 7.5, "temperature": 25, "tds": 5, "timestamp": (self.old + timedelta(minutes=n)).isoformat()}
+            for n in (1, 2, 400)
+        ], format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.get(self.url).data["count"], 306)
+        self.assertEqual(Measurement.objects.filter(tds=5).count(), 1)
+
+    def test_list_merges_archived_readings(self):
+        """
+        Test that listed measurements include archived readings, filtered and in order.
+        """
+        archive.archive_older_than(days=90, block_size=128)
+        response = self.client.get(self.url, {"page_size": 100, "page": 3})
+        self.assertEqual(response.data["count"], 305)
+        self.assertEqual(response.data["results"][0]["tds"], 1000)
+
+        response = self.client.get(self.url, {"ordering": "-ph", "page_size": 10})
+        self.assertEqual([m["ph"] for m in response.data["results"]], [7.0] * 5 + [6.49] * 5)
+        self.assertEqual([m["tds"] for m in response.data["results"]][5:], [1099, 1049, 999, 949, 899])
+
+        response = self.client.get(self.url, {"ph_max": 6.01, "ordering": "-timestamp"})
+        self.assertEqual(response.data["count"], 12)
+        self.assertEqual(response.data["results"][0]["tds"], 1051)
+        self.assertEqual({m["ph"] for m in response.data["results"]}, {6.0, 6.01})
+
+    def test_pages_decode_only_covered_blocks(self):
+        """
+        Test that time-ordered pages match a full merge, including back-dated readings within the archived range,
+        and decode only the blocks they cover.
+        """
+        archive.archive_older_than(days=90, block_size=50)
+        Measurement.objects.create(system=self.system, ph=6, temperature=20, tds=1,
+                                   timestamp=self.old + timedelta(minutes=130, seconds=30))
+        cold = archive.to_measurements(self.system.id, archive.read(self.system.id))
+        expected = sorted(list(Measurement.objects.filter(system=self.system)) + cold, key=lambda m: m.timestamp)
+        queryset = Measurement.objects.filter(system=self.system)
+
+        for ordering, readings in (("timestamp", expected), ("-timestamp", expected[::-1])):
+            merged = archive.MergedMeasurements(self.system.id, queryset, None, ordering)
+            self.assertEqual(merged.count(), 306)
+            for start, stop in ((0, 10), (45, 60), (125, 140), (295, 306)):
+                self.assertEqual([m.id for m in merged[start:stop]], [m.id for m in readings[start:stop]])
+
+        with mock.patch.object(archive, "decode", wraps=archive.decode) as decode:
+            response = self.client.get(self.url, {"page_size": 10})
+        self.assertEqual(response.data["count"], 306)
+        self.assertEqual(decode.call_count, 1)
+
+        with mock.patch.object(archive, "decode", wraps=archive.decode) as decode:
+            after = (self.old + timedelta(minutes=75)).isoformat()
+            response = self.client.get(self.url, {"timestamp_after": after, "ordering": "-timestamp", "page": 2})
+        self.assertEqual(response.data["count"], 231)
+        self.assertEqual(response.data["results"][0]["tds"], 1094)
+        # the block cut by the time range is counted, the page covers the newest block
+        self.assertEqual(decode.call_count, 2)
+
+    def test_archived_measurement_detail(self):
+        """
+        Test that archived readings are retrieved by id.
+        """
+        first = Measurement.objects.order_by("timestamp").first()
+        archive.archive_older_than(days=90)
+        response = self.client.get(f"{self.url}{first.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["ph"], 6.0)
+        self.assertEqual(response.data["temperature"], 20.5)
+        response = self.client.get(f"{self.url}{first.id + 10_000}/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_chart_includes_archived_readings(self):
+        """
+        Test that charts cover archived and recent readings.
+        """
+        archive.archive_older_than(days=90)
+        response = self.client.get(f"{self.url}chart/", {"fields": "tds"})
+        self.assertEqual(response.data["total"], 305)
+        self.assertEqual(response.data["series"]["tds"][0][1], 800)
+
+    def test_archive_command(self):
+        """
+        Test that the command reports the archived bytes per row.
+        """
+        out = tempfile.TemporaryFile(mode="w+")
+        call_command("archive_measurements", "--older-than-days", "90", stdout=out)
+        out.seek(0)
+        self.assertIn("Archived 300 measurements", out.read())
+
+
+class CompressionAPITestCase(APITestCase):
+    """
+    Test case for compressed responses and request bodies.
+    """
+
+    def setUp(self):
+        """
+        Creates a system with 50 readings and authenticates its owner.
+        """
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.system = HydroponicSystem.objects.create(name="Test System", owner=self.user)
+        start = timezone.now() - timedelta(hours=1)
+        Measurement.objects.bulk_create(
+            Measurement(system=self.system, ph=6.5, temperature=21, tds=900,
+                        timestamp=start + timedelta(minutes=n))
+            for n in range(50)
+        )
+        self.url = f"/api/systems/{self.system.id}/measurements/"
+
+    def test_response_is_compressed(self):
+        """
+        Test that responses are gzip compressed for clients accepting gzip only.
+        """
+        response = self.client.get(self.url, {"page_size": 50}, HTTP_ACCEPT_ENCODING="gzip, br;q=0")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        body = gzip.decompress(response.content)
+        self.assertLess(len(response.content), len(body) / 3)
+        self.assertEqual(len(json.loads(body)["results"]), 50)
+
+        response = self.client.get(self.url, {"page_size": 50})
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_negotiation(self):
+        """
+        Test that client qualities are respected and refused encodings are not used.
+        """
+        self.assertEqual(compression.negotiate("gzip;q=0.5, identity").name, "gzip")
+        self.assertIsNone(compression.negotiate("gzip;q=0"))
+        self.assertIsNone(compression.negotiate("identity"))
+        self.assertEqual(compression.negotiate("*").name, compression.negotiate("*, gzip").name)
+
+    def test_streaming_compression(self):
+        """
+        Test that chunks compressed as a stream decompress to the whole content.
+        """
+        codec = compression.CODECS["gzip"]
+        chunks = [b'{"ph": 6.5, "tds": 900}' * 50 for _ in range(5)]
+        compressed = list(codec.stream(iter(chunks), 6))
+        self.assertGreater(len(compressed), 5)
+        self.assertEqual(gzip.decompress(b"".join(compressed)), b"".join(chunks))
+
+    def test_compressed_request_body(self):
+        """
+        Test that gzip compressed measurement batches are ingested.
+        """
+        start = timezone.now() - timedelta(days=1)
+        batch = [{"ph": 6.1, "temperature": 20, "tds": 800,
+                  "timestamp": (start + timedelta(minutes=n)).isoformat()} for n in range(20)]
+        response = self.client.generic(
+            "POST", self.url, gzip.compress(json.dumps(batch).encode()),
+            content_type="application/json", HTTP_CONTENT_ENCODING="gzip")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Measurement.objects.filter(system=self.system).count(), 70)
+
+    @override_settings(COMPRESSION={"MAX_DECOMPRESSED_SIZE": 10_000})
+    def test_decompression_bomb_is_rejected(self):
+        """
+        Test that bodies inflating beyond the limit, invalid and unsupported encodings are rejected.
+        """
+        bomb = gzip.compress(b" " * 1_000_000)
+        response = self.client.generic(
+            "POST", self.url, bomb, content_type="application/json", HTTP_CONTENT_ENCODING="gzip")
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        response = self.client.generic(
+            "POST", self.url, b"not gzip", content_type="application/json",
+            HTTP_CONTENT_ENCODING="gzip")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.generic(
+            "POST", self.url, b"{}", content_type="application/json", HTTP_CONTENT_ENCODING="br")
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        self.assertEqual(Measurement.objects.filter(system=self.system).count(), 50)
+
+
+@override_settings(DELETION={"RUN_IN_THREAD": False})
+class ChangeFeedAPITestCase(APITestCase):
+    """
+    Test case for the incremental change feed.
+    """
+
+    def setUp(self):
+        """
+        Creates a user with a system of 3 readings, authenticates them and takes the feed head.
+        """
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.system = HydroponicSystem.objects.create(name="Test System", owner=self.user)
+        self.start = timezone.now() - timedelta(hours=1)
+        self.measurements = f"/api/systems/{self.system.id}/measurements/"
+        self.client.post(self.measurements, [
+            {"ph": 6.5, "temperature": 21, "tds": 900,
+             "timestamp": (self.start + timedelta(minutes=n)).isoformat()} for n in range(3)
+        ], format="json")
+        self.url = "/api/changes/"
+
+    def sync(self, cursor, **params):
+        response = self.client.get(self.url, {"cursor": cursor, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_only_written_readings_are_logged(self):
+        """
+        Test that re-sent readings skipped as duplicates are not logged, overwritten ones are.
+        """
+        logged = ChangeLog.objects.filter(model=ChangeLog.Model.MEASUREMENT)
+        self.assertEqual(logged.count(), 3)
+        readings = [
+            {"ph": 7.0, "temperature": 21, "tds": 900,
+             "timestamp": (self.start + timedelta(minutes=n)).isoformat()} for n in range(2, 4)
+        ]
+        self.client.post(self.measurements, readings, format="json")
+        self.assertEqual(logged.count(), 4)
+
+        self.client.post(f"{self.measurements}?on_conflict=update", readings[:1], format="json")
+        self.assertEqual(logged.count(), 5)
+
+    def test_feed_returns_changes_after_cursor(self):
+        """
+        Test that upserts carry current rows, repeated changes are collapsed
+        and deletions are returned as tombstones.
+        """
+        cursor = self.client.get(self.url).data["cursor"]
+        self.assertEqual(self.sync(cursor)["changes"], [])
+
+        first, second, _ = Measurement.objects.filter(system=self.system).order_by("timestamp")
+        self.client.patch(f"{self.measurements}{first.id}/", {"ph": 7.0}, format="json")
+        self.client.patch(f"{self.measurements}{first.id}/", {"ph": 7.5}, format="json")
+        self.client.delete(f"{self.measurements}{second.id}/")
+        response = self.client.post("/api/systems/", {"name": "New System"}, format="json")
+
+        data = self.sync(cursor)
+        self.assertEqual(
+            [(change["model"], change["action"], change["id"]) for change in data["changes"]],
+            [("measurement", "upsert", first.id), ("measurement", "delete", second.id),
+             ("system", "upsert", response.data["id"])],
+        )
+        self.assertEqual(data["changes"][0]["data"]["ph"], 7.5)
+        self.assertIsNone(data["changes"][1]["data"])
+        self.assertEqual(data["changes"][2]["data"]["name"], "New System")
+        self.assertFalse(data["has_more"])
+        self.assertEqual(self.sync(data["cursor"])["changes"], [])
+
+    def test_bulk_changes_are_recorded_in_one_statement(self):
+        """
+        Test that bulk updates and system deletions are logged set-based.
+        """
+        cursor = self.client.get(self.url).data["cursor"]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(f"{self.measurements}bulk/?all=true", {"offset": {"tds": 10}},
+                              format="json")
+        self.assertEqual(
+            sum("INSERT INTO" in query["sql"] for query in queries.captured_queries), 1)
+        data = self.sync(cursor, limit=2)
+        self.assertEqual([change["data"]["tds"] for change in data["changes"]], [910, 910])
+        self.assertTrue(data["has_more"])
+
+        self.client.delete(f"/api/systems/{self.system.id}/")
+        data = self.sync(data["cursor"])
+        self.assertEqual(
+            [(change["model"], change["action"]) for change in data["changes"]],
+            [("system", "delete")],
+        )
+
+    def test_changes_of_archived_readings_are_kept(self):
+        """
+        Test that an upsert of a reading moved to the archive afterwards carries the archived row.
+        """
+        cursor = self.client.get(self.url).data["cursor"]
+        first = Measurement.objects.filter(system=self.system).order_by("timestamp").first()
+        self.client.patch(f"{self.measurements}{first.id}/", {"ph": 7.25}, format="json")
+        archive.archive_system(self.system.id, timezone.now())
+        self.assertFalse(Measurement.objects.filter(system=self.system).exists())
+
+        data = self.sync(cursor)
+        self.assertEqual([(change["action"], change["id"]) for change in data["changes"]],
+                         [("upsert", first.id)])
+        self.assertEqual(data["changes"][0]["data"]["ph"], 7.25)
+
+    def test_other_users_changes_are_hidden(self):
+        """
+        Test that the feed only contains changes of the user's systems.
+        """
+        cursor = self.client.get(self.url).data["cursor"]
+        other = User.objects.create_user(username="other", password="testpass")
+        system = HydroponicSystem.objects.create(name="Other System", owner=other)
+        Measurement.objects.upsert(system.id, [{"ph": 6, "temperature": 20, "tds": 800}])
+        self.assertEqual(ChangeLog.objects.filter(owner=other).count(), 1)
+        self.assertEqual(self.sync(cursor)["changes"], [])
+
+    def test_changes_of_running_transactions_are_held_back(self):
+        """
+        Test that a change committed after a newer id was read is still returned:
+        changes at or above the watermark wait and sort after the visible ones by transaction.
+        """
+        ChangeLog.objects.update(txid=3)
+        cursor = self.client.get(self.url).data["cursor"]
+        slow, fast, late = Measurement.objects.filter(system=self.system).order_by("id")
+        entries = [ChangeLog.objects.log(measurement, ChangeLog.Action.UPSERT)
+                   for measurement in (slow, fast, late)]
+        # transaction 5 logged the lowest id and is still running, 7 committed, 4 committed last
+        for entry, txid in zip(entries, [5, 7, 4]):
+            ChangeLog.objects.filter(id=entry.id).update(txid=txid)
+
+        with mock.patch("api.changes.watermark", return_value=5):
+            data = self.sync(cursor)
+        self.assertEqual([change["id"] for change in data["changes"]], [late.id])
+        with mock.patch("api.changes.watermark", return_value=8):
+            data = self.sync(data["cursor"])
+        self.assertEqual([change["id"] for change in data["changes"]], [slow.id, fast.id])
+
+    def test_invalid_and_expired_cursors(self):
+        """
+        Test that malformed cursors are rejected and cursors older than the retention expire.
+        """
+        self.assertEqual(self.client.get(self.url, {"cursor": "???"}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        expired = base64.urlsafe_b64encode(b"0:1:1000").decode()
+        self.assertEqual(self.client.get(self.url, {"cursor": expired}).status_code,
+                         status.HTTP_410_GONE)
+        # cursors of the id-only format predate ordering by transaction
+        legacy = base64.urlsafe_b64encode(f"1:{int(time.time())}".encode()).decode()
+        self.assertEqual(self.client.get(self.url, {"cursor": legacy}).status_code,
+                         status.HTTP_410_GONE)
+        self.assertEqual(
+            self.client.get(self.url, {"cursor": changes.encode_cursor((0, 0)), "limit": 0}).status_code,
+            status.HTTP_400_BAD_REQUEST)
+
+
+class APIUpstreamClient(edge.UpstreamClient):
+    """
+    Upstream client sending its requests to the test server, optionally simulating an outage.
+    """
+
+    def __init__(self):
+        super().__init__("http://upstream", "central", "centralpass")
+        self.api = APIClient()
+        self.offline = False
+        self.batches = []
+
+    def request(self, method, path, body=None, compress=False):
+        if self.offline:
+            raise edge.SyncError("Upstream server unreachable")
+        data = json.dumps(body, cls=DjangoJSONEncoder).encode()
+        headers = {}
+        if compress:
+            data = gzip.compress(data)
+            headers["HTTP_CONTENT_ENCODING"] = "gzip"
+            self.batches.append(len(body))
+        if self.token:
+            headers["HTTP_AUTHORIZATION"] = f"Bearer {self.token}"
+        response = self.api.generic(method, path, data, content_type="application/json", **headers)
+        return response.status_code, response.json() if response.content else None
+
+
+@override_settings(EDGE={"BATCH_SIZE": 3})
+class EdgeSyncTestCase(APITestCase):
+    """
+    Test case for syncing readings buffered on an edge node upstream.
+    """
+
+    def setUp(self):
+        """
+        Creates a local system with 7 readings linked to a system of the central user.
+        """
+        central = User.objects.create_user(username="central", password="centralpass")
+        self.remote = HydroponicSystem.objects.create(name="Central System", owner=central)
+        gateway = User.objects.create_user(username="gateway", password="testpass")
+        self.system = HydroponicSystem.objects.create(name="Edge System", owner=gateway)
+        self.start = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        Measurement.objects.upsert(self.system.id, [
+            {"ph": 6 + n / 10, "temperature": 21, "tds": 900 + n,
+             "timestamp": self.start + timedelta(minutes=n)} for n in range(7)
+        ])
+        self.link = EdgeSyncLink.objects.create(system=self.system, remote_system_id=self.remote.id)
+        self.client_upstream = APIUpstreamClient()
+
+    def remote_readings(self):
+        return list(Measurement.objects.filter(system=self.remote)
+                    .order_by("timestamp").values_list("ph", "tds"))
+
+    def test_readings_are_synced_in_batches(self):
+        """
+        Test that readings are sent in compressed batches and the position advances.
+        """
+        self.assertEqual(edge.sync_link(self.link, self.client_upstream), 7)
+        self.assertEqual(self.client_upstream.batches, [3, 3, 1])
+        self.assertEqual(self.remote_readings(), [(6 + n / 10, 900 + n) for n in range(7)])
+        self.link.refresh_from_db()
+        self.assertEqual(self.link.synced_rows, 7)
+        self.assertEqual(edge.sync_link(self.link, self.client_upstream), 0)
+
+        Measurement.objects.filter(system=self.system, tds=906).delete()
+        Measurement.objects.upsert(
+            self.system.id, [{"ph": 7, "temperature": 21, "tds": 999, "timestamp": self.start}],
+            update=True)
+        self.assertEqual(edge.sync_link(self.link, self.client_upstream), 1)
+        self.assertEqual(self.remote_readings()[0], (7, 999))
+
+    def test_sync_resumes_after_outage(self):
+        """
+        Test that a failed sync keeps its position and retried batches are deduplicated upstream.
+        """
+        self.client_upstream.offline = True
+        with self.assertRaises(edge.SyncError):
+            edge.sync_link(self.link, self.client_upstream)
+        self.link.refresh_from_db()
+        self.assertEqual(self.link.last_change_id, 0)
+        self.assertIn("unreachable", self.link.last_error)
+        with self.assertLogs("api.edge", "WARNING"):
+            self.assertEqual(edge.sync_all(self.client_upstream), {})
+
+        self.client_upstream.offline = False
+        self.assertEqual(edge.sync_all(self.client_upstream), {self.system.id: 7})
+        self.link.refresh_from_db()
+        self.assertEqual(self.link.last_error, "")
+
+        self.link.last_change_id = 0
+        edge.sync_link(self.link, self.client_upstream)
+        self.assertEqual(len(self.remote_readings()), 7)
+
+    @override_settings(EDGE_MODE=True)
+    def test_prune_keeps_changes_not_synced(self):
+        """
+        Test that pruning the change log of an edge node keeps readings not synced yet.
+        """
+        entries = list(edge.pending(self.link).values_list("id", flat=True))
+        self.link.last_change_id = entries[2]
+        self.link.save()
+        ChangeLog.objects.update(created_at=timezone.now() - timedelta(days=365))
+        call_command("prune_changes", stdout=tempfile.TemporaryFile(mode="w+"))
+        self.assertEqual(list(ChangeLog.objects.order_by("id").values_list("id", flat=True)), entries[3:])
+        self.assertEqual(edge.sync_link(self.link, self.client_upstream), 4)
+
+        # without links every change may still be synced by a system linked later
+        self.link.delete()
+        call_command("prune_changes", stdout=tempfile.TemporaryFile(mode="w+"))
+        self.assertEqual(ChangeLog.objects.filter(system_id=self.system.id).count(), 4)
+
+    def test_link_command(self):
+        """
+        Test that the command links local systems to upstream systems.
+        """
+        out = tempfile.TemporaryFile(mode="w+")
+        call_command("edge_sync", "--link", str(self.system.id), "42", stdout=out)
+        self.link.refresh_from_db()
+        self.assertEqual(self.link.remote_system_id, 42)
+
+
+class SchedulerTestCase(TransactionTestCase):
+    """
+    Test case for the periodic job scheduler.
+    Jobs run in pool threads with their own connections, so changes are committed.
+    """
+
+    def setUp(self):
+        self.calls = []
+        self.release = threading.Event()
+
+        def fail():
+            raise ValueError("broken")
+
+        self.jobs = {
+            "quick": scheduler.Job("quick", lambda: self.calls.append("quick"), 60),
+            "slow": scheduler.Job("slow", lambda: self.release.wait(5), 10),
+            "broken": scheduler.Job("broken", fail, 60),
+        }
+        self.scheduler = scheduler.Scheduler(self.jobs, workers=3)
+        self.addCleanup(self.scheduler.pool.shutdown)
+        self.addCleanup(self.release.set)
+
+    def wait(self, *names):
+        for name in names:
+            self.scheduler.running[name].result(timeout=5)
+
+    def test_due_jobs_run_once_per_interval(self):
+        """
+        Test that jobs run when due, are not started while running and are rescheduled by interval.
+        """
+        self.scheduler.load_schedule(now=1000)
+        with self.assertLogs("api.scheduler", "ERROR"):
+            self.assertEqual(self.scheduler.run_pending(now=1000), ["quick", "slow", "broken"])
+            self.wait("quick", "broken")
+        self.assertEqual(self.scheduler.run_pending(now=1030), [])
+        self.assertEqual(self.calls, ["quick"])
+        self.release.set()
+        self.wait("slow")
+        self.assertEqual(self.scheduler.run_pending(now=1030), ["slow"])
+        self.wait("slow")
+        with self.assertLogs("api.scheduler", "ERROR"):
+            self.assertEqual(self.scheduler.run_pending(now=1060), ["quick", "slow", "broken"])
+            self.wait("quick", "slow", "broken")
+        self.assertEqual(self.calls, ["quick", "quick"])
+
+    def test_runs_are_recorded(self):
+        """
+        Test that outcomes are recorded for monitoring and restore the schedule.
+        """
+        failures = metrics.SCHEDULER_JOB_RUNS.values().get(("broken", "failure"), 0)
+        self.scheduler.execute(self.jobs["quick"])
+        with self.assertLogs("api.scheduler", "ERROR"):
+            self.scheduler.execute(self.jobs["broken"])
+        quick, broken = ScheduledJob.objects.get(name="quick"), ScheduledJob.objects.get(name="broken")
+        self.assertEqual((quick.runs, quick.failures, quick.last_status), (1, 0, "success"))
+        self.assertEqual((broken.runs, broken.failures), (1, 1))
+        self.assertIn("broken", broken.last_error)
+        self.assertEqual(metrics.SCHEDULER_JOB_RUNS.values()[("broken", "failure")], failures + 1)
+        self.assertIn("hydroponics_scheduler_job_duration_seconds_count{job=\"quick\"}",
+                      metrics.REGISTRY.render())
+
+        self.scheduler.load_schedule()
+        self.assertAlmostEqual(
+            self.scheduler.next_run["quick"], quick.last_started_at.timestamp() + 60)
+        self.assertEqual(self.scheduler.run_pending(), ["slow"])
+
+    def test_single_process_database_always_leads(self):
+        """
+        Test that the scheduler leads without advisory locks on other databases than PostgreSQL.
+        """
+        self.assertTrue(self.scheduler.leadership.check())
+        self.assertEqual(metrics.SCHEDULER_LEADER.values()[()], 1)
+
+    def test_jobs_do_not_start_without_the_lock(self):
+        """
+        Test that a job submitted before the lock was lost does not run.
+        """
+        self.scheduler.load_schedule(now=1000)
+        with mock.patch.object(self.scheduler.leadership, "held", return_value=False):
+            with self.assertLogs("api.scheduler", "WARNING"):
+                self.scheduler.run_pending(now=1000)
+                self.wait("quick", "slow", "broken")
+        self.assertEqual(self.calls, [])
+        self.assertFalse(ScheduledJob.objects.exists())
+
+    def test_losing_the_lock_stops_scheduling(self):
+        """
+        Test that the scheduling loop returns once the lock is lost, after the running jobs.
+        """
+        lost = threading.Event()
+
+        def quick():
+            self.calls.append("quick")
+            lost.set()
+
+        runner = scheduler.Scheduler({"quick": scheduler.Job("quick", quick, 0.01)}, tick=0.01)
+        self.addCleanup(runner.pool.shutdown)
+        with mock.patch.object(runner.leadership, "held", side_effect=lambda: not lost.is_set()):
+            with self.assertLogs("api.scheduler", "WARNING"):
+                runner.lead()
+        self.assertEqual(self.calls, ["quick"])
+        self.assertTrue(runner.running["quick"].done())
+
+    def test_registered_jobs(self):
+        """
+        Test that built-in jobs are registered and can be disabled in the settings.
+        """
+        self.assertIn("prune_changes", scheduler.registered())
+        with override_settings(SCHEDULER={"JOBS": {"prune_changes": None}}):
+            self.assertNotIn("prune_changes", scheduler.registered())
+
+
+class BatchAPITestCase(TransactionTestCase):
+    """
+    Test case for batch requests.
+    Sub-requests may run in threads with their own connections, so changes are committed.
+    """
+
+    client_class = APIClient
+
+    def setUp(self):
+        """
+        Creates a user with two systems with readings and another user's system, authenticates the user.
+        """
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.other = User.objects.create_user(username="otheruser", password="testpass")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.systems = [
+            HydroponicSystem.objects.create(name=f"System {n}", owner=self.user) for n in range(2)]
+        self.foreign = HydroponicSystem.objects.create(name="Foreign", owner=self.other)
+        start = timezone.now() - timedelta(hours=1)
+        for system in self.systems:
+            Measurement.objects.bulk_create([
+                Measurement(system=system, ph=6.0 + n / 10, temperature=20, tds=800,
+                            timestamp=start + timedelta(minutes=n)) for n in range(15)
+            ])
+        self.url = "/api/batch/"
+
+    def batch(self, *paths):
+        return self.client.post(
+            self.url, {"requests": [{"id": n, "path": path} for n, path in enumerate(paths)]},
+            format="json")
+
+    def test_batch_returns_sub_responses_in_order(self):
+        """
+        Test that sub-responses match separate requests, in order, with the batch authenticated once.
+        """
+        paths = [
+            f"/api/systems/{self.systems[0].id}/",
+            f"/api/systems/{self.systems[1].id}/measurements/?page_size=5&ordering=-timestamp",
+            f"/api/systems/{self.foreign.id}/",
+            "/api/unknown/",
+            f"/api/systems/{self.systems[0].id}/",
+        ]
+        with mock.patch.object(JWTAuthentication, "authenticate", autospec=True,
+                               side_effect=JWTAuthentication.authenticate) as authenticate:
+            response = self.batch(*paths)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(authenticate.call_count, 1)
+
+        responses = response.json()["responses"]
+        self.assertEqual([item["id"] for item in responses], [0, 1, 2, 3, 4])
+        self.assertEqual([item["status"] for item in responses], [200, 200, 404, 404, 200])
+        for item, path in zip(responses[:2], paths):
+            self.assertEqual(item["body"], self.client.get(path).json())
+        self.assertEqual(len(responses[0]["body"]["last_measurements"]), 10)
+        self.assertEqual(responses[4]["body"], responses[0]["body"])
+
+    def test_threads_and_sequential_runs_agree(self):
+        """
+        Test that sub-requests split between threads return the same responses as run one by one.
+        """
+        paths = [f"/api/systems/{system.id}/" for system in self.systems] + [
+            f"/api/systems/{system.id}/measurements/chart/" for system in self.systems]
+        threaded = self.batch(*paths).json()
+        with override_settings(BATCH={"WORKERS": 1}):
+            sequential = self.batch(*paths).json()
+        self.assertEqual(threaded, sequential)
+        self.assertEqual({item["status"] for item in threaded["responses"]}, {200})
+
+    def test_batches_share_one_pool(self):
+        """
+        Test that consecutive batches run on the same bounded pool of threads.
+        """
+        paths = [f"/api/systems/{system.id}/" for system in self.systems]
+        self.batch(*paths)
+        pool = batch.get_pool()
+        for _ in range(3):
+            self.assertEqual({item["status"] for item in self.batch(*paths).json()["responses"]}, {200})
+        self.assertIs(batch.get_pool(), pool)
+        threads = [thread for thread in threading.enumerate() if thread.name.startswith("batch")]
+        self.assertLessEqual(len(threads), batch.get_config()["WORKERS"])
+
+    def test_invalid_batches_are_rejected(self):
+        """
+        Test the limits: non-GET, relative and nested sub-requests, oversized and empty batches.
+        """
+        response = self.client.post(
+            self.url, {"requests": [{"method": "DELETE", "path": "/api/systems/"}]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.batch("api/systems/").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url, {"requests": []}, format="json").status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        with override_settings(BATCH={"MAX_REQUESTS": 2}):
+            self.assertEqual(self.batch(*["/api/systems/"] * 3).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.batch(self.url).json()["responses"][0]["status"], 400)
+
+        self.client.credentials()
+        self.assertEqual(self.batch("/api/systems/").status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(SHARDING={"SHARDS": {"default": 0, "shard_1": 1}, "FREEZE_GRACE": 0})
+class ShardingAPITestCase(APITestCase):
+    """
+    Test case for owner-based sharding, with an in-memory SQLite database as the second shard.
+    The shard is added once the test databases are set up, tests run in a transaction on it as well.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.databases = cls.databases | {"shard_1"}
+        connections.settings["shard_1"] = connections.configure_settings({
+            "default": {}, "shard_1": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"},
+        })["shard_1"]
+        call_command("migrate", database="shard_1", verbosity=0)
+        sharding.reserve_ids("shard_1", 1)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["shard_1"].connection.close()
+        del connections._connections.shard_1
+        del connections.settings["shard_1"]
+        cls.databases = cls.databases - {"shard_1"}
+        super().tearDownClass()
+
+    def setUp(self):
+        """
+        Creates two users, placed on the two shards by their first request.
+        """
+        self.first = User.objects.create_user(username="first", password="testpass")
+        self.second = User.objects.create_user(username="second", password="testpass")
+        self.start = timezone.now() - timedelta(hours=1)
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+
+    def create_system(self, user, readings=3):
+        self.login(user)
+        system = self.client.post("/api/systems/", {"name": f"{user.username} system"}, format="json").data
+        self.client.post(f"/api/systems/{system['id']}/measurements/", [
+            {"ph": 6.5, "temperature": 21, "tds": 900,
+             "timestamp": (self.start + timedelta(minutes=n)).isoformat()} for n in range(readings)
+        ], format="json")
+        return system["id"]
+
+    def test_users_are_placed_and_routed_to_their_shard(self):
+        """
+        Test that rows are written to the shard of their owner with ids of its block
+        and that views only read from it.
+        """
+        first_system = self.create_system(self.first)
+        second_system = self.create_system(self.second)
+        self.assertEqual(sharding.shard_of(self.first.id), "default")
+        self.assertEqual(sharding.shard_of(self.second.id), "shard_1")
+
+        self.assertFalse(HydroponicSystem.objects.using("default").filter(id=second_system).exists())
+        self.assertEqual(Measurement.objects.using("shard_1").filter(system_id=second_system).count(), 3)
+        self.assertGreater(second_system, 2 ** 40)
+        self.assertLess(first_system, 2 ** 40)
+
+        response = self.client.get(f"/api/systems/{second_system}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["last_measurements"]), 3)
+        self.assertEqual([system["id"] for system in self.client.get("/api/systems/").data], [second_system])
+        self.assertEqual(self.client.get(f"/api/systems/{first_system}/").status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(sharding.locate_systems({first_system, second_system}),
+                         {first_system: "default", second_system: "shard_1"})
+
+    def test_synthetic_readings_are_written_to_the_active_shard(self):
+        """
+        Test that generated readings are inserted on the shard of their system.
+        """
+        self.create_system(self.first)
+        system_id = self.create_system(self.second)
+        with sharding.use("shard_1"):
+            self.assertEqual(synthetic.insert_measurements([system_id], 5, 60, seed=1), 5)
+        self.assertEqual(Measurement.objects.using("shard_1").filter(system_id=system_id).count(), 8)
+        self.assertFalse(Measurement.objects.using("default").filter(system_id=system_id).exists())
+
+    def test_move_user_applies_writes_made_while_copying(self):
+        """
+        Test that a user is moved with readings written during the copy, writes are rejected
+        while frozen and change feed cursors issued before the move expire.
+        """
+        system_id = self.create_system(self.first)
+        cursor = self.client.get("/api/changes/").data["cursor"]
+        measurements = f"/api/systems/{system_id}/measurements/"
+        first = Measurement.objects.filter(system_id=system_id).order_by("timestamp").first()
+
+        def write(step):
+            if step == "copied":
+                self.client.patch(f"{measurements}{first.id}/", {"ph": 7.25}, format="json")
+                self.client.post(measurements, {"ph": 6.0, "temperature": 20, "tds": 800,
+                                                "timestamp": timezone.now().isoformat()}, format="json")
+            elif step == "frozen":
+                response = self.client.post("/api/systems/", {"name": "Blocked"}, format="json")
+                self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+                self.assertIn("Retry-After", response)
+                self.assertEqual(self.client.get(measurements).status_code, status.HTTP_200_OK)
+
+        sharding.move_user(self.first.id, "shard_1", progress=write)
+
+        self.assertEqual(sharding.shard_of(self.first.id), "shard_1")
+        self.assertFalse(HydroponicSystem.objects.using("default").filter(id=system_id).exists())
+        self.assertEqual(Measurement.objects.using("shard_1").filter(system_id=system_id).count(), 4)
+        response = self.client.get(f"{measurements}{first.id}/")
+        self.assertEqual(response.data["ph"], 7.25)
+        self.assertEqual(self.client.get("/api/changes/", {"cursor": cursor}).status_code, status.HTTP_410_GONE)
+        self.assertEqual(self.client.post("/api/systems/", {"name": "After"}, format="json").status_code,
+                         status.HTTP_201_CREATED)
+
+        with self.assertRaises(sharding.MoveError):
+            sharding.move_user(self.first.id, "shard_1")
+
+    def test_move_user_copies_edge_sync_links_written_meanwhile(self):
+        """
+        Test that edge sync links created or advanced during a move are kept on the new shard.
+        """
+        system_id = self.create_system(self.first)
+
+        def sync(step):
+            if step == "copied":
+                EdgeSyncLink.objects.create(system_id=system_id, remote_system_id=7)
+            elif step == "frozen":
+                EdgeSyncLink.objects.filter(system_id=system_id).update(last_change_id=42, synced_rows=3)
+
+        sharding.move_user(self.first.id, "shard_1", progress=sync)
+        link = EdgeSyncLink.objects.using("shard_1").get(system_id=system_id)
+        self.assertEqual((link.remote_system_id, link.last_change_id, link.synced_rows), (7, 42, 3))
+        self.assertFalse(EdgeSyncLink.objects.using("default").exists())
+
+    def test_queued_readings_of_frozen_users_wait_for_the_switch(self):
+        """
+        Test that the ingest worker leaves batches of a frozen user in the queue
+        and drains the batches queued behind them.
+        """
+        other_id = self.create_system(self.first)
+        system_id = self.create_system(self.second)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        queue = ingest_queue.IngestQueue(os.path.join(directory.name, "queue.sqlite3"))
+        for queued_id in (system_id, other_id):
+            queue.enqueue(queued_id, [{"ph": 6.0, "temperature": 20, "tds": 800,
+                                       "timestamp": timezone.now().isoformat()}])
+
+        ShardAssignment.objects.filter(user=self.second).update(target="default", frozen=True)
+        self.assertEqual(queue.drain(max_rows=1), 1)
+        self.assertEqual(Measurement.objects.filter(system_id=other_id).count(), 4)
+        self.assertEqual(queue.pending(), 1)
+
+        ShardAssignment.objects.filter(user=self.second).update(target="", frozen=False)
+        self.assertEqual(queue.drain(), 1)
+        self.assertEqual(Measurement.objects.using("shard_1").filter(system_id=system_id).count(), 4)
+
+    @override_settings(DELETION={"RUN_IN_THREAD": False})
+    def test_deletion_jobs_wait_for_a_move(self):
+        """
+        Test that a deletion job started during a move runs on the new shard after the switch
+        and that users with running deletion jobs are not moved.
+        """
+        system_id = self.create_system(self.first)
+
+        def delete(step):
+            if step == "copied":
+                response = self.client.delete(f"/api/systems/{system_id}/?async=true")
+                self.assertEqual(DeletionJob.objects.get(id=response.data["job_id"]).status,
+                                 DeletionJob.Status.PENDING)
+
+        sharding.move_user(self.first.id, "shard_1", progress=delete)
+        self.assertEqual(DeletionJob.objects.get().status, DeletionJob.Status.DONE)
+        self.assertFalse(HydroponicSystem.objects.using("shard_1").filter(id=system_id).exists())
+        self.assertFalse(HydroponicSystem.objects.using("default").filter(id=system_id).exists())
+
+        DeletionJob.objects.update(status=DeletionJob.Status.RUNNING)
+        with self.assertRaisesMessage(sharding.MoveError, "running deletion jobs"):
+            sharding.move_user(self.first.id, "default")
+        self.assertEqual(ShardAssignment.objects.get(user=self.first).target, "")
+
+    def test_generated_data_is_written_to_the_shard_of_every_user(self):
+        """
+        Test that synthetic users are placed on shards and users being moved are refused.
+        """
+        call_command("generate_data", users=2, systems_per_user=1, measurements=5,
+                     prefix="sim", seed=1, stdout=open(os.devnull, "w"))
+        for user in User.objects.filter(username__startswith="sim_"):
+            shard = sharding.shard_of(user.id)
+            self.assertEqual(Measurement.objects.using(shard).filter(system__owner=user).count(), 5)
+        self.assertEqual({sharding.shard_of(user.id) for user in User.objects.filter(
+            username__startswith="sim_")}, {"default", "shard_1"})
+
+        ShardAssignment.objects.filter(user__username="sim_0").update(target="default")
+        with self.assertRaisesMessage(CommandError, "Users being moved to another shard: sim_0."):
+            call_command("generate_data", users=2, prefix="sim", stdout=open(os.devnull, "w"))
+
+    def test_deleting_a_user_deletes_their_shard_rows(self):
+        """
+        Test that deleting a user removes their systems and measurements from their shard.
+        """
+        system_id = self.create_system(self.second)
+        self.client.delete(f"/api/users/{self.second.id}/")
+        self.assertFalse(User.objects.filter(id=self.second.id).exists())
+        self.assertFalse(User.objects.using("shard_1").filter(id=self.second.id).exists())
+        self.assertFalse(Measurement.objects.using("shard_1").filter(system_id=system_id).exists())
@@ -0,0 +1,249 @@
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """
+    Parses a DRF style rate string such as `"100/min"`.
+    Returns a `(capacity, refill_per_second)` tuple, or `(None, None)` for no limit.
+    """
+    if rate is None:
+        return None, None
+    num, period = rate.split("/")
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class BaseTokenBucketBackend:
+    """
+    Storage for token buckets.
+    Subclasses implement `consume()`, which takes tokens from a bucket
+    and returns the number of seconds to wait (0 when the request is allowed).
+    """
+
+    def consume(self, key, capacity, refill_rate, tokens=1):
+        raise NotImplementedError
+
+    def reset(self):
+        """
+        Removes all buckets.
+        """
+        raise NotImplementedError
+
+
+class LocalTokenBucketBackend(BaseTokenBucketBackend):
+    """
+    In-process token bucket store.
+    Buckets are kept in a dictionary guarded by a single lock, so each check
+    costs a dictionary lookup and a few float operations.
+    Every bucket records when it will be full again, so buckets of any scope are pruned
+    once full, at most every `prune_interval` seconds while more than `max_keys` are kept.
+    Suitable for tests and single-process deployments.
+    """
+
+    def __init__(self, max_keys=100_000, prune_interval=10.0, timer=time.monotonic):
+        self.max_keys = max_keys
+        self.prune_interval = prune_interval
+        self.timer = timer
+        self._buckets = {}
+        self._pruned = timer()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate, tokens=1):
+        now = self.timer()
+        with self._lock:
+            level, updated, _ = self._buckets.get(key, (capacity, now, now))
+            level = min(capacity, level + (now - updated) * refill_rate)
+            if level >= tokens:
+                level -= tokens
+                wait = 0.0
+            else:
+                wait = (tokens - level) / refill_rate
+            self._buckets[key] = (level, now, now + (capacity - level) / refill_rate)
+            if len(self._buckets) > self.max_keys and now - self._pruned >= self.prune_interval:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now):
+        """
+        Drops buckets that have refilled completely, as they hold no state.
+        """
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+        self._pruned = now
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisTokenBucketBackend(BaseTokenBucketBackend):
+    """
+    Token bucket store for Redis compatible servers.
+    Each check is a single round trip running an atomic Lua script,
+    which uses the server clock so that all app replicas share the same buckets.
+    """
+
+    SCRIPT = """
+        local capacity = tonumber(ARGV[1])
+        local rate = tonumber(ARGV[2])
+        local requested = tonumber(ARGV[3])
+        local clock = redis.call('TIME')
+        local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+        local level = tonumber(state[1]) or capacity
+        local updated = tonumber(state[2]) or now
+        level = math.min(capacity, level + math.max(0, now - updated) * rate)
+        local wait = 0
+        if level >= requested then
+            level = level - requested
+        else
+            wait = (requested - level) / rate
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(level), 'ts', tostring(now))
+        redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+        return tostring(wait)
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", key_prefix="throttle:"):
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImproperlyConfigured(
+                "RedisTokenBucketBackend requires the `redis` package."
+            ) from exc
+        self.key_prefix = key_prefix
+        self.client = redis.Redis.from_url(url)
+        self._script = self.client.register_script(self.SCRIPT)
+
+    def consume(self, key, capacity, refill_rate, tokens=1):
+        wait = self._script(
+            keys=[self.key_prefix + key], args=[capacity, refill_rate, tokens]
+        )
+        return float(wait)
+
+    def reset(self):
+        for key in self.client.scan_iter(match=self.key_prefix + "*"):
+            self.client.delete(key)
+
+
+_backend = None
+
+THROTTLE_DECISIONS = metrics.Counter(
+    "hydroponics_throttle_decisions_total", "Rate limiter decisions by scope and outcome.",
+    ["scope", "outcome"])
+
+
+def get_backend():
+    """
+    Returns the configured token bucket backend, creating it on first use.
+    """
+    global _backend
+    if _backend is None:
+        config = getattr(settings, "RATE_LIMIT_BACKEND", {})
+        backend_class = import_string(
+            config.get("BACKEND", "api.throttling.LocalTokenBucketBackend")
+        )
+        _backend = backend_class(**config.get("OPTIONS", {}))
+    return _backend
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    global _backend
+    if setting == "RATE_LIMIT_BACKEND":
+        _backend = None
+
+
+def get_stats():
+    """
+    Returns counters of allowed and throttled requests per scope.
+    """
+    stats = defaultdict(lambda: {"allowed": 0, "throttled": 0})
+    for (scope, outcome), value in THROTTLE_DECISIONS.values().items():
+        stats[scope][outcome] = value
+    return dict(stats)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Base throttle using token buckets.
+    The rate for `scope` is read from `DEFAULT_THROTTLE_RATES`, where `"100/min"`
+    allows bursts of 100 requests refilled at 100 tokens per minute.
+    """
+
+    scope = None
+
+    def __init__(self):
+        self.capacity, self.refill_rate = parse_rate(
+            api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        )
+        self.wait_time = None
+
+    def get_bucket_key(self, request, view):
+        """
+        Returns the bucket key for the request, or `None` to skip throttling.
+        """
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        if self.capacity is None:
+            return True
+        key = self.get_bucket_key(request, view)
+        if key is None:
+            return True
+
+        self.wait_time = get_backend().consume(
+            f"{self.scope}:{key}", self.capacity, self.refill_rate
+        )
+        outcome = "throttled" if self.wait_time else "allowed"
+        THROTTLE_DECISIONS.inc(scope=self.scope, outcome=outcome)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Limits requests per authenticated user, or per client IP for anonymous requests.
+    """
+
+    scope = "user"
+
+    def get_bucket_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return str(request.user.pk)
+        return f"anon:{self.get_ident(request)}"
+
+
+class SystemTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Limits requests per hydroponic system on endpoints scoped by `system_id`,
+    so a single misbehaving gateway cannot flood the measurement endpoints.
+    Throttles run before the ownership check, so buckets are kept per requesting user
+    and system: requests for another user's system cannot drain the owner's bucket.
+    """
+
+    scope = "system"
+
+    def get_bucket_key(self, request, view):
+        system_id = getattr(view, "kwargs", {}).get("system_id")
+        if system_id is None:
+            return None
+        if request.user and request.user.is_authenticated:
+            return f"{request.user.pk}:{system_id}"
+        return f"anon:{self.get_ident(request)}:{system_id}"
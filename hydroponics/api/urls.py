@@ -1,6 +1,9 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .views import RegisterView, UserView, HydroponicsSystemView, MeasurementView
+from .views import (
+    RegisterView, UserView, HydroponicsSystemView, MeasurementView, MeasurementBulkView, MeasurementChartView,
+    ResampleView, AnalyticsView, DeletionJobView, ChangeFeedView, BatchView, ForecastView, MetricsView, ProfileView, SchedulerView,
+)
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
@@ -13,8 +16,26 @@ urlpatterns = [
     path('systems/', HydroponicsSystemView.as_view(), name='systems_list'),
     path('systems/<int:pk>/', HydroponicsSystemView.as_view(), name='system_detail'),
 
+    path('systems/<int:system_id>/forecast/', ForecastView.as_view(), name='forecast'),
     path('systems/<int:system_id>/measurements/',
          MeasurementView.as_view(), name='measurement_list'),
+    path('systems/<int:system_id>/measurements/bulk/',
+         MeasurementBulkView.as_view(), name='measurement_bulk'),
+    path('systems/<int:system_id>/measurements/chart/',
+         MeasurementChartView.as_view(), name='measurement_chart'),
     path('systems/<int:system_id>/measurements/<int:measurement_id>/',
          MeasurementView.as_view(), name='measurement_detail'),
+
+    path('measurements/resample/', ResampleView.as_view(), name='measurement_resample'),
+    path('analytics/', AnalyticsView.as_view(), name='analytics'),
+
+    path('deletions/<int:job_id>/', DeletionJobView.as_view(), name='deletion_detail'),
+
+    path('changes/', ChangeFeedView.as_view(), name='changes'),
+    path('batch/', BatchView.as_view(), name='batch'),
+
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('scheduler/', SchedulerView.as_view(), name='scheduler'),
+    path('profiles/', ProfileView.as_view(), name='profile_list'),
+    path('profiles/<slug:profile_id>/', ProfileView.as_view(), name='profile_detail'),
 ]
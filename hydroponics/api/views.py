@@ -1,22 +1,93 @@
+import hmac
+
 from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.filters import OrderingFilter
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
+from django.db import DataError, IntegrityError, transaction
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import DjangoFilterBackend
-from .serializers import UserRegisterSerializer, UserSerializer, HydroponicSystemSerializer, MeasurementSerializer
-from .models import HydroponicSystem, Measurement
-from .pagination import MeasurementPagination
+from .serializers import (
+    UserRegisterSerializer, UserSerializer, HydroponicSystemSerializer, MeasurementSerializer,
+    MeasurementBulkUpdateSerializer, DeletionJobSerializer, ForecastQuerySerializer, ResampleQuerySerializer,
+    AnalyticsQuerySerializer,
+)
+from .models import ChangeLog, DeletionJob, HydroponicSystem, Measurement, ScheduledJob
+from .pagination import MeasurementPagination, UserPagination
 from .filters import MeasurementFilter, HydroponicSystemFilter
+from . import (
+    analytics, archive, batch, changes, deletion, downsampling, forecasting, ingest_queue, metrics, profiling, resampling,
+    scheduler, sharding,
+)
+from .signals import notify_measurements_changed
 
 
 User = get_user_model()
 
 
-class RegisterView(APIView):
+class UserMoving(APIException):
+    """
+    Raised for writes of a user whose data is being moved to another shard.
+    """
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Your data is being moved to another database, retry in a few seconds."
+    default_code = "user_moving"
+    wait = 5
+
+
+class InstrumentedAPIView(APIView):
+    """
+    Base API view recording the time spent on authentication,
+    permission and throttle checks as the `auth` phase of the request metrics.
+    Queries of the request are routed to the database shard of the authenticated user.
+    """
+
+    shard_assignment = None
+
+    def dispatch(self, request, *args, **kwargs):
+        # the user's shard is activated after authentication and for this request only
+        with sharding.use(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        with metrics.phase("auth"):
+            super().initial(request, *args, **kwargs)
+            self.shard_assignment = sharding.activate(request.user)
+        if self.shard_assignment and self.shard_assignment.frozen and request.method not in SAFE_METHODS:
+            raise UserMoving
+
+
+def delete_in_background(request):
+    """
+    Returns whether the request asks for a background deletion with `?async=true`.
+    """
+    return request.GET.get("async", "").lower() in ("1", "true")
+
+
+def deletion_accepted(request, job):
+    """
+    Returns the 202 response of a scheduled deletion job.
+    """
+    return Response(
+        {
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": request.build_absolute_uri(reverse("deletion_detail", args=[job.id])),
+        },
+        status=status.HTTP_202_ACCEPTED,
+    )
+
+
+class RegisterView(InstrumentedAPIView):
     """
     API endpoint for user registration.
     Allows anyone to register a new account.
@@ -51,31 +122,70 @@ class RegisterView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserView(APIView):
+class UserView(InstrumentedAPIView):
     """
-    API endpoint for retrieving user data.
+    API endpoint for retrieving and deleting user data.
     Allows only authenticated users to access user details.
     """
 
     permission_classes = [IsAuthenticated]
+    pagination_class = UserPagination
+
+    def get_queryset(self):
+        """
+        Returns users with only the columns serialized by `UserSerializer`.
+        """
+        return User.objects.only(*UserSerializer.Meta.fields)
 
     def get(self, request, user_id=None):
         """
         Retrieves user information.
         - If `user_id` is provided, returns details of a specific user.
-        - Otherwise, returns a list of all users.
+        - Otherwise, returns a page of users ordered by username,
+          optionally filtered by the username prefix `search`.
         """
         if user_id:
-            user = get_object_or_404(User, id=user_id)
+            user = get_object_or_404(self.get_queryset(), id=user_id)
             serializer = UserSerializer(user)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
-        users = User.objects.all().order_by("username")
-        serializer = UserSerializer(users, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        users = self.get_queryset()
+        search = request.GET.get("search")
+        if search:
+            users = users.filter(username__startswith=search)
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(users, request, view=self)
+        metrics.record_rows(len(page))
+        with metrics.phase("serialize"):
+            data = UserSerializer(page, many=True).data
+        return paginator.get_paginated_response(data)
+
+    def delete(self, request, user_id):
+        """
+        Deletes a user with their systems and measurements.
+        Users can delete their own account, staff can delete any account.
+        - With `?async=true` the deletion runs in the background and 202 is returned.
+        """
+        user = get_object_or_404(User, id=user_id)
+        if user != request.user and not request.user.is_staff:
+            return Response(
+                {"error": "You can only delete your own account."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        if delete_in_background(request):
+            job = deletion.schedule(DeletionJob.Target.USER, user.id, request.user)
+            return deletion_accepted(request, job)
+
+        deletion.delete_user(user.id)
+        return Response(
+            {"message": f"User id:{user_id} deleted successfully"},
+            status=status.HTTP_204_NO_CONTENT,
+        )
     
 
-class HydroponicsSystemView(APIView):
+class HydroponicsSystemView(InstrumentedAPIView):
     """
     API endpoint for managing hydroponic systems.
     Supports filtering and sorting. Paginacja is disabled for system lists.
@@ -102,7 +212,9 @@ class HydroponicsSystemView(APIView):
             data=request.data, context={'request': request}
         )
         if serializer.is_valid():
-            serializer.save(owner=request.user)
+            with transaction.atomic(using=sharding.db()):
+                system = serializer.save(owner=request.user)
+                ChangeLog.objects.log(system, ChangeLog.Action.UPSERT)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -114,33 +226,29 @@ class HydroponicsSystemView(APIView):
         """
         user = request.user
 
-        # ✅ Retrieve a single system with eager-loaded measurements
+        # ✅ Retrieve a single system, only its last 10 measurements are loaded
         if pk:
-            system = get_object_or_404(
-                HydroponicSystem.objects.prefetch_related("measurements"),
-                id=pk,
-                owner=user,
-            )
+            system = get_object_or_404(HydroponicSystem, id=pk, owner=user)
 
             last_measurements = list(system.measurements.all().order_by("-timestamp")[:10])
 
-            system_serializer = HydroponicSystemSerializer(system)
-            measurement_serializer = MeasurementSerializer(last_measurements, many=True)
+            metrics.record_rows(len(last_measurements) + 1)
+            with metrics.phase("serialize"):
+                data = {
+                    "system": HydroponicSystemSerializer(system).data,
+                    "last_measurements": MeasurementSerializer(last_measurements, many=True).data,
+                }
 
-            return Response(
-                {
-                    "system": system_serializer.data,
-                    "last_measurements": measurement_serializer.data,
-                },
-                status=status.HTTP_200_OK,
-            )
+            return Response(data, status=status.HTTP_200_OK)
 
         # Retrieve multiple systems
         systems = self.get_queryset(user)
 
         # Filtering
-        filterset = HydroponicSystemFilter(request.GET, queryset=systems)
-        if not filterset.is_valid():
+        with metrics.phase("filter"):
+            filterset = HydroponicSystemFilter(request.GET, queryset=systems)
+            valid = filterset.is_valid()
+        if not valid:
             return Response(
                 {
                     "error": "Invalid filtering parameters",
@@ -152,7 +260,7 @@ class HydroponicsSystemView(APIView):
 
         systems = filterset.qs
 
-        # Ordering
+        # Ordering, search results are ranked by relevance unless an ordering is requested
         ordering = request.GET.get("ordering", "created_date")
         if ordering.lstrip("-") not in self.ordering_fields:
             return Response(
@@ -162,12 +270,18 @@ class HydroponicsSystemView(APIView):
                 },
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        if request.GET.get("search") and "ordering" not in request.GET:
+            systems = systems.order_by("-search_rank", "name")
+        else:
+            systems = systems.order_by(ordering)
 
-        systems = systems.order_by(ordering)
+        systems = list(systems)
+        metrics.record_rows(len(systems))
 
         # Serialize and return the list of systems
-        serializer = HydroponicSystemSerializer(systems, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        with metrics.phase("serialize"):
+            data = HydroponicSystemSerializer(systems, many=True).data
+        return Response(data, status=status.HTTP_200_OK)
 
     def put(self, request, pk):
         """
@@ -180,7 +294,9 @@ class HydroponicsSystemView(APIView):
             system, data=request.data, context={'request': request}
         )
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic(using=sharding.db()):
+                serializer.save()
+                ChangeLog.objects.log(system, ChangeLog.Action.UPSERT)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -195,31 +311,40 @@ class HydroponicsSystemView(APIView):
             system, data=request.data, partial=True, context={'request': request}
         )
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic(using=sharding.db()):
+                serializer.save()
+                ChangeLog.objects.log(system, ChangeLog.Action.UPSERT)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, pk):
         """
-        Deletes a hydroponic system.
+        Deletes a hydroponic system with its measurements.
         The authenticated user must be the owner.
+        - Measurements are deleted in chunks, without loading them.
+        - With `?async=true` the deletion runs in the background and 202 is returned.
         """
         user = request.user
         system = get_object_or_404(HydroponicSystem, id=pk, owner=user)
-        system.delete()
+
+        if delete_in_background(request):
+            job = deletion.schedule(DeletionJob.Target.SYSTEM, system.id, user)
+            return deletion_accepted(request, job)
+
+        deletion.delete_system(system.id)
         return Response(
             {"message": f"System id:{pk} deleted successfully"},
             status=status.HTTP_204_NO_CONTENT,
         )
 
 
-class MeasurementView(APIView):
+class MeasurementView(InstrumentedAPIView):
     """
     API endpoint for managing measurements in a hydroponic system.
 
     Supported HTTP methods:
     - GET: Retrieve one or all measurements with pagination.
-    - POST: Create a new measurement.
+    - POST: Create one or many measurements, idempotent on `(system, timestamp)`.
     - PUT/PATCH: Update a specific measurement.
     - DELETE: Delete a specific measurement.
     """
@@ -250,42 +375,102 @@ class MeasurementView(APIView):
         Retrieve measurements.
         - If `measurement_id` is provided, returns a single measurement.
         - Otherwise, returns a paginated list of all measurements for the system.
+        - Archived readings are included read-only, merged in the requested ordering.
         """
         self.get_system(system_id)  # Ensure system belongs to user
 
         if measurement_id:
-            measurement = get_object_or_404(
-                self.get_queryset(system_id), id=measurement_id)
+            measurement = self.get_queryset(system_id).filter(id=measurement_id).first()
+            if measurement is None:
+                measurement = archive.get_archived(system_id, measurement_id)
+            if measurement is None:
+                raise Http404
             serializer = MeasurementSerializer(measurement)
             return Response(serializer.data, status=status.HTTP_200_OK)
         
         measurements = self.get_queryset(system_id)
         
-        filterset = MeasurementFilter(request.GET, queryset=measurements)
-        if filterset.is_valid():
-            measurements = filterset.qs
+        with metrics.phase("filter"):
+            filterset = MeasurementFilter(request.GET, queryset=measurements)
+            if filterset.is_valid():
+                measurements = filterset.qs
+            else:
+                filterset = None
         
         ordering = request.GET.get('ordering', 'timestamp')
-        if ordering.lstrip('-') in self.ordering_fields:
-            measurements = measurements.order_by(ordering)
+        if ordering.lstrip('-') not in self.ordering_fields:
+            ordering = 'timestamp'
+        measurements = measurements.order_by(ordering)
+        merged = archive.MergedMeasurements(system_id, measurements, filterset, ordering)
+        if merged.blocks:
+            measurements = merged
         
         paginator = self.pagination_class()
         paginated_qs = paginator.paginate_queryset(measurements, request)
-        serializer = MeasurementSerializer(paginated_qs, many=True)
+        metrics.record_rows(len(paginated_qs))
+        with metrics.phase("serialize"):
+            data = MeasurementSerializer(paginated_qs, many=True).data
 
-        return paginator.get_paginated_response(serializer.data)
+        return paginator.get_paginated_response(data)
 
     def post(self, request, system_id):
         """
-        Create a new measurement in the specified system.
+        Create measurements in the specified system.
+        - Accepts a single measurement or a list of measurements.
+        - Measurements already stored for the same `timestamp` are kept,
+          or overwritten with `?on_conflict=update`.
         """
         system = self.get_system(system_id)  # Ensure system belongs to user
 
-        serializer = MeasurementSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save(system=system)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        on_conflict = request.GET.get("on_conflict", "ignore")
+        if on_conflict not in ("ignore", "update"):
+            return Response(
+                {"error": f"Invalid on_conflict value: '{on_conflict}'",
+                 "valid_values": ["ignore", "update"]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        many = isinstance(request.data, list)
+        serializer = MeasurementSerializer(data=request.data, many=many)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        readings = serializer.validated_data if many else [serializer.validated_data]
+
+        if ingest_queue.is_enabled():
+            return self.enqueue(system, readings, update=on_conflict == "update")
+
+        measurements = Measurement.objects.upsert(
+            system.id, readings, update=on_conflict == "update")
+        metrics.INGESTED_ROWS.inc(len(readings))
+
+        if many:
+            return Response({"received": len(readings)}, status=status.HTTP_201_CREATED)
+        stored = Measurement.objects.filter(system=system, timestamp=measurements[0].timestamp).first()
+        if stored is None:
+            columns = archive.read_at(system.id, [measurements[0].timestamp])
+            stored = archive.to_measurements(system.id, columns)[0]
+        return Response(MeasurementSerializer(stored).data, status=status.HTTP_201_CREATED)
+
+    def enqueue(self, system, readings, update=False):
+        """
+        Appends validated readings to the write-behind queue, with the requested conflict handling.
+        Readings sent without a timestamp keep the time they were validated.
+        Returns 202 once they are stored durably, or 503 when the queue is full.
+        """
+        try:
+            batch_id = ingest_queue.get_queue().enqueue(system.id, readings, update=update)
+        except ingest_queue.QueueFull:
+            metrics.INGEST_QUEUE_REJECTED.inc()
+            return Response(
+                {"error": "Ingest queue is full, retry later."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(ingest_queue.retry_after())},
+            )
+        metrics.INGESTED_ROWS.inc(len(readings))
+        return Response(
+            {"batch_id": batch_id, "queued": len(readings)},
+            status=status.HTTP_202_ACCEPTED,
+        )
 
     def put(self, request, system_id, measurement_id):
         """
@@ -295,7 +480,10 @@ class MeasurementView(APIView):
             self.get_queryset(system_id), id=measurement_id)
         serializer = MeasurementSerializer(measurement, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic(using=sharding.db()):
+                serializer.save()
+                ChangeLog.objects.log(measurement, ChangeLog.Action.UPSERT)
+            notify_measurements_changed([measurement.system_id], "update")
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -308,7 +496,10 @@ class MeasurementView(APIView):
         serializer = MeasurementSerializer(
             measurement, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic(using=sharding.db()):
+                serializer.save()
+                ChangeLog.objects.log(measurement, ChangeLog.Action.UPSERT)
+            notify_measurements_changed([measurement.system_id], "update")
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -318,6 +509,496 @@ class MeasurementView(APIView):
         """
         measurement = get_object_or_404(
             self.get_queryset(system_id), id=measurement_id)
-        measurement.delete()
+        with transaction.atomic(using=sharding.db()):
+            ChangeLog.objects.log(measurement, ChangeLog.Action.DELETE)
+            measurement.delete()
+        notify_measurements_changed([measurement.system_id], "delete")
         return Response({'message': f'Measurement id:{measurement_id} deleted successfully'},
                         status=status.HTTP_204_NO_CONTENT)
+
+
+class MeasurementBulkView(InstrumentedAPIView):
+    """
+    API endpoint for updating and deleting many measurements of a system at once.
+    The measurements are selected with the `MeasurementFilter` query parameters,
+    and every operation runs as a single UPDATE or DELETE statement.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get_filtered(self, request, system_id):
+        """
+        Returns `(queryset, error response)` of the measurements selected by the filters.
+        At least one filter is required, unless `?all=true` is sent.
+        """
+        get_object_or_404(HydroponicSystem, id=system_id, owner=request.user)
+        filterset = MeasurementFilter(
+            request.GET, queryset=Measurement.objects.filter(system_id=system_id))
+        if not filterset.is_valid():
+            return None, Response(
+                {"error": "Invalid filtering parameters", "details": filterset.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not set(filterset.filters) & set(request.GET) and request.GET.get("all") != "true":
+            return None, Response(
+                {"error": "At least one filter is required, send all=true to select every measurement",
+                 "valid_filters": list(filterset.filters)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return filterset.qs, None
+
+    def patch(self, request, system_id):
+        """
+        Update the selected measurements.
+        - `set` assigns values and `offset` adds amounts, e.g. `{"offset": {"ph": -0.2}}`.
+        - Returns the number of updated measurements.
+        """
+        serializer = MeasurementBulkUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        measurements, error = self.get_filtered(request, system_id)
+        if error:
+            return error
+
+        try:
+            with transaction.atomic(using=sharding.db()):
+                # logged before the update, which may move rows out of the filtered range
+                ChangeLog.objects.record(measurements, ChangeLog.Action.UPSERT)
+                updated = measurements.adjust(
+                    values=serializer.validated_data.get("set"),
+                    offsets=serializer.validated_data.get("offset"),
+                )
+        except (DataError, IntegrityError):
+            return Response(
+                {"error": "The update would move values out of their valid range"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        notify_measurements_changed([system_id], "update")
+        return Response({"updated": updated}, status=status.HTTP_200_OK)
+
+    def delete(self, request, system_id):
+        """
+        Delete the selected measurements.
+        - Returns the number of deleted measurements.
+        """
+        measurements, error = self.get_filtered(request, system_id)
+        if error:
+            return error
+        with transaction.atomic(using=sharding.db()):
+            ChangeLog.objects.record(measurements, ChangeLog.Action.DELETE)
+            deleted, _ = measurements.delete()
+        notify_measurements_changed([system_id], "delete")
+        return Response({"deleted": deleted}, status=status.HTTP_200_OK)
+
+
+class MeasurementChartView(InstrumentedAPIView):
+    """
+    API endpoint returning downsampled measurement series for charts.
+    Every series is reduced to at most `points` points with LTTB or min/max buckets,
+    so long histories can be drawn from a single small response.
+    """
+
+    permission_classes = [IsAuthenticated]
+    series_fields = ['ph', 'temperature', 'tds']
+    default_points = 500
+    max_points = 5000
+
+    def get(self, request, system_id):
+        """
+        Retrieve chart data of a system.
+        - Accepts `MeasurementFilter` parameters, `points`, `method` and comma-separated `fields`.
+        """
+        get_object_or_404(HydroponicSystem, id=system_id, owner=request.user)
+
+        try:
+            points = int(request.GET.get('points', self.default_points))
+        except ValueError:
+            points = 0
+        if not 3 <= points <= self.max_points:
+            return Response(
+                {"error": f"points must be an integer between 3 and {self.max_points}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        method = request.GET.get('method', 'lttb')
+        if method not in downsampling.METHODS:
+            return Response(
+                {"error": f"Invalid method: '{method}'",
+                 "valid_methods": list(downsampling.METHODS)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fields = request.GET.get('fields', ','.join(self.series_fields)).split(',')
+        invalid = [field for field in fields if field not in self.series_fields]
+        if invalid:
+            return Response(
+                {"error": f"Invalid fields: {', '.join(invalid)}",
+                 "valid_fields": self.series_fields},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with metrics.phase("filter"):
+            filterset = MeasurementFilter(
+                request.GET, queryset=Measurement.objects.filter(system_id=system_id))
+            valid = filterset.is_valid()
+        if not valid:
+            return Response(
+                {"error": "Invalid filtering parameters", "details": filterset.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        timestamps, series = downsampling.load_series(filterset.qs, fields)
+        timestamps, series = archive.merge_series(system_id, filterset, timestamps, series)
+        with metrics.phase("serialize"):
+            data = downsampling.downsample(timestamps, series, points, method)
+        metrics.record_rows(sum(len(values) for values in data.values()))
+        return Response(
+            {"method": method, "points": points, "total": len(timestamps), "series": data},
+            status=status.HTTP_200_OK,
+        )
+
+
+class ForecastView(InstrumentedAPIView):
+    """
+    API endpoint forecasting where measurements of a system are heading.
+    Fits a linear or Holt trend over the last `window` hours of readings,
+    fitted trends are cached and refitted incrementally as readings arrive.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, system_id):
+        """
+        Retrieve the trend and predictions of the requested fields.
+        """
+        get_object_or_404(HydroponicSystem, id=system_id, owner=request.user)
+        query = ForecastQuerySerializer(data=request.GET)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+
+        series = {}
+        for field in params["fields"]:
+            forecaster = forecasting.Forecaster(
+                system_id, field, params["method"], params["window"],
+                alpha=params["alpha"], beta=params["beta"],
+            )
+            series[field] = forecaster.forecast(params["horizon"], params["steps"])
+        return Response(
+            {
+                "method": params["method"],
+                "window_hours": params["window"],
+                "horizon_hours": params["horizon"],
+                "series": series,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class ResampleView(InstrumentedAPIView):
+    """
+    API endpoint aligning measurements of several systems on a regular time grid.
+    Readings are averaged per grid point and gaps are filled by carrying the last value forward,
+    by linear interpolation or left empty, so series can be fed to models without resampling.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Retrieve the resampled series of the requested systems.
+        - Accepts comma-separated `systems`, `start`, `end`, `interval` in seconds,
+          `fill` (`locf`, `linear` or `null`), `limit` in grid points and comma-separated `fields`.
+        """
+        query = ResampleQuerySerializer(data=request.GET)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+
+        owned = set(
+            HydroponicSystem.objects.filter(id__in=params["systems"], owner=request.user)
+            .values_list("id", flat=True)
+        )
+        missing = [str(system_id) for system_id in params["systems"] if system_id not in owned]
+        if missing:
+            return Response(
+                {"error": f"Systems not found: {', '.join(missing)}"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        grid, series, readings = resampling.resample(
+            params["systems"], params["start"], params["end"], params["interval"], params["fields"],
+            params["fill"], params["limit"],
+        )
+        with metrics.phase("serialize"):
+            data = {
+                "interval": params["interval"],
+                "fill": params["fill"],
+                "timestamps": [int(value * 1000) for value in grid.tolist()],
+                "systems": [
+                    {
+                        "id": system_id,
+                        "readings": int(readings[row]),
+                        "series": {field: resampling.to_list(matrix[row]) for field, matrix in series.items()},
+                    }
+                    for row, system_id in enumerate(params["systems"])
+                ],
+            }
+        metrics.record_rows(int(readings.sum()))
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class AnalyticsView(InstrumentedAPIView):
+    """
+    API endpoint comparing the measurements of a user's systems over a time window.
+    Returns pairwise correlations, fleet percentile bands and per-system deviation scores,
+    cached until measurements of one of the systems change.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Retrieve fleet analytics of all systems of the user, or of the comma-separated `systems`.
+        - Accepts `window` in hours, `end`, `interval` in seconds, `fill`, `limit` and comma-separated `fields`.
+        """
+        query = AnalyticsQuerySerializer(data=request.GET)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+
+        systems = HydroponicSystem.objects.filter(owner=request.user)
+        if "systems" in params:
+            owned = set(systems.filter(id__in=params["systems"]).values_list("id", flat=True))
+            missing = [str(system_id) for system_id in params["systems"] if system_id not in owned]
+            if missing:
+                return Response(
+                    {"error": f"Systems not found: {', '.join(missing)}"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            system_ids = params["systems"]
+        else:
+            system_ids = list(systems.order_by("id").values_list("id", flat=True))
+
+        limit = analytics.get_config()["MAX_SYSTEMS"]
+        if not 2 <= len(system_ids) <= limit:
+            return Response(
+                {"error": f"Analytics compare between 2 and {limit} systems, select them with `systems`"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with metrics.phase("analyze"):
+            result = analytics.analyze(
+                system_ids, params["start"], params["end"], params["interval"], params["fields"],
+                params["fill"], params["limit"],
+            )
+        metrics.record_rows(sum(result["readings"]))
+        return Response(
+            {
+                "start": params["start"],
+                "end": params["end"],
+                "interval": params["interval"],
+                "systems": system_ids,
+                **result,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class DeletionJobView(InstrumentedAPIView):
+    """
+    API endpoint reporting the status of a background deletion.
+    Jobs are visible to the user who requested them and to staff.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        """
+        Retrieve the status and progress of a deletion job.
+        """
+        jobs = DeletionJob.objects.all()
+        if not request.user.is_staff:
+            jobs = jobs.filter(requested_by=request.user)
+        job = get_object_or_404(jobs, id=job_id)
+        return Response(DeletionJobSerializer(job).data, status=status.HTTP_200_OK)
+
+
+class ChangeFeedView(InstrumentedAPIView):
+    """
+    API endpoint returning changes of the user's systems and measurements after a cursor,
+    so clients stay in sync by downloading only what changed.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Retrieve changes after `cursor`.
+        - Without a cursor, returns no changes and the cursor at the end of the change log.
+          Clients take it before downloading full lists.
+        - `limit` caps the number of changes, `has_more` tells to request the next page at once.
+        """
+        config = changes.get_config()
+        cursor = request.GET.get("cursor")
+        if not cursor:
+            return Response({"changes": [], "cursor": changes.head(request.user), "has_more": False},
+                            status=status.HTTP_200_OK)
+        try:
+            moved_at = self.shard_assignment.moved_at if self.shard_assignment else None
+            after = changes.decode_cursor(cursor, moved_at)
+        except changes.InvalidCursor:
+            return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        except changes.ExpiredCursor:
+            return Response(
+                {"error": "The cursor has expired, download full lists and start from a new cursor"},
+                status=status.HTTP_410_GONE,
+            )
+        try:
+            limit = int(request.GET.get("limit", config["PAGE_SIZE"]))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= config["MAX_PAGE_SIZE"]:
+            return Response(
+                {"error": f"limit must be an integer between 1 and {config['MAX_PAGE_SIZE']}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with metrics.phase("filter"):
+            entries, last, has_more = changes.feed(request.user, after, limit)
+        metrics.record_rows(len(entries))
+        serializers = {
+            ChangeLog.Model.SYSTEM: HydroponicSystemSerializer,
+            ChangeLog.Model.MEASUREMENT: MeasurementSerializer,
+        }
+        with metrics.phase("serialize"):
+            for entry in entries:
+                instance = entry.pop("instance")
+                entry["data"] = serializers[entry["model"]](instance).data if instance else None
+        return Response(
+            {"changes": entries, "cursor": changes.encode_cursor(last), "has_more": has_more},
+            status=status.HTTP_200_OK,
+        )
+
+
+class BatchView(InstrumentedAPIView):
+    """
+    API endpoint running many read requests in one call.
+    The batch is authenticated once and its sub-requests are dispatched to the views of their routes.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Runs the GET sub-requests listed in `requests` and returns their statuses and bodies in order.
+        - Identical paths are run once.
+        - Every sub-request is permission checked and rate limited like a separate request.
+        """
+        try:
+            items = batch.parse(request.data)
+        except batch.InvalidBatch as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"responses": batch.execute(request, items, BatchView)}, status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """
+    API endpoint exposing request metrics in the Prometheus text format.
+    Scrapers send `METRICS['TOKEN']` as a bearer token, staff users authenticate with their access token.
+    With `METRICS['PUBLIC']` the metrics are exposed without authentication.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+
+    def allowed(self, request):
+        """
+        Returns whether the request sends the metrics token or a staff user's access token.
+        """
+        config = getattr(settings, "METRICS", {})
+        token = config.get("TOKEN")
+        if config.get("PUBLIC"):
+            return True
+        # compared in constant time, bytes also accept headers with non-ASCII characters
+        sent = request.META.get("HTTP_AUTHORIZATION", "").encode()
+        if token and hmac.compare_digest(sent, f"Bearer {token}".encode()):
+            return True
+        # the bearer token of a scraper is not a JWT, staff users are authenticated here instead
+        try:
+            authenticated = JWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return authenticated is not None and authenticated[0].is_staff
+
+    def get(self, request):
+        """
+        Renders all registered metrics.
+        """
+        if not self.allowed(request):
+            return Response({"detail": "Invalid metrics token."}, status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(
+            metrics.REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+
+class SchedulerView(InstrumentedAPIView):
+    """
+    API endpoint reporting the registered periodic jobs and their last runs.
+    Available to staff users only.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """
+        Retrieve the interval and the run history of every registered job.
+        """
+        runs = ScheduledJob.objects.in_bulk()
+        data = []
+        for name, job in scheduler.registered().items():
+            run = runs.get(name)
+            data.append({
+                "name": name,
+                "interval": job.interval,
+                "runs": run.runs if run else 0,
+                "failures": run.failures if run else 0,
+                "last_started_at": run.last_started_at if run else None,
+                "last_duration": run.last_duration if run else None,
+                "last_status": run.last_status if run else None,
+                "last_error": run.last_error if run else "",
+            })
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class ProfileView(InstrumentedAPIView):
+    """
+    API endpoint for captured request profiles.
+    Available to staff users only.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, profile_id=None):
+        """
+        Retrieves profiles:
+        - If `profile_id` is provided, downloads its collapsed stacks,
+          or its request details and executed SQL with `?format=json`.
+        - Otherwise, returns a list of stored profiles.
+        """
+        store = profiling.get_store()
+        if profile_id is None:
+            return Response(store.list(), status=status.HTTP_200_OK)
+
+        if request.GET.get("format") == "json":
+            path = store.path(profile_id, ".json")
+            content_type = "application/json"
+        else:
+            path = store.path(profile_id, ".folded")
+            content_type = "text/plain"
+        if path is None:
+            raise Http404
+        return FileResponse(
+            path.open("rb"), as_attachment=True, filename=path.name, content_type=content_type
+        )
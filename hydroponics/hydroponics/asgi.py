@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hydroponics.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.SCHEDULER.get('RUN_IN_APP'):
+    from api import scheduler  # noqa: E402
+
+    scheduler.start_in_background()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'api',
@@ -53,6 +55,21 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_FILTER_BACKENDS': 
         ["django_filters.rest_framework.DjangoFilterBackend"],
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.UserTokenBucketThrottle',
+        'api.throttling.SystemTokenBucketThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'user': '1200/min',
+        'system': '600/min',
+    },
+}
+
+# configure rate limiting, use 'api.throttling.RedisTokenBucketBackend'
+# with OPTIONS {'url': 'redis://...'} to share buckets between replicas
+RATE_LIMIT_BACKEND = {
+    'BACKEND': 'api.throttling.LocalTokenBucketBackend',
+    'OPTIONS': {},
 }
 
 # configure token
@@ -66,6 +83,10 @@ SIMPLE_JWT = {
 
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'api.middleware.RequestDecompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,6 +96,121 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# configure metrics exposed at /api/metrics/ to scrapers sending TOKEN as a bearer token
+# and to staff users, set PUBLIC to expose them without authentication
+METRICS = {
+    'ENABLED': True,
+    'TOKEN': os.environ.get('HYDROPONICS_METRICS_TOKEN'),
+    'PUBLIC': False,
+}
+
+# configure compression, responses are compressed with the first of ENCODINGS accepted
+# by the client whose package is installed (zstd: zstandard, br: brotli), compressed
+# request bodies inflating beyond MAX_DECOMPRESSED_SIZE bytes are rejected
+COMPRESSION = {
+    'ENABLED': True,
+    'ENCODINGS': ['zstd', 'br', 'gzip'],
+    'LEVELS': {'gzip': 6, 'br': 4, 'zstd': 3},
+    'MIN_SIZE': 512,
+    'MAX_DECOMPRESSED_SIZE': 10 * 1024 * 1024,
+}
+
+# configure request profiling, requests are profiled with probability SAMPLE_RATE
+# or when they send the X-Profile-Token header matching TOKEN
+PROFILING = {
+    'SAMPLE_RATE': 0.0,
+    'TOKEN': None,
+    'INTERVAL': 0.005,
+    'DIRECTORY': BASE_DIR / 'profiles',
+    'MAX_PROFILES': 100,
+}
+
+# configure write-behind ingestion, when enabled accepted measurements are stored
+# in a local queue and moved to the database by `python manage.py run_ingest_worker`
+# batches failing MAX_ATTEMPTS times are moved to the queue's `quarantine` table
+INGEST_QUEUE = {
+    'ENABLED': False,
+    'PATH': BASE_DIR / 'ingest_queue.sqlite3',
+    'MAX_ROWS': 100_000,
+    'BATCH_SIZE': 5_000,
+    'RETRY_AFTER': 5,
+    'MAX_ATTEMPTS': 5,
+}
+
+# caches, 'shared' is seen by all processes (web workers, ingest worker) and holds forecasts and
+# analytics invalidated by them, its table is created by `migrate`; Redis can replace it
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'hydroponics_cache',
+    },
+}
+
+# configure forecasts, fitted trends are kept in CACHE for TIMEOUT seconds,
+# CACHE must be shared by all processes
+FORECAST = {
+    'CACHE': 'shared',
+    'TIMEOUT': 24 * 60 * 60,
+}
+
+# configure fleet analytics at /api/analytics/, results are kept in CACHE for TIMEOUT seconds
+# or until measurements of a compared system change, systems whose deviation score exceeds
+# OUTLIER_SCORE are flagged, correlations need MIN_OVERLAP common grid points
+ANALYTICS = {
+    'CACHE': 'shared',
+    'TIMEOUT': 60 * 60,
+    'MAX_SYSTEMS': 200,
+    'MIN_OVERLAP': 3,
+    'OUTLIER_SCORE': 2.0,
+}
+
+# configure deletion of systems and users, measurements are deleted CHUNK_SIZE rows
+# per transaction, background jobs interrupted by a restart are resumed by
+# `python manage.py run_deletion_jobs`
+DELETION = {
+    'CHUNK_SIZE': 10_000,
+    'RUN_IN_THREAD': True,
+}
+
+# configure periodic jobs run by `python manage.py run_scheduler`, or in the ASGI app with RUN_IN_APP,
+# replicas elect the one running jobs with the PostgreSQL advisory lock LOCK_ID,
+# JOBS overrides intervals in seconds of registered jobs, None disables a job
+SCHEDULER = {
+    'RUN_IN_APP': False,
+    'WORKERS': 4,
+    'TICK': 1.0,
+    'LOCK_ID': 4_202_517,
+    'JOBS': {},
+}
+
+# configure batch requests at /api/batch/, a batch holds at most MAX_REQUESTS
+# sub-requests run on a pool of WORKERS threads (each with its own database connection)
+# shared by all batches of the process
+BATCH = {
+    'MAX_REQUESTS': 100,
+    'WORKERS': 4,
+}
+
+# configure the change feed, changes are kept RETENTION_DAYS (pruned by
+# `python manage.py prune_changes`)
+CHANGES = {
+    'RETENTION_DAYS': 30,
+    'PAGE_SIZE': 500,
+    'MAX_PAGE_SIZE': 5000,
+}
+
+# configure the cold storage tier, `python manage.py archive_measurements` moves readings
+# older than OLDER_THAN_DAYS into compressed blocks of BLOCK_SIZE readings,
+# CODEC is zlib or zstd (requires the zstandard package)
+ARCHIVE = {
+    'CODEC': 'zlib',
+    'OLDER_THAN_DAYS': 90,
+    'BLOCK_SIZE': 10_000,
+}
+
 ROOT_URLCONF = 'hydroponics.urls'
 
 TEMPLATES = [
@@ -110,6 +246,44 @@ DATABASES = {
     }
 }
 
+# configure sharding, SHARDS maps database aliases (add them to DATABASES) to their index:
+# systems and measurements of a user live on one shard, users and shard assignments
+# in the DIRECTORY database, new rows of a shard take ids from its own block of ID_BLOCK ids
+# and users are moved between shards with `python manage.py move_user`
+DATABASE_ROUTERS = ['api.sharding.ShardRouter']
+SHARDING = {
+    'SHARDS': {'default': 0},
+    'DIRECTORY': 'default',
+    'ID_BLOCK': 2 ** 40,
+    'COPY_BATCH': 5_000,
+    'FREEZE_GRACE': 5,
+}
+
+# run as an edge node with HYDROPONICS_EDGE=1: the same models and API on a local SQLite database,
+# readings are buffered locally and synced to UPSTREAM_URL by `python manage.py edge_sync`
+EDGE_MODE = os.environ.get('HYDROPONICS_EDGE') == '1'
+if EDGE_MODE:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('HYDROPONICS_EDGE_DB', BASE_DIR / 'edge.sqlite3'),
+            'OPTIONS': {
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+    INSTALLED_APPS.remove('django.contrib.postgres')
+
+EDGE = {
+    'UPSTREAM_URL': os.environ.get('HYDROPONICS_UPSTREAM_URL'),
+    'USERNAME': os.environ.get('HYDROPONICS_UPSTREAM_USERNAME'),
+    'PASSWORD': os.environ.get('HYDROPONICS_UPSTREAM_PASSWORD'),
+    'BATCH_SIZE': 5_000,
+    'INTERVAL': 60,
+    'TIMEOUT': 30,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators